@@ -0,0 +1,21 @@
+import argparse
+
+import uvicorn
+
+from api.service import create_app
+from config.settings import API_HOST, API_PORT, API_WORKERS, LOG_LEVEL
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Peerfolio analysis, peers and advice over HTTP/JSON")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS,
+                        help="Process-pool size for CPU-bound handlers (0 = run in the server process)")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.workers), host=args.host, port=args.port, log_level=LOG_LEVEL.lower())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+import requests
+
+from config.settings import API_HOST, API_PORT
+from utils.data_generator import generate_sample_data
+
+LOAD_TEST_PROFILE = {
+    'age': 42,
+    'location': 'Singapore',
+    'net_worth': '$10M - $25M',
+    'investment_style': 'Tech-focused'
+}
+
+ENDPOINTS = ['analysis', 'peers', 'recommendations', 'chat']
+
+
+def build_requests(endpoint: str) -> List[Tuple[str, str]]:
+    """(path, body) pairs cycled by every client; 'mix' rotates through all endpoints"""
+    holdings = generate_sample_data(LOAD_TEST_PROFILE).to_dict('records')
+    bodies = {
+        'analysis': {'holdings': holdings, 'profile': LOAD_TEST_PROFILE},
+        'peers': {'profile': LOAD_TEST_PROFILE},
+        'recommendations': {'holdings': holdings, 'profile': LOAD_TEST_PROFILE},
+        'chat': {'question': 'How should I rebalance my tech exposure?', 'profile': LOAD_TEST_PROFILE}
+    }
+    selected = ENDPOINTS if endpoint == 'mix' else [endpoint]
+    return [(f"/v1/{name}", json.dumps(bodies[name])) for name in selected]
+
+
+def client(base_url: str, plan: List[Tuple[str, str]], deadline: float, latencies: List[float],
+           statuses: Counter, lock: threading.Lock):
+    """Closed-loop client: sends the next request as soon as the previous one answers"""
+    session = requests.Session()
+    headers = {'Content-Type': 'application/json'}
+    for path, body in itertools.cycle(plan):
+        if time.perf_counter() >= deadline:
+            break
+        start = time.perf_counter()
+        try:
+            status = session.post(base_url + path, data=body, headers=headers, timeout=60).status_code
+        except requests.RequestException:
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] += 1
+
+
+def run_load_test(base_url: str, endpoint: str, concurrency: int, duration: float) -> Dict:
+    plan = build_requests(endpoint)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [
+        threading.Thread(target=client, args=(base_url, plan, deadline, latencies, statuses, lock))
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else (0.0, 0.0, 0.0)
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'duration_s': elapsed,
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if status != 200),
+        'requests_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'status_codes': {str(status): count for status, count in statuses.items()}
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure requests per second of the Peerfolio API")
+    parser.add_argument("--url", default=f"http://{API_HOST}:{API_PORT}", help="Base URL of a running service")
+    parser.add_argument("--endpoint", choices=ENDPOINTS + ['mix'], default='mix')
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to generate load for")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        requests.get(f"{args.url}/health", timeout=5).raise_for_status()
+    except requests.RequestException as exc:
+        print(f"Service at {args.url} is not healthy: {exc}")
+        return 1
+
+    report = run_load_test(args.url, args.endpoint, args.concurrency, args.duration)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(
+            f"{report['endpoint']}: {report['requests']:,} requests in {report['duration_s']:.1f}s "
+            f"with {report['concurrency']} clients -> {report['requests_per_second']:,.1f} req/s"
+        )
+        print(f"latency p50 {report['p50_ms']:.1f} ms, p95 {report['p95_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms")
+        print(f"status codes: {report['status_codes']} ({report['errors']} errors)")
+    return 1 if report['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
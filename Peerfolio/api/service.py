@@ -0,0 +1,169 @@
+import asyncio
+import functools
+import json
+import math
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from api import workers
+from config.settings import (
+    API_WORKERS, APP_NAME, APP_VERSION, MAX_PEER_RESULTS, MAX_UPLOAD_SIZE, NET_WORTH_RANGES
+)
+from utils.cost_basis import COST_BASIS_METHODS, CostBasisError
+from utils.fx import FXRateError
+from utils.portfolio_ingest import IngestError
+from utils.tracing import span
+
+
+class WorkerPool:
+    """Runs CPU-bound handlers off the event loop on workers that keep their resources warm"""
+
+    def __init__(self, size: int = API_WORKERS):
+        self.size = size
+        self._executor: Optional[Executor] = None
+
+    def start(self):
+        if self.size > 0:
+            self._executor = ProcessPoolExecutor(self.size, initializer=workers.init_worker)
+            # Processes are spawned on demand; one ping each builds them before the first request
+            for future in [self._executor.submit(workers.ping) for _ in range(self.size)]:
+                future.result()
+        else:
+            # Single-process mode: requests share this process's resources on a thread
+            workers.init_worker()
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix="peerfolio-api")
+
+    async def run(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+async def read_payload(request: Request) -> Dict:
+    body = await request.body()
+    if len(body) > MAX_UPLOAD_SIZE * 1024 * 1024:
+        raise HTTPException(413, f"Request body exceeds {MAX_UPLOAD_SIZE} MB")
+    try:
+        payload = json.loads(body or b'{}')
+    except ValueError:
+        raise HTTPException(400, "Request body is not valid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPException(400, "Request body must be a JSON object")
+    if payload.setdefault('profile', {}) is None:
+        payload['profile'] = {}
+    if not isinstance(payload['profile'], dict):
+        raise HTTPException(400, "'profile' must be an object")
+    check_profile(payload['profile'])
+    return payload
+
+
+def check_profile(profile: Dict):
+    """Reject profile fields the analyzer, matcher and advisor cannot use before a worker sees them"""
+    age = profile.get('age', 0)
+    if isinstance(age, bool) or not isinstance(age, (int, float)) or not math.isfinite(age):
+        raise HTTPException(422, "'age' must be a number")
+    if 'net_worth' in profile and profile['net_worth'] not in NET_WORTH_RANGES:
+        raise HTTPException(422, f"'net_worth' must be one of: {', '.join(NET_WORTH_RANGES)}")
+    method = profile.get('cost_basis_method', COST_BASIS_METHODS[0])
+    if not isinstance(method, str) or method.lower() not in COST_BASIS_METHODS:
+        raise HTTPException(422, f"'cost_basis_method' must be one of: {', '.join(COST_BASIS_METHODS)}")
+
+
+async def health(request: Request) -> JSONResponse:
+    return JSONResponse({
+        'status': 'ok',
+        'service': APP_NAME,
+        'version': APP_VERSION,
+        'workers': request.app.state.pool.size
+    })
+
+
+async def analysis(request: Request) -> JSONResponse:
+    """POST {"holdings": [...], "profile": {...}, "sales": [...]?} -> PortfolioAnalyzer.analyze results"""
+    payload = await read_payload(request)
+    with span('api.analysis'):
+        result = await request.app.state.pool.run(
+            workers.analyze_portfolio, payload.get('holdings'), payload['profile'], payload.get('sales')
+        )
+    return JSONResponse(result)
+
+
+async def peers(request: Request) -> JSONResponse:
+    """POST {"profile": {...}, "max_results": 50} -> similar peers and their aggregate insights"""
+    payload = await read_payload(request)
+    max_results = payload.get('max_results', MAX_PEER_RESULTS)
+    if not isinstance(max_results, int) or max_results < 1:
+        raise HTTPException(400, "'max_results' must be a positive integer")
+    with span('api.peers'):
+        result = await request.app.state.pool.run(workers.match_peers, payload['profile'], max_results)
+    return JSONResponse(result)
+
+
+async def recommendations(request: Request) -> JSONResponse:
+    """POST {"holdings": [...], "profile": {...}} -> AIAdvisor recommendations by category"""
+    payload = await read_payload(request)
+    with span('api.recommendations'):
+        result = await request.app.state.pool.run(
+            workers.recommend, payload.get('holdings'), payload['profile']
+        )
+    return JSONResponse(result)
+
+
+async def chat(request: Request) -> JSONResponse:
+    """POST {"question": "...", "profile": {...}, "holdings": [...]?} -> advisor chat response"""
+    payload = await read_payload(request)
+    question = payload.get('question')
+    if not isinstance(question, str) or not question.strip():
+        raise HTTPException(400, "'question' is required")
+    with span('api.chat'):
+        result = await request.app.state.pool.run(
+            workers.chat, question, payload['profile'], payload.get('holdings')
+        )
+    return JSONResponse(result)
+
+
+async def http_error(request: Request, exc: HTTPException) -> JSONResponse:
+    return JSONResponse({'error': exc.detail}, status_code=exc.status_code)
+
+
+async def ingest_error(request: Request, exc: IngestError) -> JSONResponse:
+    return JSONResponse({'error': str(exc)}, status_code=422)
+
+
+def create_app(pool_size: int = API_WORKERS) -> Starlette:
+    """ASGI app exposing analysis, peers and advice as JSON endpoints"""
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        app.state.pool = WorkerPool(pool_size)
+        app.state.pool.start()
+        try:
+            yield
+        finally:
+            app.state.pool.shutdown()
+
+    return Starlette(
+        routes=[
+            Route('/health', health, methods=['GET']),
+            Route('/v1/analysis', analysis, methods=['POST']),
+            Route('/v1/peers', peers, methods=['POST']),
+            Route('/v1/recommendations', recommendations, methods=['POST']),
+            Route('/v1/chat', chat, methods=['POST'])
+        ],
+        exception_handlers={
+            HTTPException: http_error, IngestError: ingest_error, FXRateError: ingest_error,
+            CostBasisError: ingest_error
+        },
+        lifespan=lifespan
+    )
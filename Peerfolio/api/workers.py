@@ -0,0 +1,89 @@
+import random
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import API_RANDOM_SEED, MAX_PEER_RESULTS
+from utils.portfolio_ingest import IngestError, validate_chunk, validate_sales
+from utils.shared_resources import SHARED_RESOURCES
+
+
+def init_worker(seed: int = API_RANDOM_SEED):
+    """Build the analyzer, matcher and advisor once per process, before the first request"""
+    # The sample peer database is random; a fixed seed keeps every worker's copy identical
+    random.seed(seed)
+    np.random.seed(seed)
+    SHARED_RESOURCES.warm_up()
+
+
+def ping() -> bool:
+    return True
+
+
+def jsonable(value):
+    """Convert analysis output (DataFrames, numpy scalars, timestamps, NaN) to plain JSON types"""
+    if isinstance(value, dict):
+        return {str(key): jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+    if isinstance(value, pd.DataFrame):
+        return jsonable(value.to_dict('records'))
+    if isinstance(value, (pd.Series, np.ndarray)):
+        return jsonable(value.tolist())
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    if isinstance(value, (pd.Timestamp, np.datetime64, datetime, date)):
+        return None if pd.isna(value) else pd.Timestamp(value).isoformat()
+    return value
+
+
+def holdings_frame(holdings: List[Dict]) -> pd.DataFrame:
+    """Validate request holdings with the same rules as file uploads"""
+    if not isinstance(holdings, list) or not holdings or not all(isinstance(row, dict) for row in holdings):
+        raise IngestError("'holdings' must be a non-empty list of position objects")
+    clean, rejected = validate_chunk(pd.DataFrame.from_records(holdings))
+    if clean.empty:
+        raise IngestError(f"None of the {rejected} holdings are valid")
+    return clean
+
+
+def sales_frame(sales: Optional[List[Dict]]) -> Optional[pd.DataFrame]:
+    """Validate optional request sales; every row must be valid"""
+    if sales is None or sales == []:
+        return None
+    if not isinstance(sales, list) or not all(isinstance(row, dict) for row in sales):
+        raise IngestError("'sales' must be a list of sale objects")
+    return validate_sales(pd.DataFrame.from_records(sales))
+
+
+def analyze_portfolio(holdings: List[Dict], user_profile: Dict, sales: Optional[List[Dict]] = None) -> Dict:
+    analyzer = SHARED_RESOURCES.get('portfolio_analyzer')
+    results = analyzer.analyze(holdings_frame(holdings), user_profile, sales_frame(sales))
+    # The per-lot table can be as large as the request itself; lot_count and totals are kept
+    results['cost_basis'].pop('lots', None)
+    return jsonable(results)
+
+
+def match_peers(user_profile: Dict, max_results: int = MAX_PEER_RESULTS) -> Dict:
+    matcher = SHARED_RESOURCES.get('peer_matcher')
+    peers = matcher.find_similar_peers(user_profile, max_results)
+    return jsonable({'peers': peers, 'insights': matcher.get_peer_insights(peers)})
+
+
+def recommend(holdings: List[Dict], user_profile: Dict) -> Dict:
+    portfolio_df = holdings_frame(holdings)
+    analysis = SHARED_RESOURCES.get('portfolio_analyzer').analyze(portfolio_df, user_profile)
+    advisor = SHARED_RESOURCES.get('ai_advisor')
+    return jsonable(advisor.get_recommendations(portfolio_df, user_profile, analysis))
+
+
+def chat(question: str, user_profile: Dict, holdings: Optional[List[Dict]] = None) -> Dict:
+    portfolio_df = holdings_frame(holdings) if holdings else None
+    response = SHARED_RESOURCES.get('ai_advisor').chat_response(question, user_profile, portfolio_df)
+    return {'response': response}
@@ -1,26 +1,36 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
+import asyncio
+import heapq
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import yfinance as yf
-from datetime import datetime, timedelta
-import requests
 from typing import Dict, List, Tuple
-import json
-import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # Import custom modules
-from utils.portfolio_analyzer import PortfolioAnalyzer
-from utils.peer_matcher import PeerMatcher
-from utils.ai_advisor import AIAdvisor
+from utils.shared_resources import SHARED_RESOURCES
+from utils.analysis_cache import ANALYSIS_CACHE, cached_analysis
 from utils.data_generator import generate_sample_data
+from utils.portfolio_ingest import IngestError, read_sales, stream_portfolio
+from utils.cost_basis import CostBasisError
+from utils.tracing import TRACER, span
+from utils.profiling import page_profiler, render_profile_panel, requested_mode
+from utils.lazy_imports import lazy_import
+from utils.live_valuation import TICK_FEEDS, LiveValuationEngine
+from utils.fx import FX_RATES, location_currency, reporting_currency
+from utils.factor_risk import MARKET_FACTOR
 from config.theme import apply_dark_theme
+from config.settings import (
+    DEBUG_MODE, TRACING_PANEL_ENABLED, ALLOWED_FILE_TYPES, LIVE_FEED, LIVE_REPLAY_PATH, LIVE_SOCKET_ADDRESS,
+    LIVE_SESSION_SECONDS
+)
+
+# plotly.express and yfinance load on the first page that draws a chart or fetches quotes
+px = lazy_import('plotly.express')
+yf = lazy_import('yfinance')
 
 # Page configuration
 st.set_page_config(
@@ -33,17 +43,27 @@ st.set_page_config(
 # Apply dark theme
 apply_dark_theme()
 
+@st.cache_resource
+def warm_up_resources():
+    """Build the analyzer, peer database and knowledge base once per server process"""
+    return SHARED_RESOURCES.warm_up()
+
+warm_up_resources()
+
 class PeerfolioApp:
     def __init__(self):
-        self.portfolio_analyzer = PortfolioAnalyzer()
-        self.peer_matcher = PeerMatcher()
-        self.ai_advisor = AIAdvisor()
+        # Shared across reruns and sessions instead of rebuilt on every interaction
+        self.portfolio_analyzer = SHARED_RESOURCES.get('portfolio_analyzer')
+        self.peer_matcher = SHARED_RESOURCES.get('peer_matcher')
+        self.ai_advisor = SHARED_RESOURCES.get('ai_advisor')
         
         # Initialize session state
         if 'user_profile' not in st.session_state:
             st.session_state.user_profile = {}
         if 'portfolio_data' not in st.session_state:
             st.session_state.portfolio_data = None
+        if 'sales_data' not in st.session_state:
+            st.session_state.sales_data = None
         if 'analysis_results' not in st.session_state:
             st.session_state.analysis_results = None
 
@@ -84,13 +104,26 @@ class PeerfolioApp:
             "Investment Preference",
             ["Conservative", "Moderate", "Aggressive", "Crypto-focused", "ESG-focused", "Tech-focused"]
         )
+        cost_basis_method = st.sidebar.selectbox(
+            "Cost Basis Method",
+            ["FIFO", "LIFO", "HIFO", "Average"],
+            help="Order in which tax lots are relieved when computing realized and unrealized P&L"
+        )
+        reporting_currency = st.sidebar.selectbox(
+            "Reporting Currency",
+            FX_RATES.currencies,
+            index=FX_RATES.currencies.index(location_currency(location)),
+            help="Holdings in other currencies (Currency column or exchange suffix such as .SI) are converted"
+        )
         
         # Update session state
         st.session_state.user_profile = {
             'age': age,
             'location': location,
             'net_worth': net_worth,
-            'investment_style': investment_style
+            'investment_style': investment_style,
+            'cost_basis_method': cost_basis_method.lower(),
+            'reporting_currency': reporting_currency
         }
         
         st.sidebar.markdown("---")
@@ -102,32 +135,87 @@ class PeerfolioApp:
             ["Portfolio Analysis", "Peer Insights", "AI Recommendations", "Market Intelligence"]
         )
         
+        if DEBUG_MODE:
+            self.render_resource_panel()
+        # Reset and export act on the process-wide tracer, so the panel is never shown to every visitor
+        if TRACING_PANEL_ENABLED:
+            self.render_tracing_panel()
+        
         return page
 
+    def render_resource_panel(self):
+        """Render shared resource construction time and reuse counts"""
+        with st.sidebar.expander("⚙️ Resource Cache"):
+            stats = pd.DataFrame(SHARED_RESOURCES.stats())
+            stats['construction_ms'] = stats['construction_ms'].round(2)
+            st.dataframe(stats, use_container_width=True, hide_index=True)
+            
+            cache_stats = ANALYSIS_CACHE.stats()
+            st.caption(
+                f"Analysis cache: {cache_stats['entries']} entries, "
+                f"{cache_stats['bytes'] / 1024:,.0f} KB, "
+                f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+            )
+
+    def render_tracing_panel(self):
+        """Render per-span latency percentiles recorded by the tracer"""
+        with st.sidebar.expander("⏱️ Tracing"):
+            # Recording is per session; the table below aggregates spans from every session that records
+            TRACER.enable_in_context(st.checkbox("Record spans", value=TRACER.default_enabled, key='record_spans'))
+            summary = TRACER.summary()
+            if summary:
+                spans = pd.DataFrame(summary).round({'p50_ms': 2, 'p95_ms': 2, 'mean_ms': 2, 'total_ms': 1})
+                st.dataframe(spans, use_container_width=True, hide_index=True)
+            else:
+                st.caption("No spans recorded yet")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Export metrics"):
+                    st.caption(f"Wrote {TRACER.export_prometheus()}")
+            with col2:
+                if st.button("Reset spans"):
+                    TRACER.reset()
+
     def render_portfolio_upload(self):
         """Render portfolio upload section"""
         st.markdown("### 📈 Portfolio Upload & Analysis")
         
         upload_method = st.radio(
             "Choose upload method:",
-            ["Upload CSV", "Manual Input", "Use Sample Data"]
+            ["Upload File", "Manual Input", "Use Sample Data"]
         )
         
-        if upload_method == "Upload CSV":
+        if upload_method == "Upload File":
             uploaded_file = st.file_uploader(
-                "Upload your portfolio CSV file",
-                type=['csv'],
-                help="CSV should contain columns: Symbol, Shares, Purchase_Price, Current_Price"
+                "Upload your portfolio file",
+                type=ALLOWED_FILE_TYPES,
+                help="CSV, Excel or JSON with columns: Symbol, Shares, Purchase_Price, Current_Price"
             )
             
             if uploaded_file:
                 try:
-                    portfolio_df = pd.read_csv(uploaded_file)
+                    # Lots (with purchase dates) feed the cost-basis, wash-sale and FX analysis; positions are shown
+                    portfolio_df, positions = self.ingest_upload(uploaded_file)
                     st.session_state.portfolio_data = portfolio_df
                     st.success("Portfolio uploaded successfully!")
-                    st.dataframe(portfolio_df, use_container_width=True)
-                except Exception as e:
-                    st.error(f"Error reading CSV: {str(e)}")
+                    st.dataframe(positions, use_container_width=True)
+                except IngestError as e:
+                    st.error(f"Error reading portfolio: {str(e)}")
+            
+            # Sales are relieved against the lots by the profile's cost basis method for realized P&L
+            sales_file = st.file_uploader(
+                "Upload sales (optional)",
+                type=ALLOWED_FILE_TYPES,
+                help="CSV, Excel or JSON with columns: Symbol, Shares, Sale_Price"
+            )
+            st.session_state.sales_data = None
+            if sales_file:
+                try:
+                    st.session_state.sales_data = read_sales(sales_file)
+                    st.caption(f"{len(st.session_state.sales_data):,} sales loaded")
+                except IngestError as e:
+                    st.error(f"Error reading sales: {str(e)}")
         
         elif upload_method == "Manual Input":
             self.render_manual_portfolio_input()
@@ -136,9 +224,29 @@ class PeerfolioApp:
             if st.button("Generate Sample Portfolio"):
                 sample_portfolio = generate_sample_data(st.session_state.user_profile)
                 st.session_state.portfolio_data = sample_portfolio
+                st.session_state.sales_data = None
                 st.success("Sample portfolio generated!")
                 st.dataframe(sample_portfolio, use_container_width=True)
 
+    def ingest_upload(self, uploaded_file) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Stream an upload, updating progress and live totals per chunk; returns (lots, positions)"""
+        progress = st.progress(0.0, text="Reading portfolio...")
+        live_metrics = st.empty()
+        report = {}
+        for report in stream_portfolio(uploaded_file):
+            positions = report['positions']
+            progress.progress(report['fraction'] or 0.0, text=f"Read {report['rows_read']:,} rows")
+            live_metrics.caption(
+                f"{len(positions):,} positions · "
+                f"${(positions['Shares'] * positions['Current_Price']).sum():,.0f} market value so far"
+            )
+        progress.empty()
+        live_metrics.empty()
+
+        if report['rows_rejected']:
+            st.warning(f"Skipped {report['rows_rejected']:,} invalid rows of {report['rows_read']:,}")
+        return report['lots'], report['positions']
+
     def render_manual_portfolio_input(self):
         """Render manual portfolio input interface"""
         st.markdown("#### Manual Portfolio Entry")
@@ -178,8 +286,9 @@ class PeerfolioApp:
     def get_current_price(self, symbol: str) -> float:
         """Fetch current price for a symbol"""
         try:
-            ticker = yf.Ticker(symbol)
-            return ticker.history(period="1d")['Close'].iloc[-1]
+            with span('yfinance.history', symbol=symbol):
+                ticker = yf.Ticker(symbol)
+                return ticker.history(period="1d")['Close'].iloc[-1]
         except:
             return 0.0
 
@@ -190,14 +299,19 @@ class PeerfolioApp:
         if st.session_state.portfolio_data is not None:
             st.markdown("---")
             
-            # Analyze portfolio
+            # Analyze portfolio (memoized by portfolio content and profile)
             if st.button("🔍 Analyze Portfolio", type="primary"):
                 with st.spinner("Analyzing your portfolio..."):
-                    analysis = self.portfolio_analyzer.analyze(
-                        st.session_state.portfolio_data,
-                        st.session_state.user_profile
-                    )
-                    st.session_state.analysis_results = analysis
+                    try:
+                        st.session_state.analysis_results = cached_analysis(
+                            self.portfolio_analyzer.analyze,
+                            st.session_state.portfolio_data,
+                            st.session_state.user_profile,
+                            sales_df=st.session_state.sales_data
+                        )
+                    except CostBasisError as e:
+                        st.session_state.analysis_results = None
+                        st.error(f"Sales do not match the portfolio: {str(e)}")
             
             if st.session_state.analysis_results:
                 self.render_analysis_results()
@@ -213,8 +327,8 @@ class PeerfolioApp:
         
         with col1:
             st.metric(
-                "Total Value",
-                f"${results['total_value']:,.0f}",
+                f"Total Value ({results['reporting_currency']})",
+                f"{results['total_value']:,.0f}",
                 f"{results['total_return']:.1f}%"
             )
         
@@ -222,7 +336,8 @@ class PeerfolioApp:
             st.metric(
                 "Diversification Score",
                 f"{results['diversification_score']:.1f}/10",
-                "Higher is better"
+                f"{results['effective_bets']:.1f} independent bets",
+                delta_color="off"
             )
         
         with col3:
@@ -239,6 +354,56 @@ class PeerfolioApp:
                 "Sustainability rating"
             )
         
+        if results['currency_exposure'].keys() - {results['reporting_currency']}:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("FX P&L", f"{results['fx_pnl']:,.0f}", "Currency moves since purchase")
+            col2.metric("Foreign Currency", f"{results['foreign_currency_weight'] * 100:.1f}%", "Share of value")
+            col3.metric("FX Volatility", f"{results['fx_volatility']:.1f}%", "Annualized, from currency mix")
+        
+        cost_basis = results['cost_basis']
+        if st.session_state.sales_data is not None:
+            col1, col2, col3 = st.columns(3)
+            currency = results['reporting_currency']
+            col1.metric(f"Realized P&L ({currency})", f"{cost_basis['realized_pnl']:,.0f}",
+                        f"{cost_basis['method'].upper()} lots")
+            col2.metric(f"Unrealized P&L ({currency})", f"{cost_basis['unrealized_pnl']:,.0f}", "Lots still held")
+            col3.metric("Lots", f"{cost_basis['lot_count']:,}", f"{len(st.session_state.sales_data):,} sales")
+        
+        # Factor model risk: market and sector factors plus what is specific to each holding
+        factor_risk = results['factor_risk']
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Volatility", f"{factor_risk['volatility']:.1f}%", "Annualized, factor model")
+        col2.metric("Factor Risk", f"{factor_risk['factor_volatility']:.1f}%",
+                    f"Market {factor_risk['factor_contributions'].get(MARKET_FACTOR, 0.0):.0f}% of variance")
+        col3.metric("Specific Risk", f"{factor_risk['specific_volatility']:.1f}%",
+                    f"{factor_risk['specific_contribution']:.0f}% of variance")
+        
+        # Historical and hypothetical shocks applied to the sector exposures
+        stress = results['stress_tests']
+        with st.expander(f"📉 Stress Tests: worst case {stress['worst_scenario']} ({stress['worst_pnl_pct']:.1f}%)"):
+            stress_df = pd.DataFrame(stress['scenarios']).rename(columns={
+                'scenario': 'Scenario', 'kind': 'Type', 'pnl': 'P&L', 'pnl_pct': 'P&L %'
+            })
+            st.dataframe(
+                stress_df.style.format({'P&L': '{:,.0f}', 'P&L %': '{:+.1f}%'}),
+                use_container_width=True, hide_index=True
+            )
+        
+        if results.get('fund_value'):
+            fund_share = results['fund_value'] / results['total_value'] * 100 if results['total_value'] else 0.0
+            with st.expander(f"🔎 Fund Look-Through: {fund_share:.1f}% held via funds"):
+                issuer_df = pd.DataFrame({
+                    'Issuer': list(results['issuer_exposure']),
+                    'Exposure': list(results['issuer_exposure'].values())
+                })
+                issuer_df['Share %'] = issuer_df['Exposure'] / results['total_value'] * 100
+                st.dataframe(
+                    issuer_df.style.format({'Exposure': '{:,.0f}', 'Share %': '{:.1f}%'}),
+                    use_container_width=True, hide_index=True
+                )
+        
+        self.render_live_valuation()
+        
         # Portfolio composition chart
         col1, col2 = st.columns(2)
         
@@ -269,7 +434,7 @@ class PeerfolioApp:
             )
             fig.update_layout(
                 title="Risk vs Return by Holding",
-                xaxis_title="Risk (Volatility)",
+                xaxis_title="Risk (Volatility %)",
                 yaxis_title="Return (%)",
                 plot_bgcolor='rgba(0,0,0,0)',
                 paper_bgcolor='rgba(0,0,0,0)',
@@ -281,7 +446,72 @@ class PeerfolioApp:
         st.markdown("### 💡 Key Recommendations")
         for i, rec in enumerate(results['recommendations'], 1):
             st.markdown(f"**{i}.** {rec}")
+        
+        # Tax-loss harvesting candidates, best tax value per dollar traded first
+        if results.get('harvest_opportunities'):
+            st.markdown("### 💸 Tax-Loss Harvesting Opportunities")
+            harvest_df = pd.DataFrame(results['harvest_opportunities']).rename(columns={
+                'symbol': 'Symbol', 'shares': 'Shares', 'lots': 'Lots', 'market_value': 'Market Value',
+                'loss': 'Loss', 'tax_value': 'Tax Value', 'tax_value_per_dollar': 'Tax Value / $',
+                'replacements': 'Replacements'
+            })
+            st.dataframe(
+                harvest_df.style.format({
+                    'Shares': '{:,.0f}', 'Market Value': '${:,.0f}', 'Loss': '${:,.0f}',
+                    'Tax Value': '${:,.0f}', 'Tax Value / $': '{:.1%}'
+                }),
+                use_container_width=True
+            )
 
+    def render_live_valuation(self):
+        """Stream price ticks into the session portfolio, refreshing at a fixed frame rate"""
+        with st.expander("⚡ Live Valuation"):
+            feeds = list(TICK_FEEDS)
+            feed_name = st.selectbox("Price feed", feeds, index=feeds.index(LIVE_FEED))
+            if not st.button(f"▶️ Stream for {LIVE_SESSION_SECONDS}s"):
+                return
+            
+            portfolio_df = st.session_state.portfolio_data
+            currency = reporting_currency(st.session_state.user_profile)
+            engine = LiveValuationEngine(self.portfolio_analyzer.sector_mapping, currency)
+            engine.add_portfolio('session', portfolio_df)
+            options = {
+                'simulated': {'prices': dict(zip(portfolio_df['Symbol'], portfolio_df['Current_Price']))},
+                'replay': {'path': LIVE_REPLAY_PATH, 'speed': 1.0},
+                'socket': {'address': LIVE_SOCKET_ADDRESS}
+            }.get(feed_name, {})
+            metrics_placeholder = st.empty()
+            table_placeholder = st.empty()
+            
+            def render_frame(frame):
+                snapshot = frame['session']
+                with metrics_placeholder.container():
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric(f"Live Value ({currency})", f"{snapshot['total_value']:,.0f}",
+                                f"{snapshot['total_return']:.2f}%")
+                    col2.metric(f"Live P&L ({currency})", f"{snapshot['total_pl']:+,.0f}")
+                    col3.metric("Diversification (HHI)", f"{snapshot['diversification_score']:.1f}/10",
+                                f"HHI {snapshot['herfindahl']:.3f}", delta_color="off")
+                table_placeholder.dataframe(
+                    snapshot['holdings'].style.format({
+                        # Prices are local quotes; values and P&L are in the reporting currency
+                        'Current_Price': '{:,.2f}', 'Market_Value': '{:,.0f}', 'P&L': '{:+,.0f}',
+                        'Return_%': '{:+.2f}%', 'Weight_%': '{:.2f}%'
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
+            
+            try:
+                with span('live_valuation.session', feed=feed_name):
+                    asyncio.run(engine.run(
+                        TICK_FEEDS[feed_name](**options), render_frame,
+                        duration=LIVE_SESSION_SECONDS, include_holdings=True
+                    ))
+            except OSError as e:
+                st.error(f"Live feed '{feed_name}' is unavailable: {e}")
+            st.caption(f"{engine.ticks:,} ticks applied, {engine.ignored_ticks:,} for symbols not held")
+    
     def render_peer_insights_page(self):
         """Render peer insights page"""
         st.markdown("### 👥 Peer Portfolio Insights")
@@ -298,7 +528,8 @@ class PeerfolioApp:
         
         with col2:
             avg_return = np.mean([p['performance'] for p in peers])
-            st.metric("Average Return", f"{avg_return:.1f}%")
+            avg_drawdown = np.mean([p['max_drawdown'] for p in peers])
+            st.metric("Average Return", f"{avg_return:.1f}%", f"{avg_drawdown:.1f}% max drawdown", delta_color="off")
         
         with col3:
             popular_sector = max(set([p['top_sector'] for p in peers]), 
@@ -327,10 +558,69 @@ class PeerfolioApp:
         )
         st.plotly_chart(fig, use_container_width=True)
         
+        # Each strategy's template allocation backtested with periodic rebalancing over the sector history
+        backtester = self.peer_matcher.backtester
+        st.markdown(
+            f"#### 🧪 Strategy Backtests ({backtester.dates[0]:%b %Y} - {backtester.dates[-1]:%b %Y})"
+        )
+        backtest_df = self.peer_matcher.strategy_backtests.rename_axis('Strategy').reset_index().rename(columns={
+            'total_return': 'Total Return', 'annual_return': 'Annual Return', 'volatility': 'Volatility',
+            'max_drawdown': 'Max Drawdown', 'sharpe_ratio': 'Sharpe Ratio'
+        })
+        st.dataframe(
+            backtest_df.style.format({
+                'Total Return': '{:.1f}%', 'Annual Return': '{:.1f}%', 'Volatility': '{:.1f}%',
+                'Max Drawdown': '{:.1f}%', 'Sharpe Ratio': '{:.2f}'
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        # Where the user's return ranks within their cohort and each coarser cohort
+        st.markdown("#### 📊 Where You Rank Among Peers")
+        
+        if st.session_state.analysis_results:
+            percentiles = self.peer_matcher.performance_percentiles(
+                st.session_state.user_profile, st.session_state.analysis_results['total_return']
+            )
+            percentile_df = pd.DataFrame(percentiles).rename(columns={
+                'cohort': 'Cohort', 'peers': 'Peers', 'percentile': 'Your Percentile',
+                'median_return': 'Median Return', 'top_decile_return': 'Top 10% Return'
+            })
+            st.dataframe(
+                percentile_df.style.format({
+                    'Peers': '{:,.0f}', 'Your Percentile': '{:.0f}th',
+                    'Median Return': '{:.1f}%', 'Top 10% Return': '{:.1f}%'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("Analyze your portfolio to see your return percentile among peers.")
+        
+        # Cohort returns rolled up from the materialized peer cube, within the user's net-worth bracket
+        net_worth = st.session_state.user_profile.get('net_worth', '$2.5M - $5M')
+        st.markdown(f"#### 🌍 Peer Returns by Location & Age ({net_worth})")
+        
+        cohorts = self.peer_matcher.cohort_cube.rollup(['location', 'age_band'], net_worth=net_worth)
+        fig = px.imshow(
+            cohorts.pivot(index='location', columns='age_band', values='avg_return'),
+            labels={'x': 'Age Band', 'y': 'Location', 'color': 'Avg Return %'},
+            text_auto='.1f',
+            color_continuous_scale='RdYlGn',
+            aspect='auto'
+        )
+        fig.update_layout(
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font_color='white'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        
         # Top performing peers
         st.markdown("#### 🏆 Top Performing Peer Portfolios")
         
-        top_peers = sorted(peers, key=lambda x: x['performance'], reverse=True)[:5]
+        top_peers = heapq.nlargest(5, peers, key=lambda x: x['performance'])
         
         for i, peer in enumerate(top_peers, 1):
             with st.expander(f"#{i} - {peer['age']}yo {peer['location']} ({peer['performance']:.1f}% return)"):
@@ -340,9 +630,10 @@ class PeerfolioApp:
                     st.markdown(f"**Strategy:** {peer['strategy']}")
                     st.markdown(f"**Top Sector:** {peer['top_sector']}")
                     st.markdown(f"**Risk Level:** {peer['risk_level']}")
+                    st.markdown(f"**Volatility:** {peer['volatility']:.1f}%")
+                    st.markdown(f"**Max Drawdown:** {peer['max_drawdown']:.1f}%")
                 
                 with col2:
-                    # Mock allocation data
                     allocation = peer['allocation']
                     fig = px.pie(
                         values=list(allocation.values()),
@@ -389,15 +680,14 @@ class PeerfolioApp:
             )
             
             if user_question and st.button("Ask AI Advisor"):
-                with st.spinner("AI is thinking..."):
-                    response = self.ai_advisor.chat_response(
-                        user_question,
-                        st.session_state.user_profile,
-                        st.session_state.portfolio_data
-                    )
-                    
-                    st.markdown("#### 🎯 AI Advisor Response")
-                    st.markdown(response)
+                st.markdown("#### 🎯 AI Advisor Response")
+                
+                # Stream chunks so the answer starts painting before it is fully assembled
+                st.write_stream(self.ai_advisor.chat_response_stream(
+                    user_question,
+                    st.session_state.user_profile,
+                    st.session_state.portfolio_data
+                ))
         else:
             st.warning("Please upload your portfolio first to get AI recommendations.")
 
@@ -420,8 +710,9 @@ class PeerfolioApp:
             
             for symbol, name in indices.items():
                 try:
-                    ticker = yf.Ticker(symbol)
-                    hist = ticker.history(period="5d")
+                    with span('yfinance.history', symbol=symbol):
+                        ticker = yf.Ticker(symbol)
+                        hist = ticker.history(period="5d")
                     current = hist['Close'].iloc[-1]
                     prev = hist['Close'].iloc[-2]
                     change = ((current - prev) / prev) * 100
@@ -441,8 +732,9 @@ class PeerfolioApp:
             
             for symbol in crypto_symbols:
                 try:
-                    ticker = yf.Ticker(symbol)
-                    hist = ticker.history(period="5d")
+                    with span('yfinance.history', symbol=symbol):
+                        ticker = yf.Ticker(symbol)
+                        hist = ticker.history(period="5d")
                     current = hist['Close'].iloc[-1]
                     prev = hist['Close'].iloc[-2]
                     change = ((current - prev) / prev) * 100
@@ -477,15 +769,19 @@ class PeerfolioApp:
         # Sidebar navigation
         selected_page = self.render_sidebar()
         
-        # Main content area
-        if selected_page == "Portfolio Analysis":
-            self.render_portfolio_analysis_page()
-        elif selected_page == "Peer Insights":
-            self.render_peer_insights_page()
-        elif selected_page == "AI Recommendations":
-            self.render_ai_recommendations_page()
-        elif selected_page == "Market Intelligence":
-            self.render_market_intelligence_page()
+        # Main content area; ?profile=1 (DEBUG_MODE only) or PEERFOLIO_PROFILE profiles this render
+        with page_profiler(selected_page, requested_mode(st.query_params.get('profile'))) as profile:
+            if selected_page == "Portfolio Analysis":
+                self.render_portfolio_analysis_page()
+            elif selected_page == "Peer Insights":
+                self.render_peer_insights_page()
+            elif selected_page == "AI Recommendations":
+                self.render_ai_recommendations_page()
+            elif selected_page == "Market Intelligence":
+                self.render_market_intelligence_page()
+        
+        if profile:
+            render_profile_panel(st.sidebar, profile.report)
         
         # Footer
         st.markdown("---")
@@ -3,11 +3,35 @@ import pandas as pd
 import numpy as np
 import random
 from datetime import datetime
-import plotly.express as px
+from functools import lru_cache
+from typing import Tuple
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import seaborn as sns
-import matplotlib.pyplot as plt
+import plotly.io as pio
+
+from utils.recommendation_rules import SUMMARY_ENGINE, build_context
+from utils.analysis_cache import cached_analysis
+from utils.chart_downsampling import downsample_frame, render_mode
+from utils.portfolio_ingest import IngestError, stream_portfolio
+from utils.portfolio_frame import PortfolioFrame
+from utils.fx import conversion_rates, reporting_currency
+from utils.diversification import DiversificationModel
+from utils.factor_risk import FactorRiskModel
+from utils.profiling import page_profiler, render_profile_panel, requested_mode
+from utils.lazy_imports import lazy_import
+from config.settings import ALLOWED_FILE_TYPES
+
+# plotly.express loads on the first page that draws a chart, not at startup
+px = lazy_import('plotly.express')
+
+# Simple sector mapping
+SECTOR_MAP = {
+    'AAPL': 'Technology', 'MSFT': 'Technology', 'GOOGL': 'Technology',
+    'NVDA': 'Technology', 'TSLA': 'Automotive', 'META': 'Technology',
+    'AMZN': 'E-commerce', 'JNJ': 'Healthcare', 'PFE': 'Healthcare',
+    'PG': 'Consumer Goods', 'KO': 'Consumer Goods', 'NEE': 'Utilities',
+    'SO': 'Utilities', 'V': 'Financial', 'MA': 'Financial',
+    'JPM': 'Financial', 'BAC': 'Financial', 'BRK.B': 'Financial'
+}
 
 # Set page config
 st.set_page_config(
@@ -380,15 +404,19 @@ def main():
         label_visibility="collapsed"
     )
     
-    # Main content
-    if page == "Portfolio Analysis":
-        portfolio_analysis_page(user_profile)
-    elif page == "Peer Insights":
-        peer_insights_page(user_profile)
-    elif page == "AI Recommendations":
-        ai_recommendations_page(user_profile)
-    elif page == "Market Intelligence":
-        market_intelligence_page(user_profile)
+    # Main content; ?profile=1 (DEBUG_MODE only) or PEERFOLIO_PROFILE profiles this render
+    with page_profiler(page, requested_mode(st.query_params.get('profile'))) as profile:
+        if page == "Portfolio Analysis":
+            portfolio_analysis_page(user_profile)
+        elif page == "Peer Insights":
+            peer_insights_page(user_profile)
+        elif page == "AI Recommendations":
+            ai_recommendations_page(user_profile)
+        elif page == "Market Intelligence":
+            market_intelligence_page(user_profile)
+    
+    if profile:
+        render_profile_panel(st.sidebar, profile.report)
 
 def portfolio_analysis_page(user_profile):
     st.markdown('''
@@ -400,23 +428,24 @@ def portfolio_analysis_page(user_profile):
     
     upload_method = st.radio(
         "Choose upload method:",
-        ["Upload CSV", "Use Sample Data", "Manual Input"]
+        ["Upload File", "Use Sample Data", "Manual Input"]
     )
     
-    if upload_method == "Upload CSV":
+    if upload_method == "Upload File":
         uploaded_file = st.file_uploader(
-            "Upload your portfolio CSV file",
-            type=['csv'],
-            help="CSV should contain columns: Symbol, Shares, Purchase_Price, Current_Price"
+            "Upload your portfolio file",
+            type=ALLOWED_FILE_TYPES,
+            help="CSV, Excel or JSON with columns: Symbol, Shares, Purchase_Price, Current_Price"
         )
         
         if uploaded_file:
             try:
-                portfolio_df = pd.read_csv(uploaded_file)
+                # This page analyzes positions; the lot rows matter only to the full app's tax and FX analysis
+                _, positions = ingest_upload(uploaded_file)
                 st.success("Portfolio uploaded successfully!")
-                display_portfolio_analysis(portfolio_df, user_profile)
-            except Exception as e:
-                st.error(f"Error reading CSV: {str(e)}")
+                display_portfolio_analysis(positions, user_profile)
+            except IngestError as e:
+                st.error(f"Error reading portfolio: {str(e)}")
     
     elif upload_method == "Use Sample Data":
         if st.button("Generate Sample Portfolio"):
@@ -482,20 +511,373 @@ def generate_sample_portfolio(user_profile):
     
     return pd.DataFrame(stocks)
 
+def build_portfolio_analysis(portfolio_df, user_profile):
+    """Compute metrics, recommendations and serialized charts for the analysis page"""
+    # Derived columns are computed once on a read-only frame; charts get copy-free views of it.
+    # Values are converted like the full app's, so foreign listings (.SI, .HK, ...) add up in one currency
+    _, fx_rates, purchase_fx_rates = conversion_rates(portfolio_df, reporting_currency(user_profile))
+    frame = PortfolioFrame(portfolio_df, SECTOR_MAP, fx_rates, purchase_fx_rates)
+    holdings = frame.view(['Symbol', 'Shares', 'Purchase_Price', 'Current_Price',
+                           'Market_Value', 'Cost_Basis', 'P&L', 'Return_%', 'Weight_%'])
+    
+    total_value = frame.total('Market_Value')
+    total_cost = frame.total('Cost_Basis')
+    total_return = (total_value - total_cost) / total_cost * 100 if total_cost else 0.0
+    total_pl = total_value - total_cost
+    
+    figures = {}
+    
+    # Pie chart for portfolio allocation
+    fig_pie = px.pie(
+        holdings, 
+        values='Market_Value', 
+        names='Symbol',
+        title="Portfolio Allocation by Market Value",
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    fig_pie.update_layout(
+        plot_bgcolor='rgba(255,255,255,0)',
+        paper_bgcolor='rgba(255,255,255,0)',
+        font_color='#1e293b',
+        title_font_size=18,
+        title_font_weight=600,
+        showlegend=True,
+        height=400,
+        title_x=0.5
+    )
+    fig_pie.update_traces(
+        textposition='inside', 
+        textinfo='percent+label',
+        textfont_size=12,
+        marker=dict(line=dict(color='#ffffff', width=2))
+    )
+    figures['pie'] = fig_pie
+    
+    # Bar chart for individual stock returns
+    fig_bar = px.bar(
+        holdings, 
+        x='Symbol', 
+        y='Return_%',
+        title="Individual Stock Returns (%)",
+        color='Return_%',
+        color_continuous_scale=['#ef4444', '#fbbf24', '#10b981'],
+        text='Return_%'
+    )
+    fig_bar.update_layout(
+        plot_bgcolor='rgba(255,255,255,0)',
+        paper_bgcolor='rgba(255,255,255,0)',
+        font_color='#1e293b',
+        title_font_size=18,
+        title_font_weight=600,
+        xaxis_title="Stock Symbol",
+        yaxis_title="Return (%)",
+        height=400,
+        title_x=0.5,
+        xaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        )
+    )
+    fig_bar.update_traces(
+        texttemplate='%{text:.1f}%', 
+        textposition='outside',
+        textfont_color='#1e293b'
+    )
+    figures['bar'] = fig_bar
+    
+    # Horizontal bar chart for weights (the axis orders the bars, so no sorted copy is needed)
+    fig_weight = px.bar(
+        holdings, 
+        x='Weight_%', 
+        y='Symbol',
+        title="Portfolio Weight Distribution (%)",
+        orientation='h',
+        color='Weight_%',
+        color_continuous_scale='Blues',
+        text='Weight_%'
+    )
+    fig_weight.update_layout(
+        plot_bgcolor='rgba(255,255,255,0)',
+        paper_bgcolor='rgba(255,255,255,0)',
+        font_color='#1e293b',
+        title_font_size=18,
+        title_font_weight=600,
+        xaxis_title="Weight (%)",
+        yaxis_title="Stock Symbol",
+        height=400,
+        title_x=0.5,
+        xaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b',
+            categoryorder='total ascending'
+        )
+    )
+    fig_weight.update_traces(
+        texttemplate='%{text:.1f}%', 
+        textposition='outside',
+        textfont_color='#1e293b'
+    )
+    figures['weight'] = fig_weight
+    
+    # Waterfall chart for P&L
+    fig_pl = go.Figure(go.Waterfall(
+        name="P&L",
+        orientation="v",
+        measure=["relative"] * len(frame),
+        x=frame['Symbol'],
+        y=frame['P&L'],
+        text=[f"${x:+,.0f}" for x in frame.values('P&L')],
+        textposition="outside",
+        textfont=dict(color='#1e293b'),
+        connector={"line": {"color": "#64748b"}},
+        increasing={"marker": {"color": "#10b981"}},
+        decreasing={"marker": {"color": "#ef4444"}},
+    ))
+    fig_pl.update_layout(
+        title="Profit & Loss by Stock",
+        plot_bgcolor='rgba(255,255,255,0)',
+        paper_bgcolor='rgba(255,255,255,0)',
+        font_color='#1e293b',
+        title_font_size=18,
+        title_font_weight=600,
+        xaxis_title="Stock Symbol",
+        yaxis_title="P&L ($)",
+        height=400,
+        title_x=0.5,
+        xaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        )
+    )
+    figures['pl'] = fig_pl
+    
+    # Scatter plot for risk vs return (using volatility proxy)
+    volatility_proxy = np.abs(frame.values('Return_%')) + np.random.uniform(5, 15, len(frame))
+    scatter_frame = frame.with_columns({'Volatility_Proxy': volatility_proxy})
+    
+    fig_scatter = px.scatter(
+        scatter_frame.view(['Symbol', 'Volatility_Proxy', 'Return_%', 'Market_Value']), 
+        x='Volatility_Proxy', 
+        y='Return_%',
+        size='Market_Value',
+        color='Symbol',
+        title="Risk vs Return Analysis",
+        labels={'Volatility_Proxy': 'Risk (Volatility Proxy)', 'Return_%': 'Return (%)'},
+        hover_data=['Market_Value'],
+        color_discrete_sequence=px.colors.qualitative.Set2
+    )
+    fig_scatter.update_layout(
+        plot_bgcolor='rgba(255,255,255,0)',
+        paper_bgcolor='rgba(255,255,255,0)',
+        font_color='#1e293b',
+        title_font_size=18,
+        title_font_weight=600,
+        height=400,
+        title_x=0.5,
+        xaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        )
+    )
+    fig_scatter.update_traces(
+        marker=dict(
+            line=dict(color='#ffffff', width=1),
+            opacity=0.8
+        )
+    )
+    figures['scatter'] = fig_scatter
+    
+    # Comparison chart: one trace per column instead of a melted long-format copy
+    fig_comparison = go.Figure([
+        go.Bar(name=column, x=frame['Symbol'], y=frame[column], marker_color=color)
+        for column, color in [('Market_Value', '#10b981'), ('Cost_Basis', '#3b82f6')]
+    ])
+    fig_comparison.update_layout(
+        title="Market Value vs Cost Basis",
+        barmode='group',
+        plot_bgcolor='rgba(255,255,255,0)',
+        paper_bgcolor='rgba(255,255,255,0)',
+        font_color='#1e293b',
+        title_font_size=18,
+        title_font_weight=600,
+        xaxis_title="Stock Symbol",
+        yaxis_title="Value ($)",
+        height=400,
+        title_x=0.5,
+        xaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        ),
+        legend=dict(
+            title_text='Type',
+            bgcolor='rgba(255,255,255,0.8)',
+            bordercolor='rgba(0,0,0,0.1)',
+            borderwidth=1
+        )
+    )
+    figures['comparison'] = fig_comparison
+    
+    # Sector allocation chart
+    sector_data = create_sector_analysis_chart(frame)
+    
+    fig_sector = px.pie(
+        sector_data,
+        values='Market_Value',
+        names='Sector',
+        title="Portfolio Allocation by Sector",
+        color_discrete_sequence=px.colors.qualitative.Pastel1
+    )
+    fig_sector.update_layout(
+        plot_bgcolor='rgba(255,255,255,0)',
+        paper_bgcolor='rgba(255,255,255,0)',
+        font_color='#1e293b',
+        title_font_size=18,
+        title_font_weight=600,
+        height=400,
+        title_x=0.5
+    )
+    fig_sector.update_traces(
+        textposition='inside', 
+        textinfo='percent+label',
+        textfont_size=12,
+        marker=dict(line=dict(color='#ffffff', width=2))
+    )
+    figures['sector'] = fig_sector
+    
+    # Historical performance chart (downsampled to the chart width)
+    perf_history_df = create_portfolio_performance_history(frame)
+    portfolio_history = downsample_frame(perf_history_df[['Portfolio']])
+    
+    fig_history = px.line(
+        portfolio_history,
+        x='Date',
+        y='Value',
+        title="Portfolio Performance Over Time",
+        labels={'Value': 'Portfolio Value ($)'},
+        color_discrete_sequence=['#3b82f6'],
+        render_mode=render_mode(len(portfolio_history))
+    )
+    fig_history.update_layout(
+        plot_bgcolor='rgba(255,255,255,0)',
+        paper_bgcolor='rgba(255,255,255,0)',
+        font_color='#1e293b',
+        title_font_size=18,
+        title_font_weight=600,
+        height=400,
+        title_x=0.5,
+        xaxis_title="Date",
+        yaxis_title="Portfolio Value ($)",
+        xaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(0,0,0,0.1)',
+            color='#64748b'
+        )
+    )
+    fig_history.update_traces(
+        line=dict(width=3, color='#3b82f6'),
+        fill='tonexty',
+        fillcolor='rgba(59, 130, 246, 0.1)'
+    )
+    figures['history'] = fig_history
+    
+    # Per-asset performance history chart (reuses the same simulated history)
+    asset_history = downsample_frame(perf_history_df)
+    
+    fig_history = px.line(
+        asset_history,
+        x='Date',
+        y='Value',
+        color='Asset',
+        title="Portfolio Performance Over Time",
+        labels={'Value': 'Portfolio Value ($)'},
+        template="plotly_dark",
+        render_mode=render_mode(len(asset_history))
+    )
+    fig_history.update_layout(
+        xaxis_title="Date",
+        yaxis_title="Value ($)",
+        legend_title="Assets",
+        height=400
+    )
+    figures['history_assets'] = fig_history
+    
+    return {
+        'holdings': holdings,
+        'total_value': total_value,
+        'total_return': total_return,
+        'total_pl': total_pl,
+        'diversification_score': calculate_diversification_score(frame),
+        'risk_level': assess_risk_level(frame),
+        'esg_score': calculate_esg_score(frame),
+        'recommendations': generate_recommendations(holdings, user_profile, total_value),
+        'figures': {name: fig.to_json() for name, fig in figures.items()}
+    }
+
+def ingest_upload(uploaded_file) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Stream an upload, updating progress and live totals per chunk; returns (lots, positions)"""
+    progress = st.progress(0.0, text="Reading portfolio...")
+    live_metrics = st.empty()
+    report = {}
+    for report in stream_portfolio(uploaded_file):
+        positions = report['positions']
+        progress.progress(report['fraction'] or 0.0, text=f"Read {report['rows_read']:,} rows")
+        live_metrics.caption(
+            f"{len(positions):,} positions · "
+            f"${(positions['Shares'] * positions['Current_Price']).sum():,.0f} market value so far"
+        )
+    progress.empty()
+    live_metrics.empty()
+
+    if report['rows_rejected']:
+        st.warning(f"Skipped {report['rows_rejected']:,} invalid rows of {report['rows_read']:,}")
+    return report['lots'], report['positions']
+
 def display_portfolio_analysis(portfolio_df, user_profile):
     """Display comprehensive portfolio analysis with enhanced UI and graphs"""
     
-    # Calculate metrics
-    portfolio_df['Market_Value'] = portfolio_df['Shares'] * portfolio_df['Current_Price']
-    portfolio_df['Cost_Basis'] = portfolio_df['Shares'] * portfolio_df['Purchase_Price']
-    portfolio_df['P&L'] = portfolio_df['Market_Value'] - portfolio_df['Cost_Basis']
-    portfolio_df['Return_%'] = (portfolio_df['P&L'] / portfolio_df['Cost_Basis']) * 100
-    portfolio_df['Weight_%'] = (portfolio_df['Market_Value'] / portfolio_df['Market_Value'].sum()) * 100
+    # Reruns with an unchanged portfolio and profile reuse the cached metrics and charts
+    analysis = cached_analysis(build_portfolio_analysis, portfolio_df, user_profile, namespace='simple')
+    figures = {name: pio.from_json(fig_json) for name, fig_json in analysis['figures'].items()}
     
-    total_value = portfolio_df['Market_Value'].sum()
-    total_cost = portfolio_df['Cost_Basis'].sum()
-    total_return = ((total_value - total_cost) / total_cost) * 100
-    total_pl = total_value - total_cost
+    portfolio_df = analysis['holdings']
+    total_value = analysis['total_value']
+    total_return = analysis['total_return']
+    total_pl = analysis['total_pl']
     
     # Portfolio Header
     st.markdown(f'''
@@ -520,7 +902,7 @@ def display_portfolio_analysis(portfolio_df, user_profile):
         ''', unsafe_allow_html=True)
     
     with col2:
-        diversification_score = calculate_diversification_score(portfolio_df)
+        diversification_score = analysis['diversification_score']
         st.markdown(f'''
         <div class="growth-metric">
             <h3>📈 Diversification</h3>
@@ -530,7 +912,7 @@ def display_portfolio_analysis(portfolio_df, user_profile):
         ''', unsafe_allow_html=True)
     
     with col3:
-        risk_level = assess_risk_level(portfolio_df)
+        risk_level = analysis['risk_level']
         risk_color = "#f87171" if risk_level == "High" else "#fbbf24" if risk_level == "Moderate" else "#34d399"
         st.markdown(f'''
         <div class="risk-metric">
@@ -541,7 +923,7 @@ def display_portfolio_analysis(portfolio_df, user_profile):
         ''', unsafe_allow_html=True)
     
     with col4:
-        esg_score = calculate_esg_score(portfolio_df)
+        esg_score = analysis['esg_score']
         st.markdown(f'''
         <div class="esg-metric">
             <h3>🌱 ESG Score</h3>
@@ -559,75 +941,13 @@ def display_portfolio_analysis(portfolio_df, user_profile):
     with col1:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.subheader("💼 Portfolio Composition")
-        
-        # Pie chart for portfolio allocation
-        fig_pie = px.pie(
-            portfolio_df, 
-            values='Market_Value', 
-            names='Symbol',
-            title="Portfolio Allocation by Market Value",
-            color_discrete_sequence=px.colors.qualitative.Set3
-        )
-        fig_pie.update_layout(
-            plot_bgcolor='rgba(255,255,255,0)',
-            paper_bgcolor='rgba(255,255,255,0)',
-            font_color='#1e293b',
-            title_font_size=18,
-            title_font_weight=600,
-            showlegend=True,
-            height=400,
-            title_x=0.5
-        )
-        fig_pie.update_traces(
-            textposition='inside', 
-            textinfo='percent+label',
-            textfont_size=12,
-            marker=dict(line=dict(color='#ffffff', width=2))
-        )
-        st.plotly_chart(fig_pie, use_container_width=True)
+        st.plotly_chart(figures['pie'], use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.subheader("📊 Individual Stock Performance")
-        
-        # Bar chart for individual stock returns
-        fig_bar = px.bar(
-            portfolio_df, 
-            x='Symbol', 
-            y='Return_%',
-            title="Individual Stock Returns (%)",
-            color='Return_%',
-            color_continuous_scale=['#ef4444', '#fbbf24', '#10b981'],
-            text='Return_%'
-        )
-        fig_bar.update_layout(
-            plot_bgcolor='rgba(255,255,255,0)',
-            paper_bgcolor='rgba(255,255,255,0)',
-            font_color='#1e293b',
-            title_font_size=18,
-            title_font_weight=600,
-            xaxis_title="Stock Symbol",
-            yaxis_title="Return (%)",
-            height=400,
-            title_x=0.5,
-            xaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            ),
-            yaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            )
-        )
-        fig_bar.update_traces(
-            texttemplate='%{text:.1f}%', 
-            textposition='outside',
-            textfont_color='#1e293b'
-        )
-        st.plotly_chart(fig_bar, use_container_width=True)
+        st.plotly_chart(figures['bar'], use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Row 2: Portfolio Weight Distribution and P&L Analysis
@@ -636,88 +956,13 @@ def display_portfolio_analysis(portfolio_df, user_profile):
     with col1:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.subheader("⚖️ Portfolio Weight Distribution")
-        
-        # Horizontal bar chart for weights
-        fig_weight = px.bar(
-            portfolio_df.sort_values('Weight_%', ascending=True), 
-            x='Weight_%', 
-            y='Symbol',
-            title="Portfolio Weight Distribution (%)",
-            orientation='h',
-            color='Weight_%',
-            color_continuous_scale='Blues',
-            text='Weight_%'
-        )
-        fig_weight.update_layout(
-            plot_bgcolor='rgba(255,255,255,0)',
-            paper_bgcolor='rgba(255,255,255,0)',
-            font_color='#1e293b',
-            title_font_size=18,
-            title_font_weight=600,
-            xaxis_title="Weight (%)",
-            yaxis_title="Stock Symbol",
-            height=400,
-            title_x=0.5,
-            xaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            ),
-            yaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            )
-        )
-        fig_weight.update_traces(
-            texttemplate='%{text:.1f}%', 
-            textposition='outside',
-            textfont_color='#1e293b'
-        )
-        st.plotly_chart(fig_weight, use_container_width=True)
+        st.plotly_chart(figures['weight'], use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.subheader("💹 Profit & Loss Analysis")
-        
-        # Waterfall chart for P&L
-        fig_pl = go.Figure(go.Waterfall(
-            name="P&L",
-            orientation="v",
-            measure=["relative"] * len(portfolio_df),
-            x=portfolio_df['Symbol'],
-            y=portfolio_df['P&L'],
-            text=portfolio_df['P&L'].apply(lambda x: f"${x:+,.0f}"),
-            textposition="outside",
-            textfont=dict(color='#1e293b'),
-            connector={"line": {"color": "#64748b"}},
-            increasing={"marker": {"color": "#10b981"}},
-            decreasing={"marker": {"color": "#ef4444"}},
-        ))
-        fig_pl.update_layout(
-            title="Profit & Loss by Stock",
-            plot_bgcolor='rgba(255,255,255,0)',
-            paper_bgcolor='rgba(255,255,255,0)',
-            font_color='#1e293b',
-            title_font_size=18,
-            title_font_weight=600,
-            xaxis_title="Stock Symbol",
-            yaxis_title="P&L ($)",
-            height=400,
-            title_x=0.5,
-            xaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            ),
-            yaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            )
-        )
-        st.plotly_chart(fig_pl, use_container_width=True)
+        st.plotly_chart(figures['pl'], use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Row 3: Risk-Return Analysis and Market Value Comparison
@@ -726,97 +971,13 @@ def display_portfolio_analysis(portfolio_df, user_profile):
     with col1:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.subheader("� Risk-Return Analysis")
-        
-        # Scatter plot for risk vs return (using volatility proxy)
-        portfolio_df['Volatility_Proxy'] = portfolio_df['Return_%'].abs() + np.random.uniform(5, 15, len(portfolio_df))
-        
-        fig_scatter = px.scatter(
-            portfolio_df, 
-            x='Volatility_Proxy', 
-            y='Return_%',
-            size='Market_Value',
-            color='Symbol',
-            title="Risk vs Return Analysis",
-            labels={'Volatility_Proxy': 'Risk (Volatility Proxy)', 'Return_%': 'Return (%)'},
-            hover_data=['Market_Value'],
-            color_discrete_sequence=px.colors.qualitative.Set2
-        )
-        fig_scatter.update_layout(
-            plot_bgcolor='rgba(255,255,255,0)',
-            paper_bgcolor='rgba(255,255,255,0)',
-            font_color='#1e293b',
-            title_font_size=18,
-            title_font_weight=600,
-            height=400,
-            title_x=0.5,
-            xaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            ),
-            yaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            )
-        )
-        fig_scatter.update_traces(
-            marker=dict(
-                line=dict(color='#ffffff', width=1),
-                opacity=0.8
-            )
-        )
-        st.plotly_chart(fig_scatter, use_container_width=True)
+        st.plotly_chart(figures['scatter'], use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.subheader("💰 Market Value vs Cost Basis")
-        
-        # Comparison chart
-        comparison_df = portfolio_df.melt(
-            id_vars=['Symbol'], 
-            value_vars=['Market_Value', 'Cost_Basis'],
-            var_name='Type', 
-            value_name='Value'
-        )
-        
-        fig_comparison = px.bar(
-            comparison_df, 
-            x='Symbol', 
-            y='Value',
-            color='Type',
-            title="Market Value vs Cost Basis",
-            barmode='group',
-            color_discrete_map={'Market_Value': '#10b981', 'Cost_Basis': '#3b82f6'}
-        )
-        fig_comparison.update_layout(
-            plot_bgcolor='rgba(255,255,255,0)',
-            paper_bgcolor='rgba(255,255,255,0)',
-            font_color='#1e293b',
-            title_font_size=18,
-            title_font_weight=600,
-            xaxis_title="Stock Symbol",
-            yaxis_title="Value ($)",
-            height=400,
-            title_x=0.5,
-            xaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            ),
-            yaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            ),
-            legend=dict(
-                bgcolor='rgba(255,255,255,0.8)',
-                bordercolor='rgba(0,0,0,0.1)',
-                borderwidth=1
-            )
-        )
-        st.plotly_chart(fig_comparison, use_container_width=True)
+        st.plotly_chart(figures['comparison'], use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Row 4: Sector Analysis and Portfolio Performance History
@@ -825,77 +986,13 @@ def display_portfolio_analysis(portfolio_df, user_profile):
     with col1:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.subheader("🏢 Sector Analysis")
-        
-        # Sector allocation chart
-        sector_data = create_sector_analysis_chart(portfolio_df)
-        
-        fig_sector = px.pie(
-            sector_data,
-            values='Market_Value',
-            names='Sector',
-            title="Portfolio Allocation by Sector",
-            color_discrete_sequence=px.colors.qualitative.Pastel1
-        )
-        fig_sector.update_layout(
-            plot_bgcolor='rgba(255,255,255,0)',
-            paper_bgcolor='rgba(255,255,255,0)',
-            font_color='#1e293b',
-            title_font_size=18,
-            title_font_weight=600,
-            height=400,
-            title_x=0.5
-        )
-        fig_sector.update_traces(
-            textposition='inside', 
-            textinfo='percent+label',
-            textfont_size=12,
-            marker=dict(line=dict(color='#ffffff', width=2))
-        )
-        st.plotly_chart(fig_sector, use_container_width=True)
+        st.plotly_chart(figures['sector'], use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.subheader("📅 Portfolio Performance History")
-        
-        # Historical performance chart
-        perf_data = create_portfolio_performance_history(portfolio_df)
-        
-        fig_history = px.line(
-            perf_data.reset_index(),
-            x='index',
-            y='Portfolio',
-            title="Portfolio Performance Over Time",
-            labels={'index': 'Date', 'Portfolio': 'Portfolio Value ($)'},
-            color_discrete_sequence=['#3b82f6']
-        )
-        fig_history.update_layout(
-            plot_bgcolor='rgba(255,255,255,0)',
-            paper_bgcolor='rgba(255,255,255,0)',
-            font_color='#1e293b',
-            title_font_size=18,
-            title_font_weight=600,
-            height=400,
-            title_x=0.5,
-            xaxis_title="Date",
-            yaxis_title="Portfolio Value ($)",
-            xaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            ),
-            yaxis=dict(
-                showgrid=True,
-                gridcolor='rgba(0,0,0,0.1)',
-                color='#64748b'
-            )
-        )
-        fig_history.update_traces(
-            line=dict(width=3, color='#3b82f6'),
-            fill='tonexty',
-            fillcolor='rgba(59, 130, 246, 0.1)'
-        )
-        st.plotly_chart(fig_history, use_container_width=True)
+        st.plotly_chart(figures['history'], use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Enhanced Portfolio Table
@@ -903,18 +1000,8 @@ def display_portfolio_analysis(portfolio_df, user_profile):
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.subheader("📋 Detailed Portfolio Holdings")
     
-    # Format the dataframe for better display
-    display_df = portfolio_df.copy()
-    display_df['Market_Value'] = display_df['Market_Value'].apply(lambda x: f"${x:,.2f}")
-    display_df['Cost_Basis'] = display_df['Cost_Basis'].apply(lambda x: f"${x:,.2f}")
-    display_df['P&L'] = display_df['P&L'].apply(lambda x: f"${x:+,.2f}")
-    display_df['Return_%'] = display_df['Return_%'].apply(lambda x: f"{x:+.2f}%")
-    display_df['Weight_%'] = display_df['Weight_%'].apply(lambda x: f"{x:.2f}%")
-    display_df['Current_Price'] = display_df['Current_Price'].apply(lambda x: f"${x:.2f}")
-    display_df['Purchase_Price'] = display_df['Purchase_Price'].apply(lambda x: f"${x:.2f}")
-    
-    # Rename columns for better display
-    display_df = display_df.rename(columns={
+    # Rename columns for better display; values are formatted by the Styler, not rewritten as strings
+    display_df = portfolio_df.rename(columns={
         'Symbol': 'Stock',
         'Shares': 'Shares',
         'Purchase_Price': 'Purchase Price',
@@ -927,7 +1014,10 @@ def display_portfolio_analysis(portfolio_df, user_profile):
     })
     
     st.dataframe(
-        display_df[['Stock', 'Shares', 'Purchase Price', 'Current Price', 'Market Value', 'Cost Basis', 'P&L', 'Return %', 'Weight %']], 
+        display_df[['Stock', 'Shares', 'Purchase Price', 'Current Price', 'Market Value', 'Cost Basis', 'P&L', 'Return %', 'Weight %']].style.format({
+            'Purchase Price': '${:.2f}', 'Current Price': '${:.2f}', 'Market Value': '${:,.2f}',
+            'Cost Basis': '${:,.2f}', 'P&L': '${:+,.2f}', 'Return %': '{:+.2f}%', 'Weight %': '{:.2f}%'
+        }),
         use_container_width=True,
         hide_index=True
     )
@@ -938,7 +1028,7 @@ def display_portfolio_analysis(portfolio_df, user_profile):
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.subheader("🤖 AI-Powered Investment Recommendations")
     
-    recommendations = generate_recommendations(portfolio_df, user_profile, total_value)
+    recommendations = analysis['recommendations']
     
     for i, rec in enumerate(recommendations, 1):
         st.markdown(f'''
@@ -953,36 +1043,19 @@ def display_portfolio_analysis(portfolio_df, user_profile):
     st.markdown("---")
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.subheader("📈 Portfolio Performance History")
-    
-    # Create and display the portfolio performance history chart
-    perf_history_df = create_portfolio_performance_history(portfolio_df)
-    
-    fig_history = px.line(
-        perf_history_df,
-        x=perf_history_df.index,
-        y=perf_history_df.columns,
-        title="Portfolio Performance Over Time",
-        labels={'value': 'Portfolio Value ($)', 'variable': 'Asset'},
-        template="plotly_dark"
-    )
-    fig_history.update_layout(
-        xaxis_title="Date",
-        yaxis_title="Value ($)",
-        legend_title="Assets",
-        height=400
-    )
-    st.plotly_chart(fig_history, use_container_width=True)
+    st.plotly_chart(figures['history_assets'], use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
+@lru_cache(maxsize=1)
+def diversification_model():
+    """Factor model over SECTOR_MAP, estimated on first use"""
+    return DiversificationModel(FactorRiskModel.load(sector_mapping=SECTOR_MAP))
+
 def calculate_diversification_score(portfolio_df):
-    """Calculate portfolio diversification score"""
-    num_holdings = len(portfolio_df)
-    if num_holdings >= 10:
-        return 8.5 + random.uniform(-1, 1.5)
-    elif num_holdings >= 5:
-        return 6.0 + random.uniform(-1, 2)
-    else:
-        return 3.0 + random.uniform(-1, 2)
+    """Correlation-aware diversification score (0-10); the same holdings always score the same"""
+    return diversification_model().score(
+        portfolio_df['Symbol'].to_numpy(), portfolio_df['Market_Value'].to_numpy(), portfolio_df['Sector'].to_numpy()
+    )['score']
 
 def assess_risk_level(portfolio_df):
     """Assess portfolio risk level"""
@@ -1009,72 +1082,8 @@ def calculate_esg_score(portfolio_df):
 
 def generate_recommendations(portfolio_df, user_profile, total_value):
     """Generate personalized recommendations"""
-    recommendations = []
-    
-    num_holdings = len(portfolio_df)
-    if num_holdings < 5:
-        recommendations.append(
-            "🎯 **Increase Diversification**: Add 3-5 more holdings across different sectors to reduce single-stock risk and improve portfolio stability."
-        )
-    
-    # Check sector concentration
-    tech_symbols = ['AAPL', 'MSFT', 'GOOGL', 'NVDA', 'TSLA', 'META', 'AMZN']
-    tech_count = len([s for s in portfolio_df['Symbol'] if s in tech_symbols])
-    
-    if tech_count / num_holdings > 0.5:
-        recommendations.append(
-            "⚖️ **Reduce Tech Concentration**: Consider adding holdings from defensive sectors like healthcare (JNJ, PFE), consumer staples (PG, KO), or utilities (NEE, SO) to balance your portfolio."
-        )
-    
-    # Age-based recommendations
-    age = user_profile['age']
-    if age < 35:
-        recommendations.append(
-            "🚀 **Growth Focus**: At your age, consider increasing allocation to growth stocks and emerging markets for long-term wealth building."
-        )
-    elif age > 50:
-        recommendations.append(
-            "🛡️ **Capital Preservation**: Consider increasing allocation to dividend-paying stocks and bonds to preserve capital as you approach retirement."
-        )
-    
-    # Check for high-risk positions
-    high_risk_positions = portfolio_df[portfolio_df['Weight_%'] > 25]
-    if not high_risk_positions.empty:
-        recommendations.append(
-            f"⚠️ **Position Sizing**: {high_risk_positions.iloc[0]['Symbol']} represents {high_risk_positions.iloc[0]['Weight_%']:.1f}% of your portfolio. Consider reducing to under 20% to manage risk."
-        )
-    
-    # ESG recommendations
-    if user_profile['investment_style'] == 'ESG-focused':
-        recommendations.append(
-            "🌱 **ESG Enhancement**: Consider adding ESG-focused ETFs like VTSAX or individual stocks with strong sustainability ratings to align with your values."
-        )
-    
-    # Performance-based recommendations
-    poor_performers = portfolio_df[portfolio_df['Return_%'] < -10]
-    if not poor_performers.empty:
-        recommendations.append(
-            f"📉 **Review Underperformers**: {', '.join(poor_performers['Symbol'].tolist())} are down significantly. Consider if these align with your long-term thesis or if rebalancing is needed."
-        )
-    
-    # Net worth based recommendations
-    if '$25M+' in user_profile['net_worth']:
-        recommendations.append(
-            "💎 **Alternative Investments**: With your high net worth, consider adding alternative investments like REITs, commodities, or private equity for further diversification."
-        )
-    
-    # Location-based recommendations
-    if user_profile['location'] == 'Singapore':
-        recommendations.append(
-            "🌏 **Regional Exposure**: Consider adding Singapore REITs or Asian market ETFs to capitalize on regional growth opportunities."
-        )
-    
-    if not recommendations:
-        recommendations.append(
-            "✅ **Well-Balanced Portfolio**: Your portfolio shows good diversification and risk management. Continue monitoring and rebalancing quarterly."
-        )
-    
-    return recommendations
+    context = build_context(portfolio_df, user_profile, sector_mapping=SECTOR_MAP)
+    return SUMMARY_ENGINE.evaluate_group('summary', context)
 
 def peer_insights_page(user_profile):
     """Display peer insights and comparisons"""
@@ -1339,49 +1348,27 @@ def create_portfolio_performance_history(portfolio_df):
     # Generate mock historical data
     dates = pd.date_range(start='2023-01-01', end='2024-12-31', freq='D')
     
-    # Create mock performance data for each stock
-    performance_data = {}
-    for symbol in portfolio_df['Symbol']:
-        # Start with base value and add random walk
-        base_value = 10000
-        returns = np.random.normal(0.0008, 0.02, len(dates))  # Daily returns
-        values = [base_value]
-        
-        for daily_return in returns:
-            values.append(values[-1] * (1 + daily_return))
-        
-        performance_data[symbol] = values[1:]  # Remove initial value
+    # Create mock performance data for each stock: a random walk from a base value
+    base_value = 10000
+    symbols = portfolio_df['Symbol'].tolist()
+    returns = np.random.normal(0.0008, 0.02, (len(dates), len(symbols)))  # Daily returns
+    values = base_value * np.cumprod(1 + returns, axis=0)
     
     # Create DataFrame
-    perf_df = pd.DataFrame(performance_data, index=dates)
+    perf_df = pd.DataFrame(values, index=dates, columns=symbols)
     
     # Add portfolio total (weighted average)
-    weights = portfolio_df.set_index('Symbol')['Weight_%'] / 100
-    perf_df['Portfolio'] = 0
-    for symbol in portfolio_df['Symbol']:
-        if symbol in weights.index:
-            perf_df['Portfolio'] += perf_df[symbol] * weights[symbol]
+    weights = portfolio_df['Weight_%'].to_numpy() / 100
+    perf_df['Portfolio'] = values @ weights
     
     return perf_df
 
-def create_sector_analysis_chart(portfolio_df):
+def create_sector_analysis_chart(frame):
     """Create sector analysis based on stock symbols"""
     
-    # Simple sector mapping
-    sector_map = {
-        'AAPL': 'Technology', 'MSFT': 'Technology', 'GOOGL': 'Technology',
-        'NVDA': 'Technology', 'TSLA': 'Automotive', 'META': 'Technology',
-        'AMZN': 'E-commerce', 'JNJ': 'Healthcare', 'PFE': 'Healthcare',
-        'PG': 'Consumer Goods', 'KO': 'Consumer Goods', 'NEE': 'Utilities',
-        'SO': 'Utilities', 'V': 'Financial', 'MA': 'Financial',
-        'JPM': 'Financial', 'BAC': 'Financial', 'BRK.B': 'Financial'
-    }
-    
-    # Add sector information
-    portfolio_df['Sector'] = portfolio_df['Symbol'].map(sector_map).fillna('Other')
-    
-    # Calculate sector allocation
-    sector_allocation = portfolio_df.groupby('Sector')['Market_Value'].sum().reset_index()
+    # Calculate sector allocation (the frame derives Sector from SECTOR_MAP)
+    sector_totals = frame.group_sum('Sector', 'Market_Value')
+    sector_allocation = pd.DataFrame({'Sector': list(sector_totals), 'Market_Value': list(sector_totals.values())})
     sector_allocation['Percentage'] = (sector_allocation['Market_Value'] / sector_allocation['Market_Value'].sum()) * 100
     
     return sector_allocation
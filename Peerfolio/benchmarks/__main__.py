@@ -0,0 +1,81 @@
+import argparse
+import json
+import subprocess
+import sys
+
+from benchmarks.harness import (
+    BASELINE_PATH, REGRESSION_THRESHOLD, compare, environment, load_baseline, merge_runs,
+    run_benchmarks, save_baseline
+)
+# Importing the modules registers their benchmarks
+from benchmarks import (
+    bench_peer_matcher, bench_portfolio_analyzer, bench_ai_advisor, bench_data_generator, bench_live_valuation,
+    bench_factor_risk, bench_backtester, bench_stress_testing, bench_diversification,
+    bench_look_through, bench_peer_store
+)
+
+
+def run_in_processes(args) -> dict:
+    """Run the suite in fresh interpreters; memory layout alone shifts timings between processes"""
+    command = [sys.executable, '-m', 'benchmarks', '--worker', '--repeat', str(args.repeat)]
+    if args.select:
+        command += ['--select', args.select]
+    if args.full:
+        command.append('--full')
+
+    runs = []
+    for i in range(args.processes):
+        print(f"--- process {i + 1}/{args.processes}")
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+        lines = output.splitlines()
+        print('\n'.join(lines[:-1]))
+        runs.append(json.loads(lines[-1]))
+    return merge_runs(runs)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run Peerfolio benchmarks against the stored baseline")
+    parser.add_argument("-k", "--select", help="Only run cases whose name contains this text")
+    parser.add_argument("--full", action="store_true", help="Include the slow sizes (5M peers, 100k holdings)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed rounds per case")
+    parser.add_argument("--processes", type=int, default=3, help="Fresh interpreters to run the suite in")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Allowed slowdown as a fraction of the baseline")
+    parser.add_argument("--save", action="store_true", help="Record this run as the new baseline")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        results = run_benchmarks(args.select, args.full, args.repeat)
+        print(json.dumps(results))
+        return 0
+
+    results = run_in_processes(args)
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --save to record one")
+        return 0
+
+    if baseline.get('environment') != environment():
+        print("Note: baseline was recorded on a different environment; timings may not be comparable")
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['case']}: {regression['baseline_s'] * 1000:.3f} ms -> "
+            f"{regression['current_s'] * 1000:.3f} ms ({regression['ratio']:.2f}x)"
+        )
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} of baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import USER_PROFILE, holdings
+from utils.ai_advisor import AIAdvisor
+from utils.portfolio_analyzer import PortfolioAnalyzer
+
+CHAT_QUESTIONS = {
+    'crypto': "Should I invest in crypto?",
+    'risk': "How should I manage my portfolio risk?",
+    'general': "What do you think about the markets?"
+}
+
+
+@benchmark('ai_advisor.get_recommendations', [10, 1_000])
+def get_recommendations(n_holdings):
+    advisor = AIAdvisor()
+    portfolio_df = holdings(n_holdings)
+    analysis = PortfolioAnalyzer().analyze(portfolio_df.copy(), USER_PROFILE)
+    return lambda: advisor.get_recommendations(portfolio_df, USER_PROFILE, analysis)
+
+
+@benchmark('ai_advisor.chat_response', list(CHAT_QUESTIONS))
+def chat_response(topic):
+    advisor = AIAdvisor()
+    question = CHAT_QUESTIONS[topic]
+    return lambda: advisor.chat_response(question, USER_PROFILE)
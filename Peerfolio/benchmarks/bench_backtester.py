@@ -0,0 +1,16 @@
+import numpy as np
+
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import SEED
+from utils.backtester import Backtester
+from utils.peer_matcher import ALLOCATION_SLEEVES, PEER_STRATEGIES, peer_allocations, strategy_rebalance_days
+
+
+@benchmark('backtester.run', [500, 10_000], [100_000])
+def run(n_portfolios):
+    backtester = Backtester.load()
+    rng = np.random.default_rng(SEED)
+    strategy_idx = rng.integers(0, len(PEER_STRATEGIES), n_portfolios)
+    weights = peer_allocations(strategy_idx, rng)
+    rebalance_days = strategy_rebalance_days(np.asarray(PEER_STRATEGIES)[strategy_idx])
+    return lambda: backtester.run(weights, ALLOCATION_SLEEVES, rebalance_days)
@@ -0,0 +1,11 @@
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import USER_PROFILE
+from utils.data_generator import generate_sample_data
+
+NET_WORTHS = ['$1M - $2.5M', '$25M+']
+
+
+@benchmark('data_generator.generate_sample_data', NET_WORTHS)
+def sample_data(net_worth):
+    profile = {**USER_PROFILE, 'net_worth': net_worth}
+    return lambda: generate_sample_data(profile)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from benchmarks.harness import benchmark
+from benchmarks.bench_factor_risk import universe
+from benchmarks.fixtures import SEED
+from utils.diversification import DiversificationModel
+from utils.factor_risk import FactorRiskModel, sample_returns
+
+
+def holdings(n_holdings):
+    symbols, sector_mapping = universe()
+    model = FactorRiskModel.estimate(sample_returns(symbols, sector_mapping, seed=SEED), sector_mapping)
+    held = list(np.random.default_rng(SEED).choice(symbols, n_holdings + 2, replace=False))
+    return model, held, sector_mapping
+
+
+@benchmark('diversification.rebuild', [500, 750, 1000])
+def rebuild(n_holdings):
+    model, held, sector_mapping = holdings(n_holdings)
+    # Alternating universes two holdings apart, one cache slot: every call is a full eigendecomposition
+    universes = [held[:n_holdings], held[2:]]
+    diversification = DiversificationModel(model, max_entries=1)
+    calls = iter(range(10 ** 9))
+
+    def run():
+        symbols = universes[next(calls) % 2]
+        return diversification.score(symbols, np.ones(n_holdings), [sector_mapping[s] for s in symbols])
+
+    return run
+
+
+@benchmark('diversification.one_holding_change', [750, 1000])
+def one_holding_change(n_holdings):
+    model, held, sector_mapping = holdings(n_holdings)
+    # Universes one swapped holding apart: every call is a rank-two correction of the cached decomposition
+    universes = [held[:n_holdings], held[:n_holdings - 1] + [held[n_holdings]]]
+    diversification = DiversificationModel(model, max_entries=1)
+    calls = iter(range(10 ** 9))
+
+    def run():
+        symbols = universes[next(calls) % 2]
+        return diversification.score(symbols, np.ones(n_holdings), [sector_mapping[s] for s in symbols])
+
+    return run
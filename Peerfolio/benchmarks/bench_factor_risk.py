@@ -0,0 +1,32 @@
+import numpy as np
+
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import SEED
+from utils.factor_risk import FactorRiskModel, sample_returns
+
+UNIVERSE_SIZE = 5_000
+SECTORS = ['Technology', 'Healthcare', 'Financial Services', 'Consumer Discretionary', 'Consumer Staples',
+           'Energy', 'Industrials', 'Utilities', 'Materials', 'Communication Services']
+
+
+def universe():
+    symbols = [f"U{i:05d}" for i in range(UNIVERSE_SIZE)]
+    return symbols, {symbol: SECTORS[i % len(SECTORS)] for i, symbol in enumerate(symbols)}
+
+
+@benchmark('factor_risk.estimate', [1_000], [UNIVERSE_SIZE])
+def estimate(n_symbols):
+    symbols, sector_mapping = universe()
+    returns = sample_returns(symbols[:n_symbols], sector_mapping, seed=SEED)
+    return lambda: FactorRiskModel.estimate(returns, sector_mapping)
+
+
+@benchmark('factor_risk.risk', [100, 5_000])
+def risk(n_holdings):
+    symbols, sector_mapping = universe()
+    model = FactorRiskModel.estimate(sample_returns(symbols, sector_mapping, seed=SEED), sector_mapping)
+    rng = np.random.default_rng(SEED)
+    held = rng.choice(symbols, n_holdings, replace=False)
+    weights = rng.uniform(0, 1, n_holdings)
+    weights /= weights.sum()
+    return lambda: model.risk(held, weights)
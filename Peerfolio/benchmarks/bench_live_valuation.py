@@ -0,0 +1,41 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import SEED
+from utils.data_generator import STOCK_PRICES
+from utils.live_valuation import LiveValuationEngine, Tick
+from utils.portfolio_analyzer import PortfolioAnalyzer
+
+N_TICKS = 10_000
+HOLDINGS_PER_PORTFOLIO = 15
+
+
+@benchmark('live_valuation.apply_ticks', [100, 500])
+def apply_ticks(n_portfolios):
+    rng = np.random.default_rng(SEED)
+    symbols = list(STOCK_PRICES)
+    engine = LiveValuationEngine(PortfolioAnalyzer().sector_mapping)
+    for i in range(n_portfolios):
+        chosen = rng.choice(symbols, HOLDINGS_PER_PORTFOLIO, replace=False)
+        engine.add_portfolio(f"portfolio_{i}", pd.DataFrame({
+            'Symbol': chosen,
+            'Shares': rng.integers(10, 500, HOLDINGS_PER_PORTFOLIO).astype(float),
+            'Purchase_Price': [STOCK_PRICES[symbol] * 0.9 for symbol in chosen],
+            'Current_Price': [STOCK_PRICES[symbol] for symbol in chosen]
+        }))
+
+    tick_rng = random.Random(SEED)
+    ticks = [
+        Tick(symbol, STOCK_PRICES[symbol] * (1 + tick_rng.gauss(0, 0.01)))
+        for symbol in (tick_rng.choice(symbols) for _ in range(N_TICKS))
+    ]
+
+    def run():
+        # One frame's worth of work: a burst of ticks, then the coalesced snapshot of every portfolio
+        for tick in ticks:
+            engine.apply_tick(tick)
+        engine.drain()
+    return run
@@ -0,0 +1,35 @@
+import numpy as np
+
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import SEED, holdings
+from utils.bulk_generator import generate_portfolio_chunk
+from utils.look_through import SAMPLE_FUNDS
+from utils.portfolio_analyzer import PortfolioAnalyzer
+
+FUND_SHARE = 0.2  # Fraction of holding rows that are funds
+
+
+def with_funds(frame, rng):
+    """Frame with a share of its rows swapped for the sample funds"""
+    frame = frame.copy()
+    rows = rng.random(len(frame)) < FUND_SHARE
+    frame.loc[rows, 'Symbol'] = rng.choice(list(SAMPLE_FUNDS), rows.sum())
+    return frame
+
+
+@benchmark('look_through.exposures', [50], [500])
+def exposures(n_holdings):
+    look_through = PortfolioAnalyzer().look_through
+    portfolio = with_funds(holdings(n_holdings), np.random.default_rng(SEED))
+    symbols = portfolio['Symbol'].to_numpy()
+    market_values = (portfolio['Shares'] * portfolio['Current_Price']).to_numpy()
+    return lambda: look_through.exposures(symbols, market_values)
+
+
+@benchmark('look_through.book_exposures', [10_000], [100_000])
+def book_exposures(n_portfolios):
+    rng = np.random.default_rng(SEED)
+    _, book = generate_portfolio_chunk(n_portfolios, rng)
+    book = with_funds(book, rng)
+    look_through = PortfolioAnalyzer().look_through
+    return lambda: look_through.book_exposures(book)
@@ -0,0 +1,26 @@
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import USER_PROFILE, peer_records
+from utils.peer_matcher import PeerMatcher, new_peer_store
+
+PEER_COUNTS = [500, 50_000]
+SLOW_PEER_COUNTS = [5_000_000]
+
+
+def _matcher(n_peers: int) -> PeerMatcher:
+    matcher = PeerMatcher()
+    matcher.peer_store = new_peer_store(peer_records(n_peers))
+    return matcher
+
+
+@benchmark('peer_matcher.find_similar_peers', PEER_COUNTS, SLOW_PEER_COUNTS)
+def find_similar_peers(n_peers):
+    matcher = _matcher(n_peers)
+    return lambda: matcher.find_similar_peers(USER_PROFILE)
+
+
+@benchmark('peer_matcher.get_peer_insights', PEER_COUNTS, SLOW_PEER_COUNTS)
+def get_peer_insights(n_peers):
+    matcher = _matcher(n_peers)
+    # Insights over every peer that clears the similarity threshold, not just the top 50
+    similar = matcher.find_similar_peers(USER_PROFILE, max_results=n_peers)
+    return lambda: matcher.get_peer_insights(similar)
@@ -0,0 +1,37 @@
+import itertools
+
+import numpy as np
+
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import SEED, peer_records
+from utils.peer_matcher import new_peer_store
+
+PEER_COUNTS = [50_000]
+DELTA_SHARE = 0.01  # Daily delta: a third each joining, rebalancing and leaving
+
+
+@benchmark('peer_store.build', PEER_COUNTS)
+def build(n_peers):
+    peers = peer_records(n_peers)
+    return lambda: new_peer_store(peers)
+
+
+@benchmark('peer_store.apply_delta', PEER_COUNTS)
+def apply_delta(n_peers):
+    peers = peer_records(n_peers)
+    store = new_peer_store(peers)
+    rng = np.random.default_rng(SEED)
+    n_changes = int(n_peers * DELTA_SHARE / 3)
+    days = itertools.count()
+    joined = []
+
+    def run():
+        # Yesterday's joiners leave again, so every day sees the same mix of changes
+        day = next(days)
+        picked = rng.choice(n_peers, n_changes, replace=False)
+        updates = [{'id': peers[i]['id'], 'performance': peers[i]['performance'] + rng.normal()} for i in picked]
+        appends = [dict(peers[i], id=f"day{day}_{i}") for i in picked]
+        store.apply(append=appends, update=updates, delete=joined)
+        joined[:] = [peer['id'] for peer in appends]
+
+    return run
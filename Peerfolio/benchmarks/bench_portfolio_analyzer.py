@@ -0,0 +1,10 @@
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import USER_PROFILE, holdings
+from utils.portfolio_analyzer import PortfolioAnalyzer
+
+
+@benchmark('portfolio_analyzer.analyze', [10, 1_000], [100_000])
+def analyze(n_holdings):
+    analyzer = PortfolioAnalyzer()
+    portfolio_df = holdings(n_holdings)
+    return lambda: analyzer.analyze(portfolio_df, USER_PROFILE)
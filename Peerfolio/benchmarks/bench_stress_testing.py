@@ -0,0 +1,33 @@
+import numpy as np
+
+from benchmarks.harness import benchmark
+from benchmarks.fixtures import SEED
+from utils.analysis_cache import ANALYSIS_CACHE
+from utils.bulk_generator import generate_portfolio_chunk
+from utils.portfolio_analyzer import PortfolioAnalyzer
+from utils.stress_testing import STRESS_ENGINE
+
+SIMULATED_SCENARIOS = 1_000
+
+
+def book(n_portfolios):
+    _, holdings = generate_portfolio_chunk(n_portfolios, np.random.default_rng(SEED))
+    return holdings, PortfolioAnalyzer().sector_mapping
+
+
+@benchmark('stress_testing.book_exposures', [10_000], [100_000])
+def book_exposures(n_portfolios):
+    holdings, sector_mapping = book(n_portfolios)
+    return lambda: STRESS_ENGINE.book_exposures(holdings, sector_mapping)
+
+
+@benchmark('stress_testing.worst_case', [10_000], [100_000])
+def worst_case(n_portfolios):
+    engine = STRESS_ENGINE.with_simulated(SIMULATED_SCENARIOS, seed=SEED)
+    _, positions = engine.book_exposures(*book(n_portfolios))
+
+    def run():
+        ANALYSIS_CACHE.clear()  # Time the matrix pass, not a cache hit
+        return engine.worst_case(positions)
+
+    return run
@@ -0,0 +1,46 @@
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from utils.bulk_generator import iter_peer_chunks
+from utils.peer_matcher import strategy_allocation, PEER_STRATEGIES
+from utils.data_generator import STOCK_PRICES
+
+SEED = 42
+
+USER_PROFILE = {
+    'age': 42,
+    'location': 'Singapore',
+    'net_worth': '$10M - $25M',
+    'investment_style': 'Tech-focused'
+}
+
+
+@lru_cache(maxsize=None)
+def peer_records(n_peers: int) -> List[Dict]:
+    """Peer database in PeerMatcher's record format, built with the vectorized generator"""
+    allocations = {strategy: strategy_allocation(strategy) for strategy in PEER_STRATEGIES}
+    records = []
+    for chunk in iter_peer_chunks(n_peers, seed=SEED):
+        chunk_records = chunk.to_dict('records')
+        for record in chunk_records:
+            record['allocation'] = allocations[record['strategy']]
+        records.extend(chunk_records)
+    return records
+
+
+@lru_cache(maxsize=None)
+def holdings(n_holdings: int) -> pd.DataFrame:
+    """n distinct positions: the known universe first, then synthetic tickers"""
+    rng = np.random.default_rng(SEED)
+    known = list(STOCK_PRICES)
+    symbols = known[:n_holdings] + [f"X{i:06d}" for i in range(max(0, n_holdings - len(known)))]
+    current = np.array([STOCK_PRICES.get(symbol, 100.0) for symbol in symbols])
+    return pd.DataFrame({
+        'Symbol': symbols,
+        'Shares': np.round(rng.uniform(10, 5000, n_holdings), 0),
+        'Purchase_Price': np.round(current * (1 - rng.uniform(-0.4, 0.6, n_holdings)), 2),
+        'Current_Price': current
+    })
@@ -0,0 +1,142 @@
+import gc
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# name -> {'setup': callable(param) -> zero-arg callable, 'params': [...], 'slow_params': [...]}
+BENCHMARKS: Dict[str, Dict] = {}
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+MIN_ROUND_SECONDS = 0.2  # Calls are batched until one timed round takes at least this long
+NOISE_FLOOR_MS = 0.5  # Slowdowns smaller than this are never reported as regressions
+REGRESSION_THRESHOLD = 0.5  # Allowed slowdown; single-core VMs vary by ~30% between processes
+
+
+def benchmark(name: str, params: Optional[List] = None, slow_params: Optional[List] = None):
+    """Register setup(param) returning the zero-argument callable to time"""
+    def register(setup: Callable) -> Callable:
+        BENCHMARKS[name] = {
+            'setup': setup,
+            'params': list(params or [None]),
+            'slow_params': list(slow_params or [])
+        }
+        return setup
+    return register
+
+
+def case_name(name: str, param) -> str:
+    return name if param is None else f"{name}[{param}]"
+
+
+def time_case(func: Callable, repeat: int = 5) -> Dict:
+    """Median/min seconds per call over `repeat` rounds, batching fast calls"""
+    start = time.perf_counter()
+    func()  # Warm-up call also sizes the batch
+    first = time.perf_counter() - start
+    number = max(1, int(MIN_ROUND_SECONDS / first)) if first > 0 else 1000
+    rounds = repeat if first < 1.0 else max(1, repeat // 2)
+
+    # Like timeit, keep the collector out of the timings; fixtures such as large peer
+    # databases would otherwise make every collection expensive and the results noisy
+    samples = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - start) / number)
+    finally:
+        gc.enable()
+
+    return {
+        'median_s': statistics.median(samples),
+        'min_s': min(samples),
+        'rounds': rounds,
+        'number': number
+    }
+
+
+def run_benchmarks(selection: Optional[str] = None, full: bool = False, repeat: int = 5,
+                   log: Optional[Callable] = print) -> Dict[str, Dict]:
+    """Run registered benchmarks whose case name contains `selection`"""
+    results = {}
+    for name, spec in BENCHMARKS.items():
+        for param in spec['params'] + (spec['slow_params'] if full else []):
+            case = case_name(name, param)
+            if selection and selection not in case:
+                continue
+            func = spec['setup'](param)
+            results[case] = time_case(func, repeat)
+            if log:
+                log(f"{case:<55} {results[case]['median_s'] * 1000:>12.3f} ms")
+    return results
+
+
+def merge_runs(runs: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """Combine per-process results by taking the median of each statistic"""
+    merged = {}
+    for case in runs[0]:
+        samples = [run[case] for run in runs if case in run]
+        merged[case] = {
+            'median_s': statistics.median(sample['median_s'] for sample in samples),
+            'min_s': statistics.median(sample['min_s'] for sample in samples),
+            'rounds': sum(sample['rounds'] for sample in samples),
+            'number': samples[0]['number'],
+            'processes': len(samples)
+        }
+    return merged
+
+
+def environment() -> Dict:
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def save_baseline(results: Dict[str, Dict], path: str = BASELINE_PATH, merge: bool = True):
+    """Write results as the new baseline; existing cases not re-run are kept when merging"""
+    cases = dict(load_baseline(path).get('cases', {})) if merge else {}
+    cases.update(results)
+    with open(path, 'w') as f:
+        json.dump({
+            'recorded_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'environment': environment(),
+            'cases': dict(sorted(cases.items()))
+        }, f, indent=2)
+        f.write('\n')
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, Dict], baseline: Dict, threshold: float) -> List[Dict]:
+    """Cases whose best round slowed down by more than `threshold` (0.5 = 50%) vs the baseline"""
+    # The fastest round is the least disturbed by other load on the machine, so it is compared
+    regressions = []
+    for case, result in results.items():
+        reference = baseline.get('cases', {}).get(case)
+        if not reference:
+            continue
+        before, after = reference['min_s'], result['min_s']
+        ratio = after / before if before > 0 else float('inf')
+        if ratio > 1 + threshold and (after - before) * 1000 > NOISE_FLOOR_MS:
+            regressions.append({'case': case, 'baseline_s': before, 'current_s': after, 'ratio': ratio})
+    return regressions
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry module -> budget in ms for the imports it triggers (its own module body is not counted).
+# Budgets keep ~40% headroom over a single-core VM; the deferred-module check below is exact.
+IMPORT_BUDGETS_MS = {
+    'utils.shared_resources': 650,
+    'api.service': 750,
+    'app_simple': 1400,
+    'app': 1400
+}
+
+# Heavy dependencies that must stay deferred until a page or feature actually uses them
+# (plotly.graph_objects and plotly.io are not listed: Streamlit's plotly_chart imports them itself)
+DEFERRED_MODULES = ['yfinance', 'plotly.express', 'matplotlib', 'seaborn']
+
+
+def parse_importtime(stderr: str, entry: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """Milliseconds spent importing entry's dependencies, plus its direct imports by cost"""
+    # Lines look like 'import time:  self_us | cumulative_us | <indent>name'; parents print after children
+    total_us = 0.0
+    children: List[Tuple[str, float]] = []
+    pending: List[Tuple[str, float]] = []
+    entry_parts = entry.split('.')
+    packages = {'.'.join(entry_parts[:i]) for i in range(1, len(entry_parts) + 1)}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 1:
+            pending.append((name, int(cumulative_us) / 1000))
+        elif depth == 0:
+            if name in packages:
+                # The entry module's own body (page setup, warm-up) is runtime, not import cost
+                total_us += int(cumulative_us) - (int(self_us) if name == entry else 0)
+                children += pending
+            pending = []
+    return total_us / 1000, sorted(children, key=lambda child: -child[1])
+
+
+def measure(entry: str) -> Dict:
+    script = (
+        f"import {entry}, sys, json; "
+        f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    )
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    import_ms, children = parse_importtime(completed.stderr, entry)
+    return {
+        'import_ms': import_ms,
+        'children': children,
+        'eager': json.loads(completed.stdout.strip().splitlines()[-1])
+    }
+
+
+def check_imports(entries: List[str], runs: int = 5, log=print) -> List[str]:
+    """Best-of-runs import cost per entry over fresh interpreters; returns budget violations"""
+    failures = []
+    for entry in entries:
+        measure(entry)  # Warm-up run writes any missing .pyc files
+        samples = [measure(entry) for _ in range(runs)]
+        # Like the benchmark harness, compare the least disturbed run; single-core VMs are noisy
+        best_ms = min(sample['import_ms'] for sample in samples)
+        budget = IMPORT_BUDGETS_MS[entry]
+        eager = samples[-1]['eager']
+        status = 'ok' if best_ms <= budget and not eager else 'OVER'
+        log(f"{entry:<28} {best_ms:>8.1f} ms  (budget {budget} ms)  {status}")
+        for name, ms in samples[-1]['children'][:5]:
+            log(f"    {name:<40} {ms:>8.1f} ms")
+
+        if best_ms > budget:
+            failures.append(f"{entry} imports take {best_ms:.0f} ms, budget is {budget} ms")
+        if eager:
+            failures.append(f"{entry} eagerly imports {', '.join(eager)}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Enforce import-time budgets with python -X importtime")
+    parser.add_argument("-k", "--select", help="Only check entry modules containing this text")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry module")
+    args = parser.parse_args()
+
+    entries = [entry for entry in IMPORT_BUDGETS_MS if not args.select or args.select in entry]
+    failures = check_imports(entries, args.runs)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print("All entry points within their import budgets")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,11 +10,21 @@ DEFAULT_THEME = "dark"
 PRIMARY_COLOR = "#E60012"  # UBS Red
 SECONDARY_COLOR = "#ffffff"
 BACKGROUND_COLOR = "#0a0a0a"
+CHART_WIDTH_PX = 800  # Nominal chart width used to size downsampled series
+WEBGL_POINT_THRESHOLD = 1000  # Switch line charts to WebGL above this many points
 
 # Portfolio Analysis Settings
 MIN_PORTFOLIO_SIZE = 1000  # Minimum portfolio value
 MAX_PORTFOLIO_SIZE = 1000000000  # Maximum portfolio value
 DEFAULT_RISK_FREE_RATE = 0.045  # 4.5% risk-free rate
+COST_BASIS_METHOD = "fifo"  # Lot relief order: fifo, lifo, hifo or average
+LONG_TERM_HOLDING_DAYS = 365  # Holding period after which gains are long term
+WASH_SALE_WINDOW_DAYS = 30  # Repurchases within this many days disallow a harvested loss
+SHORT_TERM_TAX_RATE = 0.37  # Marginal rate applied to short-term losses when valuing a harvest
+LONG_TERM_TAX_RATE = 0.20  # Rate applied to long-term losses when valuing a harvest
+MIN_HARVEST_LOSS = 100  # Ignore lots whose unrealized loss is below this many dollars
+MAX_HARVEST_REPLACEMENTS = 3  # Replacement securities suggested per harvested symbol
+MAX_HARVEST_SUGGESTIONS = 3  # Harvest candidates surfaced as individual recommendations
 
 # Peer Matching Settings
 MIN_SIMILARITY_SCORE = 0.3  # Minimum similarity to include peers
@@ -23,6 +33,57 @@ AGE_WEIGHT = 0.3  # Weight for age similarity
 LOCATION_WEIGHT = 0.2  # Weight for location similarity
 NET_WORTH_WEIGHT = 0.25  # Weight for net worth similarity
 STYLE_WEIGHT = 0.25  # Weight for investment style similarity
+PEER_AGE_BANDS = [35, 45, 55]  # Age band lower edges for peer cohort slices (youngest band below 35)
+QUANTILE_SKETCH_K = 200  # KLL sketch size for peer return percentiles (rank error ~1%)
+PEER_CUBE_PATH = "data/peer_cube.npz"  # Materialized peer cohort cube (python -m utils.peer_cube)
+PEER_LEADERBOARD_SIZE = 10  # Top peers by return kept per strategy, per location and overall
+PEER_SKETCH_REBUILD_FRACTION = 0.25  # Re-sketch a cohort slice once its removed peers reach this share of its inputs
+
+# Live Valuation Settings
+LIVE_FEED = "simulated"  # Tick source for live mode: simulated, replay or socket
+LIVE_REPLAY_PATH = "data/ticks.csv"  # Recorded ticks (symbol,price,timestamp) for the replay feed
+LIVE_SOCKET_ADDRESS = "127.0.0.1:9009"  # host:port of a newline-delimited tick server
+LIVE_TICK_RATE = 2000  # Ticks per second produced by the simulated feed
+LIVE_FRAME_RATE = 4  # UI refreshes per second; ticks in between are coalesced
+LIVE_SESSION_SECONDS = 30  # Length of one live-mode session in the app
+LIVE_YIELD_EVERY = 256  # Ticks consumed between event-loop yields
+
+# Currency Settings
+REPORTING_CURRENCY = "USD"  # Reporting currency when the profile does not set one
+DEFAULT_HOLDING_CURRENCY = "USD"  # Currency of holdings with no Currency column value or exchange suffix
+LOCATION_CURRENCIES = {"Singapore": "SGD", "Hong Kong": "HKD", "Switzerland": "CHF", "New York": "USD", "London": "GBP", "Dubai": "AED"}
+EXCHANGE_SUFFIX_CURRENCIES = {".SI": "SGD", ".HK": "HKD", ".SW": "CHF", ".L": "GBP"}  # Ticker suffix -> listing currency
+FX_RATES_PATH = "data/fx_rates.csv"  # date,currency,usd_rate history; a synthetic sample is used when absent
+FX_HISTORY_DAYS = 730  # Days of rates in the synthetic sample history
+FX_VOL_WINDOW_DAYS = 252  # Trailing window for FX covariance (FX risk)
+
+# Risk Model Settings
+PRICE_HISTORY_PATH = "data/price_history.parquet"  # date,symbol,close history; a synthetic sample is used when absent
+RISK_MODEL_PATH = "data/factor_model.npz"  # Estimated factor risk model (python -m utils.factor_risk)
+RISK_MODEL_HISTORY_DAYS = 504  # Trading days of returns used to estimate the factor model
+TRADING_DAYS_PER_YEAR = 252  # Annualizes daily return variances
+MIN_SPECIFIC_OBSERVATIONS = 60  # Symbols with fewer return days take the median specific variance
+DIVERSIFICATION_CACHE_ENTRIES = 16  # Holding universes whose correlation eigendecomposition is kept
+DIVERSIFICATION_MAX_UPDATES = 8  # Low-rank corrections to a cached decomposition before it is recomputed
+DIVERSIFICATION_MIN_CORRECTED_HOLDINGS = 750  # Below this a fresh eigendecomposition beats correcting one
+DIVERSIFICATION_MAX_HOLDINGS = 1000  # Largest holdings that enter the correlation-aware score
+
+# Backtest Settings
+SECTOR_HISTORY_PATH = "data/sector_history.csv"  # date,sector,close history per allocation sleeve; a synthetic sample is used when absent
+BACKTEST_HISTORY_DAYS = 756  # Trading days (three years) each strategy and peer allocation is backtested over
+BACKTEST_REBALANCE_DAYS = 21  # Trading days between rebalances back to target weights (monthly)
+STRATEGY_REBALANCE_DAYS = {"Active Trading": 5, "Index Fund Core": 63}  # Strategies rebalancing off the default cadence
+BACKTEST_CHUNK_PORTFOLIOS = 1024  # Portfolios valued per matrix pass; bounds the days x portfolios value matrix
+PEER_ALLOCATION_TILT = 0.25  # Log-normal spread of a peer's sleeve weights around its strategy template
+PEER_RISK_VOLATILITY_BANDS = [14, 20]  # Backtested volatility (%) separating Low / Moderate / High risk peers
+
+# Stress Test Settings
+STRESS_SCENARIOS_PATH = "data/stress_scenarios.csv"  # scenario,kind,factor,shock (%) library; the built-in library is used when absent
+STRESS_CHUNK_PORTFOLIOS = 65536  # Portfolios per matrix pass when stressing the whole book; bounds the P&L matrix
+
+# Fund Look-Through Settings
+FUND_CONSTITUENTS_DIR = "data/funds"  # <TICKER>.csv/.parquet with symbol,weight[,sector,issuer,esg_score]; built-in samples otherwise
+LOOK_THROUGH_TOP_ISSUERS = 10  # Largest underlying issuers reported per portfolio
 
 # AI Advisor Settings
 MAX_RECOMMENDATIONS = 10  # Maximum recommendations per category
@@ -38,6 +99,7 @@ POLYGON_ENABLED = False
 SESSION_TIMEOUT = 3600  # 1 hour in seconds
 MAX_UPLOAD_SIZE = 10  # Maximum file upload size in MB
 ALLOWED_FILE_TYPES = ["csv", "xlsx", "json"]
+INGEST_CHUNK_ROWS = 50000  # Rows parsed and validated per upload chunk
 
 # Feature Flags
 ENABLE_LIVE_DATA = True
@@ -45,8 +107,36 @@ ENABLE_AI_CHAT = True
 ENABLE_PEER_INSIGHTS = True
 ENABLE_MARKET_INTELLIGENCE = True
 
+# Headless API Settings
+API_HOST = "127.0.0.1"
+API_PORT = 8000
+API_WORKERS = 2  # Process-pool size for CPU-bound handlers; 0 runs them on threads in the server process
+API_RANDOM_SEED = 42  # Seeds every worker so all processes build the same sample peer database
+
 # Development Settings
 DEBUG_MODE = True
 LOG_LEVEL = "INFO"
 CACHE_ENABLED = True
 CACHE_TTL = 300  # 5 minutes cache time-to-live
+ANALYSIS_CACHE_MAX_MB = 64  # Memory budget for memoized analysis results and figures
+TRACING_ENABLED = False  # Record timing spans for hot paths by default (the tracing panel overrides it per session)
+TRACING_PANEL_ENABLED = False  # Operator-only sidebar panel that can reset and export the process-wide tracer
+TRACE_SAMPLE_SIZE = 1024  # Recent durations kept per span for p50/p95
+METRICS_EXPORT_PATH = "data/metrics.prom"  # Prometheus textfile written by the tracing panel
+PROFILE_OUTPUT_DIR = "data/profiles"  # Collapsed stacks / speedscope JSON per profiled page
+PROFILE_SAMPLE_INTERVAL_MS = 5  # Stack sampling period in profiling mode
+PROFILE_TOP_N = 10  # Functions and allocation sites listed in the sidebar summary
+
+# Recommendation Thresholds (shared by every recommendation rule set)
+SECTOR_CONCENTRATION_LIMIT = 0.40  # Sector weight that triggers a rebalancing warning
+POSITION_CONCENTRATION_LIMIT = 0.25  # Single-holding weight that triggers a sizing warning
+SECTOR_UNDERWEIGHT_RATIO = 0.5  # Sector below this fraction of its target is underweight
+MIN_DIVERSIFIED_POSITIONS = 5  # Fewer holdings than this is under-diversified
+MIN_DIVERSIFICATION_SCORE = 5.0  # Sector diversification score (0-10) floor
+MIN_ESG_SCORE = 6.0  # ESG score floor for ESG-focused investors
+UNDERPERFORMER_RETURN = -10.0  # Holding return (%) flagged for review
+GROWTH_AGE_LIMIT = 35  # Investors younger than this get growth guidance
+PRESERVATION_AGE_LIMIT = 50  # Investors older than this get capital preservation guidance
+NET_WORTH_RANGES = ["$1M - $2.5M", "$2.5M - $5M", "$5M - $10M", "$10M - $25M", "$25M+"]
+ALTERNATIVES_MIN_NET_WORTH = "$5M - $10M"  # Lowest bracket offered alternative investments
+ADVANCED_TAX_MIN_NET_WORTH = "$10M - $25M"  # Lowest bracket offered advanced tax structures
@@ -0,0 +1,72 @@
+import pytest
+from starlette.testclient import TestClient
+
+from api.service import create_app
+
+HOLDINGS = [
+    {'Symbol': 'AAPL', 'Shares': 10, 'Purchase_Price': 150.0, 'Current_Price': 190.0},
+    {'Symbol': 'JNJ', 'Shares': 20, 'Purchase_Price': 170.0, 'Current_Price': 155.0}
+]
+PROFILE = {'age': 40, 'net_worth': '$5M - $10M', 'investment_style': 'Moderate', 'cost_basis_method': 'fifo'}
+
+
+@pytest.fixture(scope='module')
+def client():
+    # Single-process mode runs handlers on one thread, so the suite needs no worker processes
+    with TestClient(create_app(pool_size=0)) as client:
+        yield client
+
+
+def test_health(client):
+    response = client.get('/health')
+    assert response.status_code == 200
+    assert response.json()['status'] == 'ok'
+
+
+def test_analysis(client):
+    response = client.post('/v1/analysis', json={'holdings': HOLDINGS, 'profile': PROFILE})
+    assert response.status_code == 200
+    assert response.json()['total_value'] == pytest.approx(10 * 190.0 + 20 * 155.0)
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/v1/analysis', {'holdings': HOLDINGS, 'profile': {'cost_basis_method': 'bogus'}}),
+    ('/v1/recommendations', {'holdings': HOLDINGS, 'profile': {'cost_basis_method': None}}),
+    ('/v1/peers', {'profile': {'age': 'forty'}}),
+    ('/v1/peers', {'profile': {'age': None}}),
+    ('/v1/chat', {'question': 'What about tax?', 'profile': {'net_worth': None}}),
+    ('/v1/chat', {'question': 'What about tax?', 'profile': {'net_worth': '$3M'}})
+])
+def test_invalid_profile_is_422(client, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 422
+    assert 'error' in response.json()
+
+
+def test_zero_purchase_prices(client):
+    holdings = [dict(row, Purchase_Price=0) for row in HOLDINGS]
+    response = client.post('/v1/analysis', json={'holdings': holdings, 'profile': PROFILE})
+    assert response.status_code == 200
+    assert response.json()['total_return'] == 0.0
+
+
+@pytest.mark.parametrize('sales', [
+    [{'Symbol': 'TSLA', 'Shares': 1, 'Sale_Price': 200.0}],
+    [{'Symbol': 'AAPL', 'Shares': 11, 'Sale_Price': 200.0}],
+    [{'Symbol': 'AAPL', 'Shares': -1, 'Sale_Price': 200.0}]
+])
+def test_invalid_sales_are_422(client, sales):
+    response = client.post('/v1/analysis', json={'holdings': HOLDINGS, 'profile': PROFILE, 'sales': sales})
+    assert response.status_code == 422
+
+
+def test_sales_realize_pnl(client):
+    sales = [{'Symbol': 'AAPL', 'Shares': 4, 'Sale_Price': 200.0}]
+    response = client.post('/v1/analysis', json={'holdings': HOLDINGS, 'profile': PROFILE, 'sales': sales})
+    assert response.status_code == 200
+    assert response.json()['cost_basis']['realized_pnl'] == pytest.approx(4 * (200.0 - 150.0))
+
+
+def test_bad_holdings_are_422(client):
+    response = client.post('/v1/analysis', json={'holdings': [{'Symbol': 'AAPL'}], 'profile': PROFILE})
+    assert response.status_code == 422
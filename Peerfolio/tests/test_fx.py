@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from utils.live_valuation import LivePortfolio
+from utils.portfolio_analyzer import PortfolioAnalyzer
+
+# One listing per currency, with a second dated lot of 0700.HK so positions fold several lots
+HOLDINGS = pd.DataFrame({
+    'Symbol': ['AAPL', 'D05.SI', '0700.HK', '0700.HK'],
+    'Shares': [100, 1000, 500, 500],
+    'Purchase_Price': [150.0, 30.0, 480.0, 400.0],
+    'Current_Price': [190.0, 36.5, 320.0, 320.0],
+    'Purchase_Date': ['2024-01-15', '2024-03-01', '2024-02-01', '2024-06-03']
+})
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return PortfolioAnalyzer()
+
+
+@pytest.mark.parametrize('currency', ['USD', 'SGD'])
+def test_live_total_matches_analysis(analyzer, currency):
+    results = analyzer.analyze(HOLDINGS, {'reporting_currency': currency})
+    live = LivePortfolio('test', HOLDINGS, analyzer.sector_mapping, currency).snapshot()
+    assert live['total_value'] == pytest.approx(results['total_value'])
+    assert live['total_return'] == pytest.approx(results['total_return'])
+
+
+def test_cost_basis_is_in_reporting_currency(analyzer):
+    results = analyzer.analyze(HOLDINGS, {'reporting_currency': 'USD'})
+    live = LivePortfolio('test', HOLDINGS, analyzer.sector_mapping, 'USD').snapshot()
+    assert results['cost_basis']['unrealized_pnl'] == pytest.approx(live['total_pl'])
+    # The HKD lots lose HKD 120,000 locally; harvesting reports it in USD
+    harvest = {row['symbol']: row for row in results['harvest_opportunities']}
+    assert 0 < harvest['0700.HK']['loss'] < 120_000 * 0.2
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import pandas as pd
+
+from config.settings import CACHE_ENABLED, ANALYSIS_CACHE_MAX_MB
+
+# Columns that define a portfolio; derived columns are ignored when hashing
+INPUT_COLUMNS = ['Symbol', 'Shares', 'Purchase_Price', 'Current_Price', 'Currency', 'Purchase_Date']
+SALE_COLUMNS = ['Symbol', 'Shares', 'Sale_Price']
+
+
+def _hash_frame(digest, frame: pd.DataFrame, input_columns):
+    columns = [col for col in input_columns if col in frame.columns]
+    digest.update(json.dumps(columns).encode())
+    digest.update(pd.util.hash_pandas_object(frame[columns], index=False).to_numpy().tobytes())
+
+
+def portfolio_fingerprint(portfolio_df: pd.DataFrame, user_profile: Dict,
+                          sales_df: Optional[pd.DataFrame] = None) -> str:
+    """Stable content hash of the holdings frame, any sales against it and the user profile"""
+    digest = hashlib.blake2b(digest_size=16)
+    _hash_frame(digest, portfolio_df, INPUT_COLUMNS)
+    if sales_df is not None:
+        _hash_frame(digest, sales_df, SALE_COLUMNS)
+    digest.update(json.dumps(user_profile or {}, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class ByteLRUCache:
+    """Thread-safe LRU cache bounded by the pickled size of its values"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value, nbytes: Optional[int] = None):
+        if nbytes is None:
+            nbytes = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if nbytes > self.max_bytes:
+            return  # Never evict everything for a single oversized entry
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+ANALYSIS_CACHE = ByteLRUCache(ANALYSIS_CACHE_MAX_MB * 1024 * 1024)
+
+
+def cached_analysis(compute, portfolio_df: pd.DataFrame, user_profile: Dict,
+                    namespace: str = 'analysis', sales_df: Optional[pd.DataFrame] = None):
+    """Return compute(portfolio_df, user_profile[, sales_df]), memoized by portfolio content"""
+    args = (portfolio_df, user_profile) if sales_df is None else (portfolio_df, user_profile, sales_df)
+    if not CACHE_ENABLED:
+        return compute(*args)
+
+    key = f"{namespace}:{portfolio_fingerprint(*args)}"
+    result = ANALYSIS_CACHE.get(key)
+    if result is None:
+        result = compute(*args)
+        ANALYSIS_CACHE.put(key, result)
+    return _detached(result)
+
+
+def _detached(result):
+    """Result with its top-level and nested dicts copied, so callers popping keys leave the entry intact"""
+    if not isinstance(result, dict):
+        return result
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in result.items()}
@@ -0,0 +1,153 @@
+import argparse
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    BACKTEST_CHUNK_PORTFOLIOS, BACKTEST_HISTORY_DAYS, DEFAULT_RISK_FREE_RATE, SECTOR_HISTORY_PATH,
+    TRADING_DAYS_PER_YEAR
+)
+
+# Sample history per allocation sleeve: (annual drift, annual volatility, market beta)
+SAMPLE_SLEEVES = {
+    'Technology': (0.14, 0.26, 1.2),
+    'Healthcare': (0.09, 0.17, 0.8),
+    'Financial Services': (0.10, 0.21, 1.1),
+    'Consumer': (0.08, 0.18, 1.0),
+    'Consumer Staples': (0.06, 0.13, 0.6),
+    'Real Estate': (0.07, 0.20, 0.9),
+    'Utilities': (0.06, 0.15, 0.5),
+    'Renewable Energy': (0.10, 0.32, 1.1),
+    'Cryptocurrency': (0.25, 0.70, 1.5),
+    'Other': (0.06, 0.15, 0.8)
+}
+SAMPLE_MARKET_VOLATILITY = 0.15
+METRICS = ['total_return', 'annual_return', 'volatility', 'max_drawdown', 'sharpe_ratio']
+
+
+def sample_sleeve_returns(days: int = BACKTEST_HISTORY_DAYS, seed: int = 0) -> pd.DataFrame:
+    """Deterministic daily sleeve returns sharing one market factor"""
+    rng = np.random.default_rng(seed)
+    drift, volatility, beta = (np.array(values) for values in zip(*SAMPLE_SLEEVES.values()))
+    daily = 1 / np.sqrt(TRADING_DAYS_PER_YEAR)
+    market = rng.normal(0.0, SAMPLE_MARKET_VOLATILITY * daily, days)
+    market -= market.mean()  # Realized drift then matches SAMPLE_SLEEVES rather than the seed's luck
+    # Idiosyncratic volatility makes up whatever the market leg does not explain
+    specific = np.sqrt(np.maximum(volatility ** 2 - (beta * SAMPLE_MARKET_VOLATILITY) ** 2, 0.0025)) * daily
+    returns = (drift / TRADING_DAYS_PER_YEAR + market[:, None] * beta
+               + rng.normal(0.0, 1.0, (days, len(SAMPLE_SLEEVES))) * specific)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    return pd.DataFrame(np.maximum(returns, -0.99), index=dates, columns=list(SAMPLE_SLEEVES))
+
+
+def read_sector_history(path: str = SECTOR_HISTORY_PATH, days: int = BACKTEST_HISTORY_DAYS) -> pd.DataFrame:
+    """Daily returns (dates x sleeves) from a long-format date, sector, close history"""
+    history = pd.read_csv(path, parse_dates=['date'])
+    closes = history.pivot_table(index='date', columns='sector', values='close').sort_index().ffill()
+    return closes.pct_change(fill_method=None).iloc[1:].fillna(0.0).tail(days)
+
+
+class Backtester:
+    """Periodically rebalanced sleeve allocations over a daily return history, many portfolios at once"""
+
+    def __init__(self, returns: pd.DataFrame):
+        self.sleeves = [str(sleeve) for sleeve in returns.columns]
+        self.dates = returns.index
+        self.returns = returns.to_numpy(dtype=float)
+        growth = np.cumprod(1 + self.returns, axis=0)
+        # Row k is the growth before day k, so base[start] divides out everything before a period
+        self._base = np.vstack([np.ones(len(self.sleeves)), growth])
+        self._index = pd.Index(self.sleeves)
+        self._relative: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def load(cls, path: str = SECTOR_HISTORY_PATH) -> 'Backtester':
+        return cls(read_sector_history(path) if os.path.exists(path) else sample_sleeve_returns())
+
+    def weights(self, weights: np.ndarray, sleeves: List[str]) -> np.ndarray:
+        """Reorder weight columns to the history's sleeves, normalized per row; unknown sleeves sit in cash"""
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        columns = self._index.get_indexer(list(sleeves))
+        aligned = np.zeros((len(weights), len(self.sleeves)))
+        known = columns >= 0
+        aligned[:, columns[known]] = weights[:, known]
+        totals = weights.sum(axis=1, keepdims=True)
+        return np.divide(aligned, totals, out=np.zeros_like(aligned), where=totals > 0)
+
+    def _growth_since_rebalance(self, rebalance_days: int) -> np.ndarray:
+        relative = self._relative.get(rebalance_days)
+        if relative is None:
+            starts = np.arange(len(self.returns)) // rebalance_days * rebalance_days
+            relative = self._relative[rebalance_days] = self._base[1:] / self._base[starts]
+        return relative
+
+    def values(self, weights: np.ndarray, rebalance_days: int) -> np.ndarray:
+        """Portfolio value per day (days x portfolios, starting from 1) for weights over self.sleeves"""
+        days = len(self.returns)
+        period = np.arange(days) // rebalance_days
+        # Within a period every sleeve drifts with its own growth: one matmul covers all days and portfolios
+        within = self._growth_since_rebalance(rebalance_days) @ weights.T + (1 - weights.sum(axis=1))  # Plus cash
+        period_ends = np.minimum((np.arange(period[-1] + 1) + 1) * rebalance_days, days) - 1
+        carried = np.vstack([np.ones(len(weights)), np.cumprod(within[period_ends], axis=0)[:-1]])
+        return carried[period] * within
+
+    def metrics(self, values: np.ndarray) -> Dict[str, np.ndarray]:
+        """Return, volatility, drawdown and Sharpe ratio (all %, annualized where relevant) per column"""
+        # Portfolios x days keeps each running max and std over contiguous memory (~3x faster)
+        series = np.hstack([np.ones((values.shape[1], 1)), values.T])
+        daily = series[:, 1:] / series[:, :-1] - 1
+        years = values.shape[0] / TRADING_DAYS_PER_YEAR
+        annual_return = series[:, -1] ** (1 / years) - 1
+        volatility = daily.std(axis=1, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR)
+        drawdown = (series / np.maximum.accumulate(series, axis=1)).min(axis=1) - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe = np.where(volatility > 0, (annual_return - DEFAULT_RISK_FREE_RATE) / volatility, np.nan)
+        return {
+            'total_return': (series[:, -1] - 1) * 100,
+            'annual_return': annual_return * 100,
+            'volatility': volatility * 100,
+            'max_drawdown': drawdown * 100,
+            'sharpe_ratio': sharpe
+        }
+
+    def run(self, weights: np.ndarray, sleeves: List[str], rebalance_days,
+            chunk_size: int = BACKTEST_CHUNK_PORTFOLIOS) -> pd.DataFrame:
+        """Metrics for every row of weights (%, columns labelled by sleeves), one matrix pass per cadence"""
+        weights = self.weights(weights, sleeves)
+        cadence = np.broadcast_to(np.asarray(rebalance_days, dtype=int), (len(weights),))
+        results = {name: np.empty(len(weights)) for name in METRICS}
+        for days in np.unique(cadence):
+            rows = np.flatnonzero(cadence == days)
+            # Chunks over portfolios bound the days x portfolios value matrix, never a loop over dates
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                for name, values in self.metrics(self.values(weights[chunk], int(days))).items():
+                    results[name][chunk] = values
+        return pd.DataFrame(results)
+
+    def run_allocations(self, allocations: List[Dict[str, float]], rebalance_days,
+                        index: Optional[List[str]] = None) -> pd.DataFrame:
+        """Metrics for allocation dicts such as {'Technology': 45, 'Healthcare': 20, ...}"""
+        frame = pd.DataFrame.from_records(allocations).fillna(0.0)
+        results = self.run(frame.to_numpy(dtype=float), list(frame.columns), rebalance_days)
+        if index is not None:
+            results.index = pd.Index(index)
+        return results
+
+
+if __name__ == "__main__":
+    from utils.peer_matcher import PEER_STRATEGIES, strategy_allocation, strategy_rebalance_days
+
+    parser = argparse.ArgumentParser(description="Backtest the peer strategies over the sector history")
+    parser.add_argument("--history", default=SECTOR_HISTORY_PATH, help="Long-format date,sector,close CSV")
+    args = parser.parse_args()
+
+    backtester = Backtester.load(args.history)
+    print(f"{len(backtester.dates)} days, {backtester.dates[0]:%Y-%m-%d} to {backtester.dates[-1]:%Y-%m-%d}")
+    results = backtester.run_allocations(
+        [strategy_allocation(strategy) for strategy in PEER_STRATEGIES],
+        strategy_rebalance_days(PEER_STRATEGIES), index=PEER_STRATEGIES
+    )
+    print(results.round(2).to_string())
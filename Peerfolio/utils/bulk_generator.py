@@ -0,0 +1,185 @@
+import argparse
+import os
+from functools import lru_cache
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import NET_WORTH_RANGES
+from utils.backtester import Backtester
+from utils.data_generator import STOCK_PRICES, style_universe, net_worth_sizing
+from utils.peer_matcher import (
+    ALLOCATION_SLEEVES, PEER_LOCATIONS, PEER_STRATEGIES, INVESTMENT_STYLES, backtest_peers, peer_allocations
+)
+
+DEFAULT_CHUNK_SIZE = 100_000
+ALLOCATION_POOL_SIZE = 512  # Backtested tilted allocations per strategy that bulk peers draw from
+
+
+def _chunk_rngs(seed: int, total: int, chunk_size: int, stream: int) -> Iterator[Tuple[int, int, np.random.Generator]]:
+    """Yield (start, size, rng) per chunk; each chunk gets its own deterministic child seed"""
+    n_chunks = (total + chunk_size - 1) // chunk_size
+    children = np.random.SeedSequence([seed, stream]).spawn(n_chunks)
+    for i, child in enumerate(children):
+        start = i * chunk_size
+        yield start, min(chunk_size, total - start), np.random.default_rng(child)
+
+
+def _round_shares(shares: np.ndarray) -> np.ndarray:
+    """Vectorized version of the sample generator's share rounding rules"""
+    return np.where(
+        shares > 1000, np.round(shares, -1),
+        np.where(shares > 100, np.round(shares, 0), np.round(shares, 1))
+    )
+
+
+def _pick_without_replacement(rng: np.random.Generator, n_rows: int, universe_size: int,
+                              counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """For each row pick counts[row] distinct universe members; returns (row, member) pairs"""
+    # Ranking uniform keys gives an independent random permutation per row
+    ranks = np.argsort(np.argsort(rng.random((n_rows, universe_size)), axis=1), axis=1)
+    rows, members = np.nonzero(ranks < counts[:, None])
+    return rows, members
+
+
+def generate_portfolio_chunk(n_portfolios: int, rng: np.random.Generator,
+                             id_offset: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Generate profiles and holdings for n portfolios in one vectorized pass"""
+    ids = np.arange(id_offset, id_offset + n_portfolios)
+    styles = np.asarray(INVESTMENT_STYLES)[rng.integers(0, len(INVESTMENT_STYLES), n_portfolios)]
+    tier = rng.integers(0, len(NET_WORTH_RANGES), n_portfolios)
+    net_worths = np.asarray(NET_WORTH_RANGES)[tier]
+    profiles = pd.DataFrame({
+        'portfolio_id': ids,
+        'age': rng.integers(25, 66, n_portfolios),
+        'location': np.asarray(PEER_LOCATIONS)[rng.integers(0, len(PEER_LOCATIONS), n_portfolios)],
+        'net_worth': net_worths,
+        'investment_style': styles
+    })
+
+    # Position count and base investment from the net worth sizing rules
+    sizing = np.array([net_worth_sizing(net_worth) for net_worth in NET_WORTH_RANGES])
+    num_positions = rng.integers(sizing[tier, 0], sizing[tier, 1] + 1)
+    base_investment = rng.integers(sizing[tier, 2], sizing[tier, 3] + 1).astype(float)
+
+    holdings = []
+    universe_styles = {style: style_universe(style) for style in INVESTMENT_STYLES}
+    for style, (primary, secondary) in universe_styles.items():
+        rows = np.flatnonzero(styles == style)
+        if len(rows) == 0:
+            continue
+
+        n_primary = np.minimum(len(primary), (num_positions[rows] * 0.7).astype(int))
+        n_secondary = np.minimum(len(secondary), num_positions[rows] - n_primary)
+
+        for universe, counts in ((primary, n_primary), (secondary, n_secondary)):
+            row_idx, member_idx = _pick_without_replacement(rng, len(rows), len(universe), counts)
+            holdings.append(pd.DataFrame({
+                'portfolio_id': ids[rows[row_idx]],
+                'Symbol': np.asarray(universe)[member_idx],
+                '_base': base_investment[rows[row_idx]]
+            }))
+
+    holdings_df = pd.concat(holdings, ignore_index=True)
+    n_holdings = len(holdings_df)
+
+    current_price = holdings_df['Symbol'].map(STOCK_PRICES).fillna(100.0).to_numpy()
+    price_change = rng.uniform(-0.4, 0.6, n_holdings)  # -40% to +60% from current
+    position_size = holdings_df['_base'].to_numpy() * rng.uniform(0.3, 2.0, n_holdings)
+
+    holdings_df = holdings_df.drop(columns='_base')
+    holdings_df['Shares'] = _round_shares(position_size / current_price)
+    holdings_df['Purchase_Price'] = np.round(current_price * (1 - price_change), 2)
+    holdings_df['Current_Price'] = current_price
+    holdings_df = holdings_df.sort_values('portfolio_id', kind='stable', ignore_index=True)
+
+    return profiles, holdings_df
+
+
+@lru_cache(maxsize=1)
+def _allocation_pool() -> Tuple[np.ndarray, pd.DataFrame]:
+    """Tilted allocations per strategy, backtested once; millions of peers then cost one gather each"""
+    strategy_idx = np.repeat(np.arange(len(PEER_STRATEGIES)), ALLOCATION_POOL_SIZE)
+    weights = peer_allocations(strategy_idx, np.random.default_rng(0))
+    return weights, backtest_peers(Backtester.load(), strategy_idx, weights)
+
+
+def generate_peer_chunk(n_peers: int, rng: np.random.Generator, id_offset: int = 0) -> pd.DataFrame:
+    """Generate n peers with the same distributions as PeerMatcher._generate_peer_database"""
+    strategy_idx = rng.integers(0, len(PEER_STRATEGIES), n_peers)
+    pool_weights, pool_backtests = _allocation_pool()
+    pick = strategy_idx * ALLOCATION_POOL_SIZE + rng.integers(0, ALLOCATION_POOL_SIZE, n_peers)
+    weights = pool_weights[pick]
+    backtests = pool_backtests.iloc[pick]
+
+    return pd.DataFrame({
+        'id': pd.Series(np.arange(id_offset, id_offset + n_peers)).map('peer_{:03d}'.format),
+        'age': rng.integers(25, 66, n_peers),
+        'location': np.asarray(PEER_LOCATIONS)[rng.integers(0, len(PEER_LOCATIONS), n_peers)],
+        'net_worth': np.asarray(NET_WORTH_RANGES)[rng.integers(0, len(NET_WORTH_RANGES), n_peers)],
+        'strategy': np.asarray(PEER_STRATEGIES)[strategy_idx],
+        'performance': backtests['annual_return'].to_numpy(),
+        'volatility': backtests['volatility'].to_numpy(),
+        'max_drawdown': backtests['max_drawdown'].to_numpy(),
+        'top_sector': np.asarray(ALLOCATION_SLEEVES)[weights.argmax(axis=1)],
+        'risk_level': backtests['risk_level'].to_numpy(),
+        'years_experience': rng.integers(1, 21, n_peers),
+        'investment_style': np.asarray(INVESTMENT_STYLES)[rng.integers(0, len(INVESTMENT_STYLES), n_peers)]
+    })
+
+
+def iter_portfolio_chunks(n_portfolios: int, seed: int = 0,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    for start, size, rng in _chunk_rngs(seed, n_portfolios, chunk_size, stream=0):
+        yield generate_portfolio_chunk(size, rng, id_offset=start)
+
+
+def iter_peer_chunks(n_peers: int, seed: int = 0,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    for start, size, rng in _chunk_rngs(seed, n_peers, chunk_size, stream=1):
+        yield generate_peer_chunk(size, rng, id_offset=start)
+
+
+def write_load_test_dataset(output_dir: str, n_portfolios: int, n_peers: int, seed: int = 0,
+                            chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, int]:
+    """Stream N portfolios and M peers to Parquet, one row group per chunk"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(output_dir, exist_ok=True)
+    writers = {}
+    rows = {'profiles': 0, 'holdings': 0, 'peers': 0}
+
+    def write(name: str, frame: pd.DataFrame):
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if name not in writers:
+            writers[name] = pq.ParquetWriter(os.path.join(output_dir, f"{name}.parquet"), table.schema)
+        writers[name].write_table(table)
+        rows[name] += len(frame)
+
+    try:
+        for profiles, holdings in iter_portfolio_chunks(n_portfolios, seed, chunk_size):
+            write('profiles', profiles)
+            write('holdings', holdings)
+        for peers in iter_peer_chunks(n_peers, seed, chunk_size):
+            write('peers', peers)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic load-test dataset")
+    parser.add_argument("--portfolios", type=int, default=1_000_000)
+    parser.add_argument("--peers", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--output", default=os.path.join("data", "load_test"))
+    args = parser.parse_args()
+
+    counts = write_load_test_dataset(args.output, args.portfolios, args.peers, args.seed, args.chunk_size)
+    for name, count in counts.items():
+        print(f"{name}: {count:,} rows")
@@ -0,0 +1,78 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import CHART_WIDTH_PX, WEBGL_POINT_THRESHOLD
+
+
+def lttb_indices(y: np.ndarray, n_out: int, x: Optional[np.ndarray] = None) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of the points that best preserve the shape"""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    anchor = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Pick the point forming the largest triangle with the anchor and next bucket average
+        area = np.abs(
+            (x[anchor] - avg_x) * (y[start:end] - y[anchor])
+            - (x[anchor] - x[start:end]) * (avg_y - y[anchor])
+        )
+        anchor = start + int(np.argmax(area))
+        indices[i + 1] = anchor
+
+    return indices
+
+
+def minmax_indices(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Indices of the minimum and maximum point in each pixel bucket"""
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+
+    bucket = np.arange(n) * n_buckets // n
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n)
+    keep = np.concatenate([order[starts], order[ends - 1], [0, n - 1]])
+    return np.unique(keep)
+
+
+def downsample_frame(frame: pd.DataFrame, width_px: int = CHART_WIDTH_PX,
+                     method: str = 'minmax') -> pd.DataFrame:
+    """Downsample each column of a time-indexed frame into a long Date/Asset/Value frame"""
+    # About two points per pixel of chart width bound the payload regardless of history length
+    x = frame.index.to_numpy()
+    x_numeric = x.astype('datetime64[ns]').astype(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x
+    parts = []
+    for column in frame.columns:
+        y = frame[column].to_numpy(dtype=float)
+        if method == 'minmax':
+            idx = minmax_indices(y, width_px)
+        else:
+            idx = lttb_indices(y, 2 * width_px, x_numeric)
+        parts.append(pd.DataFrame({'Date': x[idx], 'Asset': column, 'Value': y[idx]}))
+
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['Date', 'Asset', 'Value'])
+
+
+def render_mode(n_points: int) -> str:
+    """Use WebGL (Scattergl) traces once a chart carries many points"""
+    return 'webgl' if n_points > WEBGL_POINT_THRESHOLD else 'svg'
@@ -0,0 +1,197 @@
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import COST_BASIS_METHOD, LONG_TERM_HOLDING_DAYS
+
+COST_BASIS_METHODS = ['fifo', 'lifo', 'hifo', 'average']
+
+
+class CostBasisError(ValueError):
+    """Raised when sales cannot be relieved against the lots held"""
+
+
+class LotBook:
+    """Tax lots stored as flat arrays grouped by symbol (lots of symbol i are offsets[i]:offsets[i+1])"""
+
+    def __init__(self, symbols: np.ndarray, offsets: np.ndarray, shares: np.ndarray,
+                 purchase_price: np.ndarray, purchase_date: np.ndarray, current_price: np.ndarray):
+        self.symbols = symbols
+        self.offsets = offsets
+        self.shares = shares
+        self.purchase_price = purchase_price
+        self.purchase_date = purchase_date
+        self.current_price = current_price  # One quote per symbol
+
+    @classmethod
+    def from_frame(cls, lots_df: pd.DataFrame) -> 'LotBook':
+        """Build from rows of Symbol, Shares, Purchase_Price, Current_Price[, Purchase_Date]"""
+        # Integer symbol codes keep the sort numeric; sorted uniques make symbols searchable
+        codes, uniques = pd.factorize(lots_df['Symbol'].astype(str), sort=True)
+        if 'Purchase_Date' in lots_df.columns:
+            dates = pd.to_datetime(lots_df['Purchase_Date'], errors='coerce').to_numpy('datetime64[D]')
+        else:
+            dates = np.full(len(lots_df), np.datetime64('NaT'), dtype='datetime64[D]')
+
+        # Stable sort keeps the file order of lots as the acquisition order when dates tie or are missing
+        order = np.lexsort((dates, codes))
+        offsets = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        starts = offsets[:-1]
+        symbols = np.asarray(uniques, dtype=object)
+
+        # Latest row per symbol carries the quote, matching the upload aggregator
+        last_rows = np.maximum.reduceat(order, starts) if len(order) else order
+        current_price = lots_df['Current_Price'].to_numpy(dtype=float)[last_rows]
+
+        return cls(
+            symbols,
+            offsets,
+            lots_df['Shares'].to_numpy(dtype=float)[order],
+            lots_df['Purchase_Price'].to_numpy(dtype=float)[order],
+            dates[order],
+            current_price
+        )
+
+    def __len__(self) -> int:
+        return len(self.shares)
+
+    def symbol_index(self) -> np.ndarray:
+        """Position of each lot's symbol in self.symbols"""
+        return np.repeat(np.arange(len(self.symbols)), np.diff(self.offsets))
+
+    def lots(self, symbol: str) -> pd.DataFrame:
+        """Lots of a single symbol as a frame (views of the underlying arrays)"""
+        i = int(np.searchsorted(self.symbols, symbol))
+        if i >= len(self.symbols) or self.symbols[i] != symbol:
+            return pd.DataFrame(columns=['Shares', 'Purchase_Price', 'Purchase_Date'])
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return pd.DataFrame({
+            'Shares': self.shares[start:end],
+            'Purchase_Price': self.purchase_price[start:end],
+            'Purchase_Date': self.purchase_date[start:end]
+        })
+
+
+def _relief_order(book: LotBook, sym_idx: np.ndarray, method: str) -> np.ndarray:
+    """Global lot order in which each symbol's lots are sold under the given method"""
+    position = np.arange(len(book))
+    if method == 'fifo':
+        key = position
+    elif method == 'lifo':
+        key = -position
+    elif method == 'hifo':
+        key = -book.purchase_price
+    else:
+        raise ValueError(f"Unknown cost basis method '{method}'. Use one of {COST_BASIS_METHODS}")
+    return np.lexsort((position, key, sym_idx))
+
+
+def _sold_per_symbol(book: LotBook, sales_df: Optional[pd.DataFrame]):
+    """Shares sold and sale proceeds per book symbol"""
+    sold = np.zeros(len(book.symbols))
+    proceeds = np.zeros(len(book.symbols))
+    if sales_df is None or sales_df.empty:
+        return sold, proceeds
+
+    totals = sales_df.assign(
+        _proceeds=sales_df['Shares'] * sales_df['Sale_Price']
+    ).groupby('Symbol')[['Shares', '_proceeds']].sum()
+    idx = np.searchsorted(book.symbols, totals.index.to_numpy(dtype=str))
+    known = (idx < len(book.symbols)) & (book.symbols[np.minimum(idx, len(book.symbols) - 1)] == totals.index)
+    if not known.all():
+        missing = ', '.join(totals.index[~known])
+        raise CostBasisError(f"Sales reference symbols with no lots: {missing}")
+
+    sold[idx] = totals['Shares'].to_numpy()
+    proceeds[idx] = totals['_proceeds'].to_numpy()
+    return sold, proceeds
+
+
+def compute_cost_basis(lots_df: pd.DataFrame, sales_df: Optional[pd.DataFrame] = None,
+                       method: str = COST_BASIS_METHOD, as_of: Optional[pd.Timestamp] = None) -> Dict:
+    """Relieve sales against tax lots and value what remains; sales settle after every lot"""
+    method = method.lower()
+    book = lots_df if isinstance(lots_df, LotBook) else LotBook.from_frame(lots_df)
+    sym_idx = book.symbol_index()
+    sold, proceeds = _sold_per_symbol(book, sales_df)
+
+    held = np.add.reduceat(book.shares, book.offsets[:-1]) if len(book) else np.zeros(0)
+    if np.any(sold > held + 1e-9):
+        oversold = ', '.join(book.symbols[sold > held + 1e-9])
+        raise CostBasisError(f"Sales exceed held shares for: {oversold}")
+
+    lot_cost = book.shares * book.purchase_price
+    if method == 'average':
+        # Pooled basis: every share of a symbol carries the symbol's average cost
+        cost_total = np.add.reduceat(lot_cost, book.offsets[:-1]) if len(book) else np.zeros(0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction_kept = np.where(held > 0, 1 - sold / held, 0.0)
+            avg_cost = np.where(held > 0, cost_total / held, 0.0)
+        remaining = book.shares * fraction_kept[sym_idx]
+        basis_price = avg_cost[sym_idx]
+        relieved_cost = sold * avg_cost
+    else:
+        # Shares consumed by each lot = sold quantity not already covered by earlier lots in order
+        order = _relief_order(book, sym_idx, method)
+        ordered_shares = book.shares[order]
+        ordered_sym = sym_idx[order]
+        cumulative = np.cumsum(ordered_shares)
+        before = cumulative - ordered_shares - np.append(0.0, cumulative)[book.offsets[:-1]][ordered_sym]
+        consumed = np.empty_like(ordered_shares)
+        consumed[order] = np.clip(sold[ordered_sym] - before, 0.0, ordered_shares)
+
+        remaining = book.shares - consumed
+        basis_price = book.purchase_price
+        relieved_cost = np.bincount(sym_idx, consumed * book.purchase_price, minlength=len(book.symbols))
+
+    current = book.current_price[sym_idx]
+    unrealized = remaining * (current - basis_price)
+    realized = proceeds - relieved_cost
+
+    as_of = np.datetime64(pd.Timestamp(as_of or pd.Timestamp.today()).date(), 'D')
+    # Lots without a purchase date have an unknown term; Long_Term stays False so they are taxed at the short rate
+    long_term = book.purchase_date <= as_of - np.timedelta64(LONG_TERM_HOLDING_DAYS, 'D')
+    undated = np.isnat(book.purchase_date)
+
+    lots = pd.DataFrame({
+        'Symbol': book.symbols[sym_idx],
+        'Shares': remaining,
+        'Purchase_Price': basis_price,
+        'Purchase_Date': book.purchase_date,
+        'Current_Price': current,
+        'Unrealized_PnL': unrealized,
+        'Long_Term': long_term,
+        'Term': np.where(undated, 'unknown', np.where(long_term, 'long', 'short'))
+    })
+    lots = lots[lots['Shares'] > 1e-9].reset_index(drop=True)
+
+    remaining_by_symbol = np.bincount(sym_idx, remaining, minlength=len(book.symbols))
+    basis_by_symbol = np.bincount(sym_idx, remaining * basis_price, minlength=len(book.symbols))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_basis = np.where(remaining_by_symbol > 0, basis_by_symbol / remaining_by_symbol, 0.0)
+
+    positions = pd.DataFrame({
+        'Symbol': book.symbols,
+        'Shares': remaining_by_symbol,
+        'Purchase_Price': avg_basis,
+        'Current_Price': book.current_price,
+        'Lots': np.diff(book.offsets),
+        'Realized_PnL': realized,
+        'Unrealized_PnL': np.bincount(sym_idx, unrealized, minlength=len(book.symbols))
+    })
+    positions = positions[positions['Shares'] > 1e-9].reset_index(drop=True)
+
+    losses = np.minimum(unrealized, 0.0)
+    return {
+        'method': method,
+        'lots': lots,
+        'positions': positions,
+        'lot_count': int(len(book)),
+        'realized_pnl': float(realized.sum()),
+        'unrealized_pnl': float(unrealized.sum()),
+        'unrealized_losses': abs(float(losses.sum())),
+        'short_term_losses': abs(float(losses[~long_term & ~undated].sum())),
+        'long_term_losses': abs(float(losses[long_term].sum())),
+        'undated_losses': abs(float(losses[undated].sum()))
+    }
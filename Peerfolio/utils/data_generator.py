@@ -3,46 +3,83 @@ import numpy as np
 from typing import Dict
 import random
 
+# Stock universes per investment style: (primary, secondary)
+STYLE_UNIVERSES = {
+    'Tech-focused': (
+        ['AAPL', 'MSFT', 'GOOGL', 'NVDA', 'META', 'TSLA', 'ADBE', 'CRM', 'NFLX', 'AMD'],
+        ['AMZN', 'V', 'MA', 'UNH', 'JNJ']
+    ),
+    'Conservative': (
+        ['JNJ', 'PG', 'KO', 'WMT', 'UNH', 'V', 'MA', 'HD', 'PFE', 'VZ'],
+        ['AAPL', 'MSFT', 'JPM', 'BAC', 'T']
+    ),
+    'ESG-focused': (
+        ['MSFT', 'AAPL', 'GOOGL', 'UNH', 'PG', 'V', 'MA', 'HD', 'JNJ', 'PFE'],
+        ['NVDA', 'ADBE', 'CRM', 'TMO', 'ABT']
+    ),
+    'Crypto-focused': (
+        ['TSLA', 'NVDA', 'COIN', 'MSTR', 'SQ', 'PYPL', 'HOOD', 'RIOT', 'MARA'],
+        ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META']
+    ),
+    'Moderate': (  # Also used for Aggressive
+        ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'UNH', 'JNJ', 'V', 'MA', 'NVDA'],
+        ['JPM', 'PG', 'HD', 'PFE', 'WMT', 'BAC', 'DIS', 'ADBE', 'CRM', 'TMO']
+    )
+}
+
+# Portfolio sizing per net worth bracket: (min positions, max positions, min base, max base)
+NET_WORTH_SIZING = {
+    '$1M - $2.5M': (8, 12, 50000, 150000),
+    '$2.5M - $5M': (10, 15, 100000, 300000),
+    '$5M - $10M': (12, 18, 200000, 500000),
+    '$10M - $25M': (15, 25, 400000, 800000),
+    '$25M+': (20, 30, 500000, 1500000)
+}
+
+# Stock price data (realistic current prices)
+STOCK_PRICES = {
+    'AAPL': 175.43, 'MSFT': 384.52, 'GOOGL': 138.76, 'AMZN': 146.89, 'TSLA': 248.87,
+    'NVDA': 459.75, 'META': 298.54, 'UNH': 524.32, 'JNJ': 159.87, 'V': 241.65,
+    'MA': 421.23, 'PG': 156.78, 'HD': 365.43, 'PFE': 28.95, 'WMT': 165.32,
+    'JPM': 154.76, 'BAC': 32.87, 'DIS': 96.54, 'ADBE': 512.34, 'CRM': 234.56,
+    'TMO': 578.90, 'ABT': 108.76, 'VZ': 38.95, 'T': 19.45, 'KO': 59.32,
+    'COIN': 87.65, 'MSTR': 189.43, 'SQ': 76.23, 'PYPL': 58.76, 'HOOD': 12.34,
+    'RIOT': 8.76, 'MARA': 15.43, 'AMD': 142.87, 'NFLX': 445.67
+}
+
+
+def style_universe(investment_style: str):
+    """Primary and secondary stock universe for an investment style"""
+    return STYLE_UNIVERSES.get(investment_style, STYLE_UNIVERSES['Moderate'])
+
+
+def net_worth_sizing(net_worth: str):
+    """Position count and base investment ranges for a net worth bracket"""
+    if '$1M' in net_worth:
+        return NET_WORTH_SIZING['$1M - $2.5M']
+    elif '$2.5M' in net_worth:
+        return NET_WORTH_SIZING['$2.5M - $5M']
+    elif '$5M' in net_worth:
+        return NET_WORTH_SIZING['$5M - $10M']
+    elif '$10M' in net_worth:
+        return NET_WORTH_SIZING['$10M - $25M']
+    else:  # $25M+
+        return NET_WORTH_SIZING['$25M+']
+
+
 def generate_sample_data(user_profile: Dict) -> pd.DataFrame:
     """Generate realistic sample portfolio data based on user profile"""
     
     investment_style = user_profile.get('investment_style', 'Moderate')
-    age = user_profile.get('age', 35)
     net_worth = user_profile.get('net_worth', '$2.5M - $5M')
     
-    # Define stock universes based on investment style
-    if investment_style == 'Tech-focused':
-        primary_stocks = ['AAPL', 'MSFT', 'GOOGL', 'NVDA', 'META', 'TSLA', 'ADBE', 'CRM', 'NFLX', 'AMD']
-        secondary_stocks = ['AMZN', 'V', 'MA', 'UNH', 'JNJ']
-    elif investment_style == 'Conservative':
-        primary_stocks = ['JNJ', 'PG', 'KO', 'WMT', 'UNH', 'V', 'MA', 'HD', 'PFE', 'VZ']
-        secondary_stocks = ['AAPL', 'MSFT', 'JPM', 'BAC', 'T']
-    elif investment_style == 'ESG-focused':
-        primary_stocks = ['MSFT', 'AAPL', 'GOOGL', 'UNH', 'PG', 'V', 'MA', 'HD', 'JNJ', 'PFE']
-        secondary_stocks = ['NVDA', 'ADBE', 'CRM', 'TMO', 'ABT']
-    elif investment_style == 'Crypto-focused':
-        primary_stocks = ['TSLA', 'NVDA', 'COIN', 'MSTR', 'SQ', 'PYPL', 'HOOD', 'RIOT', 'MARA']
-        secondary_stocks = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'META']
-    else:  # Moderate/Aggressive
-        primary_stocks = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'UNH', 'JNJ', 'V', 'MA', 'NVDA']
-        secondary_stocks = ['JPM', 'PG', 'HD', 'PFE', 'WMT', 'BAC', 'DIS', 'ADBE', 'CRM', 'TMO']
+    # Stock universes based on investment style
+    primary_stocks, secondary_stocks = style_universe(investment_style)
     
     # Determine portfolio size based on net worth
-    if '$1M' in net_worth:
-        num_positions = random.randint(8, 12)
-        base_investment = random.randint(50000, 150000)
-    elif '$2.5M' in net_worth:
-        num_positions = random.randint(10, 15)
-        base_investment = random.randint(100000, 300000)
-    elif '$5M' in net_worth:
-        num_positions = random.randint(12, 18)
-        base_investment = random.randint(200000, 500000)
-    elif '$10M' in net_worth:
-        num_positions = random.randint(15, 25)
-        base_investment = random.randint(400000, 800000)
-    else:  # $25M+
-        num_positions = random.randint(20, 30)
-        base_investment = random.randint(500000, 1500000)
+    min_positions, max_positions, min_base, max_base = net_worth_sizing(net_worth)
+    num_positions = random.randint(min_positions, max_positions)
+    base_investment = random.randint(min_base, max_base)
     
     # Select stocks for portfolio
     selected_stocks = random.sample(primary_stocks, min(len(primary_stocks), int(num_positions * 0.7)))
@@ -50,21 +87,10 @@ def generate_sample_data(user_profile: Dict) -> pd.DataFrame:
     if remaining_positions > 0:
         selected_stocks.extend(random.sample(secondary_stocks, min(len(secondary_stocks), remaining_positions)))
     
-    # Stock price data (realistic current prices)
-    stock_prices = {
-        'AAPL': 175.43, 'MSFT': 384.52, 'GOOGL': 138.76, 'AMZN': 146.89, 'TSLA': 248.87,
-        'NVDA': 459.75, 'META': 298.54, 'UNH': 524.32, 'JNJ': 159.87, 'V': 241.65,
-        'MA': 421.23, 'PG': 156.78, 'HD': 365.43, 'PFE': 28.95, 'WMT': 165.32,
-        'JPM': 154.76, 'BAC': 32.87, 'DIS': 96.54, 'ADBE': 512.34, 'CRM': 234.56,
-        'TMO': 578.90, 'ABT': 108.76, 'VZ': 38.95, 'T': 19.45, 'KO': 59.32,
-        'COIN': 87.65, 'MSTR': 189.43, 'SQ': 76.23, 'PYPL': 58.76, 'HOOD': 12.34,
-        'RIOT': 8.76, 'MARA': 15.43, 'AMD': 142.87, 'NFLX': 445.67
-    }
-    
     portfolio_data = []
     
     for stock in selected_stocks:
-        current_price = stock_prices.get(stock, 100.0)
+        current_price = STOCK_PRICES.get(stock, 100.0)
         
         # Generate realistic purchase price (could be higher or lower than current)
         price_change = random.uniform(-0.4, 0.6)  # -40% to +60% from current
@@ -89,19 +115,11 @@ def generate_sample_data(user_profile: Dict) -> pd.DataFrame:
             'Current_Price': current_price
         })
     
-    # Create DataFrame
+    # Create DataFrame sorted by market value (largest positions first)
     df = pd.DataFrame(portfolio_data)
+    order = np.argsort(-(df['Shares'] * df['Current_Price']).to_numpy(), kind='stable')
     
-    # Add calculated columns
-    df['Market_Value'] = df['Shares'] * df['Current_Price']
-    df['Cost_Basis'] = df['Shares'] * df['Purchase_Price']
-    df['P&L'] = df['Market_Value'] - df['Cost_Basis']
-    df['Return_%'] = (df['P&L'] / df['Cost_Basis']) * 100
-    
-    # Sort by market value (largest positions first)
-    df = df.sort_values('Market_Value', ascending=False).reset_index(drop=True)
-    
-    return df[['Symbol', 'Shares', 'Purchase_Price', 'Current_Price']]
+    return df.iloc[order].reset_index(drop=True)
 
 def generate_market_data():
     """Generate sample market data for testing"""
@@ -128,31 +146,12 @@ def generate_market_data():
         'last_updated': '2025-06-28 14:30:00'
     }
 
-def generate_peer_performance_data():
-    """Generate sample peer performance data"""
-    
-    locations = ["Singapore", "Hong Kong", "Switzerland", "New York", "London", "Dubai"]
-    age_groups = ["25-30", "31-35", "36-40", "41-45", "46-50", "51-55", "56-60", "60+"]
-    
-    performance_data = []
-    
-    for location in locations:
-        for age_group in age_groups:
-            # Generate realistic performance data
-            avg_return = random.uniform(4.5, 15.2)
-            volatility = random.uniform(8.5, 25.3)
-            sharpe_ratio = avg_return / volatility
-            
-            performance_data.append({
-                'location': location,
-                'age_group': age_group,
-                'avg_return': avg_return,
-                'volatility': volatility,
-                'sharpe_ratio': sharpe_ratio,
-                'sample_size': random.randint(45, 234)
-            })
-    
-    return performance_data
+def generate_peer_performance_data(peer_cube):
+    """Peer performance by location and age band, rolled up from the materialized cohort cube"""
+    rollup = peer_cube.rollup(['location', 'age_band'])
+    return rollup.rename(columns={'age_band': 'age_group', 'count': 'sample_size'}).assign(
+        sample_size=lambda frame: frame['sample_size'].astype(int)
+    ).to_dict('records')
 
 def generate_sector_trends():
     """Generate sector trend data"""
@@ -0,0 +1,334 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import (
+    DIVERSIFICATION_CACHE_ENTRIES, DIVERSIFICATION_MAX_HOLDINGS, DIVERSIFICATION_MAX_UPDATES,
+    DIVERSIFICATION_MIN_CORRECTED_HOLDINGS
+)
+from utils.factor_risk import FactorRiskModel
+
+SECULAR_STEPS = 64  # Iteration cap per secular-equation solve; rational steps converge in a handful
+DEFLATION_TOLERANCE = 1e-12  # Update components below this (relative) leave an eigenpair unchanged
+GAP_TOLERANCE = 1e-9  # Closer eigenvalues make the secular equation ill-conditioned; recompute instead
+
+# A basis step (size, columns, rotation, order) takes coordinates in one eigenbasis to the next: of the first size
+# coordinates, columns (a slice or indices) are rotated, then all size are reordered; later, appended ones pass
+Step = Tuple[int, object, Optional[np.ndarray], Optional[np.ndarray]]
+
+
+def _apply_steps(coordinates: np.ndarray, steps: List[Step]) -> np.ndarray:
+    """Coordinates of a vector in the basis reached through steps, from its coordinates before them"""
+    for size, columns, rotation, order in steps:
+        head = coordinates[:size].copy()
+        if rotation is not None:
+            head[columns] = rotation.T @ head[columns]
+        if order is not None:
+            head = head[order]
+        coordinates = np.concatenate([head, coordinates[size:]])
+    return coordinates
+
+
+def _rank_one_update(values: np.ndarray, projected: np.ndarray,
+                     rho: float) -> Optional[Tuple[np.ndarray, List[Step]]]:
+    """Eigenvalues of diag(values) + rho z z' (ascending values, z in that basis) and the steps to its
+    eigenbasis; None when ill-conditioned"""
+    if rho < 0:
+        # Negating the matrix turns a downdate into an update over the reversed spectrum
+        updated = _rank_one_update(-values[::-1], projected[::-1], -rho)
+        if updated is None:
+            return None
+        reverse = (len(values), None, None, np.arange(len(values))[::-1])
+        return -updated[0][::-1], [reverse, *updated[1], reverse]
+
+    norm = np.linalg.norm(projected)
+    active = np.flatnonzero(np.abs(projected) > DEFLATION_TOLERANCE * max(norm, 1.0))
+    if not len(active):
+        return values, []
+    d, zeta = values[active], projected[active]
+    if len(d) > 1 and np.diff(d).min() < GAP_TOLERANCE * max(np.abs(d).max(), 1.0):
+        return None
+
+    # Root i of 1 / rho + sum(zeta^2 / (d - mu)) lies at d_i + t_i with t_i in (0, d_{i+1} - d_i), the last
+    # one in (0, rho |zeta|^2). As in LAPACK's dlaed4, each step fits one pole either side of the root with
+    # its slope and solves that rational model; steps leaving the bracket bisect it instead
+    m = len(d)
+    gaps = d[None, :] - d[:, None]  # gaps[i, j] = d_j - d_i
+    weights = zeta * zeta
+    width = np.append(np.diff(d), 0.0)
+    last = np.arange(m) == m - 1
+    low = np.zeros(m)
+    high = np.where(last, rho * weights.sum(), width)
+    t = (low + high) / 2
+    pending = np.arange(m)
+    tolerance = 8 * m * np.finfo(float).eps
+    inverse_buffer, magnitude_buffer = np.empty((m, m)), np.empty((m, m))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(SECULAR_STEPS):
+            # Row sums run as matrix-vector products over reused buffers: the m x m passes dominate. Poles
+            # left of a root give the negative inverses, which splits every sum without a mask
+            k = len(pending)
+            inverse, magnitude = inverse_buffer[:k], magnitude_buffer[:k]
+            np.subtract(gaps if k == m else gaps[pending], t[pending, None], out=inverse)
+            np.reciprocal(inverse, out=inverse)
+            np.abs(inverse, out=magnitude)
+            value = 1 / rho + inverse @ weights
+            settled = np.abs(value) <= tolerance * (1 / rho + magnitude @ weights)
+            magnitude *= inverse
+            net_slope = magnitude @ weights  # Right poles' slope minus left poles'
+            inverse *= inverse
+            total_slope = inverse @ weights
+            left_slope, right_slope = (total_slope - net_slope) / 2, (total_slope + net_slope) / 2
+            keep = ~settled
+            pending, value, left_slope, right_slope = (
+                pending[keep], value[keep], left_slope[keep], right_slope[keep]
+            )
+            if not len(pending):
+                break
+            high[pending] = np.where(value > 0, t[pending], high[pending])
+            low[pending] = np.where(value > 0, low[pending], t[pending])
+
+            root, edge, span = t[pending], last[pending], width[pending]
+            left = left_slope * root * root
+            right = np.where(edge, 0.0, right_slope * (span - root) ** 2)
+            constant = value + left / root - np.where(edge, 0.0, right / (span - root))
+            b = constant * span + left + right
+            step = np.where(
+                edge, left / constant,
+                2 * left * span / (b + np.sqrt(np.maximum(b * b - 4 * constant * left * span, 0.0)))
+            )
+            inside = (step > low[pending]) & (step < high[pending])
+            moved = np.where(inside, step, (low[pending] + high[pending]) / 2)
+            # A step that no longer moves the root leaves it at rounding level, even if the residual is not
+            stalled = np.abs(moved - root) <= 2 * np.finfo(float).eps * root
+            t[pending] = moved
+            pending = pending[~stalled]
+            if not len(pending):
+                break
+
+        # Rebuild z from the computed roots (Gu & Eisenstat) so the new eigenvectors stay orthogonal. Interlacing
+        # keeps each ratio (d_j - mu_i) / (d_j - d_i) moderate, so their product needs no logs (as in dlaed3)
+        differences = np.subtract(gaps, t[:, None], out=inverse_buffer)  # d_j - mu_i
+        gaps[np.diag_indices(m)] = 1.0
+        ratios = np.divide(differences, gaps, out=magnitude_buffer)
+        z_hat = np.sign(zeta) * np.sqrt(np.abs(ratios.prod(axis=0)) / rho)
+        rotation = np.divide(z_hat[:, None], differences.T, out=magnitude_buffer)
+    if not np.isfinite(rotation).all():
+        return None
+    rotation /= np.sqrt(np.einsum('ij,ij->j', rotation, rotation))
+
+    if len(active) == len(values):
+        return d + t, [(m, slice(None), rotation, None)]  # Interlacing keeps the roots ascending
+    new_values = values.copy()
+    new_values[active] = d + t
+    order = np.argsort(new_values, kind='stable')
+    return new_values[order], [(len(values), active, rotation, order)]
+
+
+class CorrelationEigen:
+    """Eigendecomposition of a holdings correlation matrix, corrected rather than redone when one holding changes"""
+
+    def __init__(self, keys: List[Hashable], exposures: np.ndarray, specific_variance: np.ndarray,
+                 factor_covariance: np.ndarray):
+        self.keys = list(keys)
+        self.exposures = np.asarray(exposures, dtype=float)  # holdings x factors, dense (a handful of factors)
+        self.specific_variance = np.asarray(specific_variance, dtype=float)
+        self.factor_covariance = factor_covariance
+        covariance = self.exposures @ factor_covariance @ self.exposures.T + np.diag(self.specific_variance)
+        self.volatility = np.sqrt(np.diag(covariance))
+        self.correlation = covariance / np.outer(self.volatility, self.volatility)
+        self._decompose()
+
+    def _decompose(self):
+        # Eigenvectors are the base times every later correction's steps: multiplying a rotation into the
+        # vectors would cost O(n^3) per correction, projecting through it costs O(n^2)
+        self.values, self.base = np.linalg.eigh(self.correlation)
+        self.steps: List[Step] = []
+        self.updates = 0
+
+    def copy(self) -> 'CorrelationEigen':
+        clone = object.__new__(CorrelationEigen)
+        clone.__dict__.update(self.__dict__)
+        # The base and steps are only ever replaced, so they are shared; rows set in place are copied
+        for name in ('keys', 'exposures', 'specific_variance', 'volatility', 'correlation'):
+            setattr(clone, name, getattr(self, name).copy())
+        return clone
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        """Coordinates of vectors (or matrix columns) in the eigenbasis, V' x"""
+        return _apply_steps(self.base.T @ vectors, self.steps)
+
+    def _volatility(self, exposure: np.ndarray, specific_variance: float) -> float:
+        return float(np.sqrt(exposure @ self.factor_covariance @ exposure + specific_variance))
+
+    def _set_row(self, position: int, row: np.ndarray):
+        """Replace one row and column of the correlation matrix: a rank-two correction"""
+        delta = row - self.correlation[position]
+        delta[position] = 0.0
+        self.correlation[position] = self.correlation[:, position] = row
+        scale = np.sqrt(np.linalg.norm(delta))
+        if scale == 0:
+            return
+        self.updates += 1
+        if self.updates > DIVERSIFICATION_MAX_UPDATES:
+            self._decompose()  # Bounds the rounding drift and the steps every projection runs through
+            return
+
+        # delta e' + e delta' = (u u' - v v') / 2 with u, v = delta / s +- s e
+        unit = np.zeros(len(row))
+        unit[position] = 1.0
+        along_delta, along_unit = (self.project(np.column_stack([delta, unit])) * [1 / scale, scale]).T
+        values, steps = self.values, []
+        for sign in (1.0, -1.0):
+            updated = _rank_one_update(values, _apply_steps(along_delta + sign * along_unit, steps), sign / 2)
+            if updated is None:
+                self._decompose()
+                return
+            values, steps = updated[0], steps + updated[1]
+        self.values, self.steps = values, self.steps + steps
+
+    def _row(self, exposure: np.ndarray, volatility: float) -> np.ndarray:
+        covariance = self.exposures @ (self.factor_covariance @ exposure)
+        return covariance / (self.volatility * volatility)
+
+    def replace(self, position: int, key: Hashable, exposure: np.ndarray, specific_variance: float):
+        """Swap the holding at position for another"""
+        volatility = self._volatility(exposure, specific_variance)
+        self.keys[position] = key
+        self.exposures[position] = exposure
+        self.specific_variance[position] = specific_variance
+        self.volatility[position] = volatility
+        row = self._row(exposure, volatility)
+        row[position] = 1.0
+        self._set_row(position, row)
+
+    def append(self, key: Hashable, exposure: np.ndarray, specific_variance: float):
+        """Add a holding: pad with an uncorrelated unit row (eigenvalue 1), then correct it"""
+        n = len(self.keys)
+        self.keys.append(key)
+        self.exposures = np.vstack([self.exposures, exposure])
+        self.specific_variance = np.append(self.specific_variance, specific_variance)
+        self.volatility = np.append(self.volatility, self._volatility(exposure, specific_variance))
+        self.correlation = np.pad(self.correlation, ((0, 1), (0, 1)))
+        self.correlation[n, n] = 1.0
+        # The new basis vector is the base's new last column; earlier steps pass its coordinate through
+        self.base = np.pad(self.base, ((0, 1), (0, 1)))
+        self.base[-1, -1] = 1.0
+        values = np.append(self.values, 1.0)
+        order = np.argsort(values, kind='stable')
+        self.values, self.steps = values[order], self.steps + [(n + 1, None, None, order)]
+        row = self._row(exposure, self.volatility[n])
+        row[n] = 1.0
+        self._set_row(n, row)
+
+    def remove(self, position: int):
+        """Drop a holding: decorrelate its row, which splits off the eigenpair (1, e_position)"""
+        row = np.zeros(len(self.keys))
+        row[position] = 1.0
+        self._set_row(position, row)
+        n = len(self.keys)
+        split = int(np.abs(self.project(row)).argmax())
+        del self.keys[position]
+        self.exposures = np.delete(self.exposures, position, axis=0)
+        self.specific_variance = np.delete(self.specific_variance, position)
+        self.volatility = np.delete(self.volatility, position)
+        self.correlation = np.delete(np.delete(self.correlation, position, axis=0), position, axis=1)
+        self.base = np.delete(self.base, position, axis=0)
+        self.values = np.delete(self.values, split)
+        self.steps = self.steps + [(n, None, None, np.delete(np.arange(n), split))]
+
+    def bets(self, weights: np.ndarray) -> Dict:
+        """Diversification ratio and effective number of independent bets for weights aligned with self.keys"""
+        risk_weights = np.asarray(weights, dtype=float) * self.volatility
+        # Correlation-space variance summed over the uncorrelated principal portfolios
+        variance = float(np.maximum(self.values, 0.0) @ self.project(risk_weights) ** 2)
+        if variance <= 0:
+            return {'diversification_ratio': 0.0, 'effective_bets': 0.0}
+        ratio = risk_weights.sum() / np.sqrt(variance)
+        # The squared ratio is exactly n for n uncorrelated equal-risk holdings, 1 for a single bet
+        return {'diversification_ratio': float(ratio), 'effective_bets': float(ratio * ratio)}
+
+
+class DiversificationModel:
+    """Correlation-aware diversification over a factor risk model, one cached eigendecomposition per universe"""
+
+    def __init__(self, risk_model: FactorRiskModel, max_entries: int = DIVERSIFICATION_CACHE_ENTRIES):
+        self.risk_model = risk_model
+        self.max_entries = max_entries
+        self.rebuilds = 0
+        self.corrections = 0
+        self.average_correlation = self._average_correlation()
+        self._entries: OrderedDict = OrderedDict()  # frozenset of (symbol, sector) -> CorrelationEigen
+
+    def _average_correlation(self) -> float:
+        """Mean pairwise correlation across the model's universe, from the factor structure in O(symbols)"""
+        exposures, factor_covariance = self.risk_model.exposures, self.risk_model.factor_covariance
+        n = exposures.shape[0]
+        if n < 2:
+            return 0.0
+        factor_variance = np.asarray(exposures.multiply(exposures @ factor_covariance).sum(axis=1)).ravel()
+        inverse_volatility = 1 / np.sqrt(factor_variance + self.risk_model.specific_variance)
+        loading = exposures.T @ inverse_volatility
+        # 1' R 1 counts every pair twice plus the n unit diagonal entries
+        total = loading @ factor_covariance @ loading + self.risk_model.specific_variance @ inverse_volatility ** 2
+        return float((total - n) / (n * (n - 1)))
+
+    def _loadings(self, keys: List[Tuple[str, str]]) -> Tuple[np.ndarray, np.ndarray]:
+        symbols, sectors = zip(*keys)
+        exposures, specific_variance = self.risk_model.exposures_for(list(symbols), list(sectors))
+        return exposures.toarray(), specific_variance
+
+    def decomposition(self, keys: List[Tuple[str, str]]) -> CorrelationEigen:
+        """Cached decomposition for a universe; one holding away from the last one, it is corrected, not rebuilt"""
+        universe = frozenset(keys)
+        entry = self._entries.get(universe)
+        if entry is not None:
+            self._entries.move_to_end(universe)
+            return entry
+
+        # A correction is two secular solves of O(n^2) passes; a fresh O(n^3) eigh only clearly loses from ~750 up
+        if self._entries and len(universe) >= DIVERSIFICATION_MIN_CORRECTED_HOLDINGS:
+            last_universe, last = next(reversed(self._entries.items()))
+            added, removed = list(universe - last_universe), list(last_universe - universe)
+            if len(added) <= 1 and len(removed) <= 1:
+                entry = last.copy()
+                if added:
+                    exposures, specific_variance = self._loadings(added)
+                if added and removed:
+                    entry.replace(entry.keys.index(removed[0]), added[0], exposures[0], specific_variance[0])
+                elif added:
+                    entry.append(added[0], exposures[0], specific_variance[0])
+                else:
+                    entry.remove(entry.keys.index(removed[0]))
+                self.corrections += 1
+        if entry is None:
+            entry = CorrelationEigen(keys, *self._loadings(keys), self.risk_model.factor_covariance)
+            self.rebuilds += 1
+
+        self._entries[universe] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def score(self, symbols, weights: np.ndarray, sectors=None) -> Dict:
+        """0-10 score from the effective number of independent bets among the holdings"""
+        weights = np.asarray(weights, dtype=float)
+        sectors = sectors if sectors is not None else [None] * len(weights)
+        pairs = list(zip(symbols, sectors))
+        if len(pairs) > DIVERSIFICATION_MAX_HOLDINGS:
+            # Beyond the cap the largest holdings carry the score; the tail barely moves it
+            keep = np.sort(np.argsort(-weights, kind='stable')[:DIVERSIFICATION_MAX_HOLDINGS])
+            pairs, weights = [pairs[i] for i in keep], weights[keep]
+        if not pairs or weights.sum() <= 0:
+            return {'score': 0.0, 'diversification_ratio': 0.0, 'effective_bets': 0.0}
+
+        entry = self.decomposition(list(dict.fromkeys(pairs)))
+        positions = {key: i for i, key in enumerate(entry.keys)}
+        aligned = np.bincount([positions[pair] for pair in pairs], weights=weights, minlength=len(entry.keys))
+        bets = entry.bets(aligned / aligned.sum())
+        # 1 / bets falls towards the average correlation as holdings are added, never below it: a score of 10
+        # is as diversified as the model's universe allows, 0 a single bet
+        ceiling = 1 - self.average_correlation
+        score = 10 * (1 - 1 / bets['effective_bets']) / ceiling if bets['effective_bets'] and ceiling > 0 else 0.0
+        return {'score': float(min(10.0, max(0.0, score))), **bets}
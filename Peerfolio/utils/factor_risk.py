@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    MIN_SPECIFIC_OBSERVATIONS, PRICE_HISTORY_PATH, RISK_MODEL_HISTORY_DAYS, RISK_MODEL_PATH, TRADING_DAYS_PER_YEAR
+)
+from utils.lazy_imports import lazy_import
+
+sparse = lazy_import('scipy.sparse')  # ~100 ms to import, so deferred until a model is built
+
+MARKET_FACTOR = 'Market'
+UNMAPPED_SECTOR = 'Other'
+
+# Annualized volatilities of the synthetic sample history: market, each sector, specific (low, high)
+SAMPLE_MARKET_VOLATILITY = 0.16
+SAMPLE_SECTOR_VOLATILITY = 0.08
+SAMPLE_SPECIFIC_VOLATILITY = (0.15, 0.35)
+
+
+def sample_returns(symbols: List[str], sector_mapping: Dict, days: int = RISK_MODEL_HISTORY_DAYS,
+                   seed: int = 0) -> pd.DataFrame:
+    """Deterministic daily returns with a market + sector + specific structure"""
+    rng = np.random.default_rng(seed)
+    sector_codes, sectors = pd.factorize(np.array([sector_mapping.get(symbol, UNMAPPED_SECTOR) for symbol in symbols]))
+    daily = 1 / np.sqrt(TRADING_DAYS_PER_YEAR)
+    market = rng.normal(0.0003, SAMPLE_MARKET_VOLATILITY * daily, days)
+    sector = rng.normal(0.0, SAMPLE_SECTOR_VOLATILITY * daily, (days, len(sectors)))
+    beta = rng.uniform(0.7, 1.3, len(symbols))
+    specific_volatility = rng.uniform(*SAMPLE_SPECIFIC_VOLATILITY, len(symbols)) * daily
+    specific = rng.normal(0.0, 1.0, (days, len(symbols))) * specific_volatility
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    return pd.DataFrame(market[:, None] * beta + sector[:, sector_codes] + specific, index=dates, columns=symbols)
+
+
+def read_price_history(path: str = PRICE_HISTORY_PATH, days: int = RISK_MODEL_HISTORY_DAYS) -> pd.DataFrame:
+    """Daily returns (dates x symbols) from a long-format date, symbol, close history (Parquet or CSV)"""
+    history = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    history['date'] = pd.to_datetime(history['date'])
+    closes = history.pivot_table(index='date', columns='symbol', values='close').sort_index()
+    # Symbols that did not trade on a day keep NaN; estimation skips those days per symbol
+    return closes.pct_change(fill_method=None).iloc[1:].tail(days)
+
+
+class FactorRiskModel:
+    """Market + sector factor model: sparse exposures, a small factor covariance and specific variance"""
+
+    def __init__(self, symbols: List[str], factors: List[str], exposures: 'sparse.csr_matrix',
+                 factor_covariance: np.ndarray, specific_variance: np.ndarray):
+        self.symbols = [str(symbol) for symbol in symbols]
+        self.factors = [str(factor) for factor in factors]
+        self.exposures = sparse.csr_matrix(exposures)  # symbols x factors; a market beta plus one sector each
+        self.factor_covariance = np.asarray(factor_covariance, dtype=float)
+        self.specific_variance = np.asarray(specific_variance, dtype=float)
+        self._index = pd.Index(self.symbols)
+        self._factor_index = pd.Index(self.factors)
+        self._median_specific = float(np.median(self.specific_variance)) if len(self.specific_variance) else 0.0
+
+    @classmethod
+    def estimate(cls, returns: pd.DataFrame, sector_mapping: Dict) -> 'FactorRiskModel':
+        """Fit from daily returns (dates x symbols); NaN marks days a symbol has no return"""
+        symbols = [str(symbol) for symbol in returns.columns]
+        values = returns.to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+
+        # Market factor: equal-weighted cross-sectional mean return per day
+        counts = valid.sum(axis=1)
+        market = np.divide(filled.sum(axis=1), counts, out=np.zeros(len(counts)), where=counts > 0)
+
+        # Betas by regression on the market over each symbol's own days
+        observed = np.maximum(valid.sum(axis=0), 1)
+        market_seen = np.where(valid, market[:, None], 0.0)
+        mean_return = filled.sum(axis=0) / observed
+        mean_market = market_seen.sum(axis=0) / observed
+        covariance = (filled * market_seen).sum(axis=0) / observed - mean_return * mean_market
+        variance = (market_seen * market_seen).sum(axis=0) / observed - mean_market * mean_market
+        beta = np.divide(covariance, variance, out=np.ones(len(symbols)), where=variance > 0)
+        residual = np.where(valid, values - market[:, None] * beta, 0.0)
+
+        # Sector factors: mean market-residual return of each sector's members per day
+        sector_codes, sectors = pd.factorize(
+            np.array([sector_mapping.get(symbol, UNMAPPED_SECTOR) for symbol in symbols]), sort=True
+        )
+        membership = sparse.csr_matrix(
+            (np.ones(len(symbols)), (np.arange(len(symbols)), sector_codes)), shape=(len(symbols), len(sectors))
+        )
+        members = np.asarray(membership.T @ valid.T.astype(float)).T
+        sector_returns = np.divide(
+            np.asarray(membership.T @ residual.T).T, members, out=np.zeros_like(members), where=members > 0
+        )
+
+        specific = np.where(valid, residual - sector_returns[:, sector_codes], np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            specific_variance = np.nanvar(specific, axis=0, ddof=1) * TRADING_DAYS_PER_YEAR
+        thin = (valid.sum(axis=0) < MIN_SPECIFIC_OBSERVATIONS) | np.isnan(specific_variance)
+        if thin.any() and not thin.all():
+            specific_variance[thin] = np.median(specific_variance[~thin])
+
+        factor_returns = np.column_stack([market, sector_returns])
+        factor_covariance = np.atleast_2d(np.cov(factor_returns, rowvar=False)) * TRADING_DAYS_PER_YEAR
+
+        # Two entries per row: the market beta in column 0 and a unit loading on the symbol's sector
+        exposures = sparse.csr_matrix(
+            (np.column_stack([beta, np.ones(len(symbols))]).ravel(),
+             np.column_stack([np.zeros(len(symbols), dtype=int), sector_codes + 1]).ravel(),
+             np.arange(0, 2 * len(symbols) + 1, 2)),
+            shape=(len(symbols), len(sectors) + 1)
+        )
+        return cls(symbols, [MARKET_FACTOR] + list(sectors), exposures, factor_covariance, specific_variance)
+
+    def exposures_for(self, symbols, sectors=None) -> Tuple['sparse.csr_matrix', np.ndarray]:
+        """Exposure rows and specific variances for holdings, in holding order"""
+        rows = self._index.get_indexer(np.asarray(symbols, dtype=object))
+        known = rows >= 0
+        if known.all():
+            return self.exposures[rows], self.specific_variance[rows]
+
+        # Symbols outside the model get a unit market beta, their sector and the median specific variance
+        exposures = sparse.diags(known.astype(float)) @ self.exposures[np.where(known, rows, 0)]
+        missing = np.flatnonzero(~known)
+        sector_columns = (
+            self._factor_index.get_indexer(np.asarray(sectors, dtype=object)[missing])
+            if sectors is not None else np.full(len(missing), -1)
+        )
+        has_sector = sector_columns > 0  # Column 0 is the market, never a sector
+        proxy = sparse.csr_matrix(
+            (np.ones(len(missing) + int(has_sector.sum())),
+             (np.concatenate([missing, missing[has_sector]]),
+              np.concatenate([np.zeros(len(missing), dtype=int), sector_columns[has_sector]]))),
+            shape=exposures.shape
+        )
+        specific_variance = np.where(known, self.specific_variance[np.where(known, rows, 0)], self._median_specific)
+        return sparse.csr_matrix(exposures + proxy), specific_variance
+
+    def risk(self, symbols, weights: np.ndarray, sectors=None) -> Dict:
+        """Portfolio volatility and its split by factor and holding, in O(holdings x factors)"""
+        exposures, specific_variance = self.exposures_for(symbols, sectors)
+        weights = np.asarray(weights, dtype=float)
+
+        factor_exposure = exposures.T @ weights
+        factor_covariance_exposure = self.factor_covariance @ factor_exposure
+        factor_variance = float(factor_exposure @ factor_covariance_exposure)
+        specific_total = float((weights * weights) @ specific_variance)
+        variance = factor_variance + specific_total
+
+        # Each holding's share of variance is w * (Cov w); the two pieces never form Cov itself
+        marginal = exposures @ factor_covariance_exposure + specific_variance * weights
+        holding_variance = np.asarray(
+            exposures.multiply(exposures @ self.factor_covariance).sum(axis=1)
+        ).ravel() + specific_variance
+        with np.errstate(divide='ignore', invalid='ignore'):
+            holding_contribution = weights * marginal / variance * 100 if variance > 0 else np.zeros(len(weights))
+            factor_contribution = factor_exposure * factor_covariance_exposure / variance * 100
+
+        return {
+            'volatility': float(np.sqrt(variance) * 100),
+            'factor_volatility': float(np.sqrt(max(factor_variance, 0.0)) * 100),
+            'specific_volatility': float(np.sqrt(specific_total) * 100),
+            'factor_contributions': {
+                factor: float(share) for factor, share, exposure
+                in zip(self.factors, factor_contribution, factor_exposure) if exposure != 0
+            },
+            'specific_contribution': float(specific_total / variance * 100) if variance > 0 else 0.0,
+            'holding_volatility': np.sqrt(np.maximum(holding_variance, 0.0)) * 100,
+            'holding_contribution': holding_contribution
+        }
+
+    def covariance(self, symbols, sectors=None) -> pd.DataFrame:
+        """Dense annualized covariance among the given symbols; O(symbols^2), so only for small universes"""
+        exposures, specific_variance = self.exposures_for(symbols, sectors)
+        covariance = exposures @ (exposures @ self.factor_covariance).T + np.diag(specific_variance)
+        labels = pd.Index(np.asarray(symbols, dtype=object))
+        return pd.DataFrame(np.asarray(covariance), index=labels, columns=labels)
+
+    def nbytes(self) -> int:
+        return int(
+            self.exposures.data.nbytes + self.exposures.indices.nbytes + self.exposures.indptr.nbytes
+            + self.factor_covariance.nbytes + self.specific_variance.nbytes
+        )
+
+    def save(self, path: str = RISK_MODEL_PATH) -> str:
+        """Write the model atomically as .npz, labels included"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp.npz"
+        np.savez(
+            temp_path, data=self.exposures.data, indices=self.exposures.indices, indptr=self.exposures.indptr,
+            factor_covariance=self.factor_covariance, specific_variance=self.specific_variance,
+            meta=np.array(json.dumps({'symbols': self.symbols, 'factors': self.factors}))
+        )
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str = RISK_MODEL_PATH, sector_mapping: Optional[Dict] = None) -> 'FactorRiskModel':
+        """Saved model, else one estimated from PRICE_HISTORY_PATH, else from a sample history"""
+        sector_mapping = sector_mapping or {}
+        if os.path.exists(path):
+            with np.load(path) as data:
+                meta = json.loads(str(data['meta']))
+                exposures = sparse.csr_matrix(
+                    (data['data'], data['indices'], data['indptr']),
+                    shape=(len(meta['symbols']), len(meta['factors']))
+                )
+                return cls(meta['symbols'], meta['factors'], exposures,
+                           data['factor_covariance'], data['specific_variance'])
+        if os.path.exists(PRICE_HISTORY_PATH):
+            return cls.estimate(read_price_history(PRICE_HISTORY_PATH), sector_mapping)
+        return cls.estimate(sample_returns(list(sector_mapping), sector_mapping), sector_mapping)
+
+
+if __name__ == "__main__":
+    from utils.portfolio_analyzer import PortfolioAnalyzer
+
+    parser = argparse.ArgumentParser(description="Estimate the market + sector factor risk model")
+    parser.add_argument("--prices", default=PRICE_HISTORY_PATH,
+                        help="Long-format date,symbol,close history (Parquet or CSV)")
+    parser.add_argument("--days", type=int, default=RISK_MODEL_HISTORY_DAYS)
+    parser.add_argument("--output", default=RISK_MODEL_PATH)
+    args = parser.parse_args()
+
+    sector_mapping = PortfolioAnalyzer().sector_mapping
+    model = FactorRiskModel.estimate(read_price_history(args.prices, args.days), sector_mapping)
+    dense_bytes = len(model.symbols) ** 2 * 8
+    print(f"{len(model.symbols):,} symbols x {len(model.factors)} factors, "
+          f"{model.nbytes() / 1024:,.0f} KB vs {dense_bytes / 1024:,.0f} KB for a full covariance; "
+          f"saved to {model.save(args.output)}")
@@ -0,0 +1,171 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    DEFAULT_HOLDING_CURRENCY, EXCHANGE_SUFFIX_CURRENCIES, FX_HISTORY_DAYS, FX_RATES_PATH, FX_VOL_WINDOW_DAYS,
+    LOCATION_CURRENCIES, REPORTING_CURRENCY
+)
+
+# USD value of one unit of each currency, anchoring the sample history's latest day
+FX_ANCHOR_RATES = {
+    'USD': 1.0, 'SGD': 0.745, 'HKD': 0.128, 'CHF': 1.13, 'GBP': 1.27, 'AED': 0.2723, 'EUR': 1.08
+}
+# Annualized volatility against USD for the sample history (HKD and AED are pegged)
+FX_ANNUAL_VOLATILITY = {
+    'USD': 0.0, 'SGD': 0.05, 'HKD': 0.004, 'CHF': 0.08, 'GBP': 0.08, 'AED': 0.001, 'EUR': 0.07
+}
+
+
+class FXRateError(ValueError):
+    """Raised when a holding's currency has no FX rates"""
+
+
+class FXRateStore:
+    """Daily USD rates per currency, with cached per-day conversion vectors"""
+
+    def __init__(self, dates: np.ndarray, currencies: List[str], usd_rates: np.ndarray):
+        order = np.argsort(dates)
+        self.dates = np.asarray(dates, dtype='datetime64[D]')[order]
+        self.currencies = list(currencies)
+        self.usd_rates = np.asarray(usd_rates, dtype=float)[order]
+        self._index = pd.Index(self.currencies)
+        # (day row, reporting currency) -> factors / covariance; rows are few, so the caches stay small
+        self._factors: Dict = {}
+        self._covariances: Dict = {}
+
+    @classmethod
+    def sample(cls, end: Optional[pd.Timestamp] = None, days: int = FX_HISTORY_DAYS, seed: int = 0) -> 'FXRateStore':
+        """Deterministic random-walk history ending at FX_ANCHOR_RATES"""
+        end = pd.Timestamp(end or pd.Timestamp.today()).normalize()
+        dates = pd.date_range(end=end, periods=days, freq='D').to_numpy('datetime64[D]')
+        currencies = list(FX_ANCHOR_RATES)
+        daily_vol = np.array([FX_ANNUAL_VOLATILITY[c] for c in currencies]) / np.sqrt(365)
+        steps = np.random.default_rng(seed).normal(0.0, 1.0, (days - 1, len(currencies))) * daily_vol
+        # Walk backwards from the anchors so the latest row equals today's reference rates
+        log_path = np.vstack([np.zeros(len(currencies)), np.cumsum(steps, axis=0)])[::-1]
+        rates = np.array([FX_ANCHOR_RATES[c] for c in currencies]) * np.exp(log_path - log_path[-1])
+        return cls(dates, currencies, rates)
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'FXRateStore':
+        """Long-format history with columns date, currency, usd_rate; gaps are forward-filled"""
+        history = pd.read_csv(path, parse_dates=['date'])
+        wide = history.pivot_table(index='date', columns='currency', values='usd_rate').sort_index().ffill().bfill()
+        wide['USD'] = 1.0
+        return cls(wide.index.to_numpy('datetime64[D]'), wide.columns.tolist(), wide.to_numpy())
+
+    @classmethod
+    def load(cls, path: str = FX_RATES_PATH) -> 'FXRateStore':
+        return cls.from_csv(path) if os.path.exists(path) else cls.sample()
+
+    def codes(self, currencies) -> np.ndarray:
+        """Column index per currency code, resolved in one hash lookup over the array"""
+        codes = self._index.get_indexer(np.asarray(currencies, dtype=object))
+        if (codes < 0).any():
+            unknown = sorted(set(np.asarray(currencies, dtype=object)[codes < 0]))
+            raise FXRateError(f"No FX rates for: {', '.join(map(str, unknown))}")
+        return codes
+
+    def _row(self, as_of=None) -> int:
+        if as_of is None:
+            return len(self.dates) - 1
+        day = np.datetime64(pd.Timestamp(as_of).date(), 'D')
+        return max(int(np.searchsorted(self.dates, day, side='right')) - 1, 0)
+
+    def factors(self, reporting: str, as_of=None) -> np.ndarray:
+        """Reporting-currency value of one unit of every currency on a day (cached per day)"""
+        key = (self._row(as_of), reporting)
+        factors = self._factors.get(key)
+        if factors is None:
+            row = self.usd_rates[key[0]]
+            factors = row / row[self.codes([reporting])[0]]
+            factors.flags.writeable = False
+            self._factors[key] = factors
+        return factors
+
+    def convert(self, currencies, reporting: str, as_of=None) -> np.ndarray:
+        """Per-holding conversion factors: one gather from the cached vector, no per-row lookups"""
+        return self.factors(reporting, as_of)[self.codes(currencies)]
+
+    def convert_at(self, currencies, reporting: str, dates, as_of=None) -> np.ndarray:
+        """Factors on each holding's own date (e.g. purchase); undated holdings use as_of"""
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        rows = np.searchsorted(self.dates, dates, side='right') - 1
+        rows = np.where(np.isnat(dates), self._row(as_of), np.clip(rows, 0, None))
+        rates = self.usd_rates[rows]
+        return rates[np.arange(len(rows)), self.codes(currencies)] / rates[:, self.codes([reporting])[0]]
+
+    def covariance(self, reporting: str, as_of=None, window: int = FX_VOL_WINDOW_DAYS) -> np.ndarray:
+        """Annualized covariance of daily log returns of every currency against the reporting currency"""
+        key = (self._row(as_of), reporting, window)
+        covariance = self._covariances.get(key)
+        if covariance is None:
+            end = key[0] + 1
+            rates = self.usd_rates[max(end - window - 1, 0):end]
+            cross = np.log(rates / rates[:, [self.codes([reporting])[0]]])
+            returns = np.diff(cross, axis=0)
+            if len(returns) > 1:
+                covariance = np.cov(returns, rowvar=False) * 365  # Sample history is calendar-daily
+            else:
+                covariance = np.zeros((len(self.currencies), len(self.currencies)))
+            covariance.flags.writeable = False
+            self._covariances[key] = covariance
+        return covariance
+
+    def currency_risk(self, currencies, market_values: np.ndarray, reporting: str, as_of=None) -> Dict:
+        """Exposure by currency and the annualized FX volatility it adds in the reporting currency"""
+        codes = self.codes(currencies)
+        exposure = np.bincount(codes, weights=market_values, minlength=len(self.currencies))
+        total = exposure.sum()
+        weights = exposure / total if total else exposure
+        covariance = self.covariance(reporting, as_of)
+        held = exposure > 0
+        variance = weights[held] @ covariance[np.ix_(held, held)] @ weights[held]
+        return {
+            'currency_exposure': {
+                currency: float(value) for currency, value in zip(self.currencies, exposure) if value > 0
+            },
+            'foreign_currency_weight': float(1 - weights[self._index.get_loc(reporting)] if total else 0.0),
+            'fx_volatility': float(np.sqrt(max(variance, 0.0)) * 100)
+        }
+
+
+def holding_currencies(portfolio_df: pd.DataFrame) -> np.ndarray:
+    """Currency per holding: the Currency column, else the exchange suffix, else the default"""
+    symbols = portfolio_df['Symbol'].to_numpy(dtype=str)
+    currencies = np.full(len(symbols), DEFAULT_HOLDING_CURRENCY, dtype=object)
+    for suffix, currency in EXCHANGE_SUFFIX_CURRENCIES.items():
+        currencies[np.char.endswith(symbols, suffix)] = currency
+    if 'Currency' in portfolio_df.columns:
+        given = portfolio_df['Currency'].astype('string').str.strip().str.upper()
+        given = given.where(given != '')
+        currencies = np.where(given.notna().to_numpy(), given.to_numpy(dtype=object), currencies)
+    return currencies
+
+
+def conversion_rates(portfolio_df: pd.DataFrame, reporting: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Currency per row with current and purchase-date factors into the reporting currency"""
+    currencies = holding_currencies(portfolio_df)
+    fx_rates = FX_RATES.convert(currencies, reporting)
+    if 'Purchase_Date' in portfolio_df.columns:
+        purchase_dates = pd.to_datetime(portfolio_df['Purchase_Date'], errors='coerce').to_numpy('datetime64[D]')
+        purchase_fx_rates = FX_RATES.convert_at(currencies, reporting, purchase_dates)
+    else:
+        # Undated holdings are carried at today's rate, so they show no FX P&L
+        purchase_fx_rates = fx_rates
+    return currencies, fx_rates, purchase_fx_rates
+
+
+def reporting_currency(user_profile: Dict) -> str:
+    return user_profile.get('reporting_currency') or REPORTING_CURRENCY
+
+
+def location_currency(location: str) -> str:
+    """Home currency of a client location, the sidebar's default reporting currency"""
+    return LOCATION_CURRENCIES.get(location, REPORTING_CURRENCY)
+
+
+FX_RATES = FXRateStore.load()
@@ -0,0 +1,325 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import time
+from typing import AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    LIVE_FRAME_RATE, LIVE_REPLAY_PATH, LIVE_SOCKET_ADDRESS, LIVE_TICK_RATE, LIVE_YIELD_EVERY, REPORTING_CURRENCY
+)
+from utils.fx import conversion_rates
+from utils.recommendation_rules import diversification_score_from_herfindahl
+
+
+class Tick(NamedTuple):
+    symbol: str
+    price: float
+    timestamp: float = 0.0
+
+
+# Feed name -> factory(**options) returning an async iterator of Ticks
+TICK_FEEDS: Dict[str, Callable[..., AsyncIterator[Tick]]] = {}
+
+
+def tick_feed(name: str):
+    """Register a price tick source for live valuation"""
+    def register(factory: Callable) -> Callable:
+        TICK_FEEDS[name] = factory
+        return factory
+    return register
+
+
+def parse_tick(line: str) -> Optional[Tick]:
+    """'SYMBOL,PRICE[,TIMESTAMP]' or a JSON object with symbol / price / timestamp"""
+    line = line.strip()
+    if not line or line.startswith('symbol'):
+        return None
+    if line.startswith('{'):
+        record = json.loads(line)
+        return Tick(record['symbol'], float(record['price']), float(record.get('timestamp', 0.0)))
+    fields = line.split(',')
+    return Tick(fields[0], float(fields[1]), float(fields[2]) if len(fields) > 2 else 0.0)
+
+
+@tick_feed('simulated')
+async def simulated_feed(prices: Dict[str, float], rate: int = LIVE_TICK_RATE,
+                         volatility: float = 0.0005, seed: Optional[int] = None) -> AsyncIterator[Tick]:
+    """Random-walk ticks over the given symbols at roughly `rate` ticks per second"""
+    rng = random.Random(seed)
+    symbols = list(prices)
+    current = dict(prices)
+    batch = max(1, rate // 100)  # Ticks per 10 ms slice
+    while True:
+        for _ in range(batch):
+            symbol = rng.choice(symbols)
+            current[symbol] *= 1 + rng.gauss(0, volatility)
+            yield Tick(symbol, current[symbol], time.time())
+        await asyncio.sleep(0.01)
+
+
+@tick_feed('replay')
+async def replay_feed(path: str = LIVE_REPLAY_PATH, speed: float = 0.0) -> AsyncIterator[Tick]:
+    """Ticks from a recorded file; speed 0 replays as fast as possible, 1 in real time"""
+    first_timestamp = started = None
+    with open(path) as f:
+        for line in f:
+            tick = parse_tick(line)
+            if tick is None:
+                continue
+            if speed > 0 and tick.timestamp:
+                if first_timestamp is None:
+                    first_timestamp, started = tick.timestamp, time.perf_counter()
+                delay = (tick.timestamp - first_timestamp) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield tick
+
+
+@tick_feed('socket')
+async def socket_feed(address: str = LIVE_SOCKET_ADDRESS) -> AsyncIterator[Tick]:
+    """Newline-delimited ticks from a TCP server (see --serve for a local stand-in)"""
+    host, port = address.rsplit(':', 1)
+    reader, writer = await asyncio.open_connection(host, int(port))
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            tick = parse_tick(line.decode())
+            if tick is not None:
+                yield tick
+    finally:
+        writer.close()
+
+
+class LivePortfolio:
+    """Running valuation of one portfolio; each tick updates it in O(1)"""
+
+    def __init__(self, portfolio_id: str, portfolio_df: pd.DataFrame, sector_mapping: Optional[Dict] = None,
+                 reporting: str = REPORTING_CURRENCY):
+        self.portfolio_id = portfolio_id
+        self.reporting_currency = reporting
+        # Ticks quote local prices; values and cost are in the reporting currency, as in the analysis totals
+        _, fx_rates, purchase_fx_rates = conversion_rates(portfolio_df, reporting)
+        # One slot per symbol: duplicate rows (tax lots) are summed
+        positions = portfolio_df.assign(
+            Cost_Basis=portfolio_df['Shares'].to_numpy(dtype=float)
+                       * portfolio_df['Purchase_Price'].to_numpy(dtype=float) * purchase_fx_rates,
+            FX_Rate=fx_rates
+        ).groupby('Symbol', sort=False).agg(
+            Shares=('Shares', 'sum'), Cost_Basis=('Cost_Basis', 'sum'), Current_Price=('Current_Price', 'last'),
+            FX_Rate=('FX_Rate', 'last')
+        )
+        self.symbols: List[str] = positions.index.tolist()
+        self.shares: List[float] = positions['Shares'].astype(float).tolist()
+        self.cost_basis: List[float] = positions['Cost_Basis'].astype(float).tolist()
+        self.prices: List[float] = positions['Current_Price'].astype(float).tolist()
+        self.fx_rates: List[float] = positions['FX_Rate'].astype(float).tolist()
+        self.market_values = [
+            shares * price * fx_rate for shares, price, fx_rate in zip(self.shares, self.prices, self.fx_rates)
+        ]
+
+        sector_mapping = sector_mapping or {}
+        sectors = [sector_mapping.get(symbol, 'Other') for symbol in self.symbols]
+        self.sector_names = list(dict.fromkeys(sectors))
+        self.sector_of = [self.sector_names.index(sector) for sector in sectors]
+        self.sector_values = [0.0] * len(self.sector_names)
+        for i, value in enumerate(self.market_values):
+            self.sector_values[self.sector_of[i]] += value
+
+        self.total_value = sum(self.market_values)
+        self.total_cost = sum(self.cost_basis)
+        # Sum of squared sector values; HHI = sector_sq / total_value ** 2
+        self.sector_sq = sum(value * value for value in self.sector_values)
+        self.ticks = 0
+
+    def apply(self, i: int, price: float):
+        """Reprice holding i (local price) and patch the totals and sector HHI by the change alone"""
+        value = self.shares[i] * price * self.fx_rates[i]
+        delta = value - self.market_values[i]
+        self.prices[i] = price
+        self.market_values[i] = value
+        sector = self.sector_of[i]
+        old = self.sector_values[sector]
+        new = old + delta
+        self.sector_values[sector] = new
+        self.sector_sq += new * new - old * old
+        self.total_value += delta
+        self.ticks += 1
+
+    @property
+    def herfindahl(self) -> float:
+        return self.sector_sq / (self.total_value * self.total_value) if self.total_value else 0.0
+
+    def snapshot(self, include_holdings: bool = False) -> Dict:
+        """Totals, plus per-holding values on request; weights are derived per frame, not per tick"""
+        total_pnl = self.total_value - self.total_cost
+        snapshot = {
+            'portfolio_id': self.portfolio_id,
+            'total_value': self.total_value,
+            'total_pl': total_pnl,
+            'total_return': total_pnl / self.total_cost * 100 if self.total_cost else 0.0,
+            'herfindahl': self.herfindahl,
+            'diversification_score': diversification_score_from_herfindahl(
+                self.herfindahl, sum(value > 0 for value in self.sector_values)
+            ),
+            'ticks': self.ticks
+        }
+        if include_holdings:
+            market_values = np.array(self.market_values)
+            cost_basis = np.array(self.cost_basis)
+            pnl = market_values - cost_basis
+            with np.errstate(divide='ignore', invalid='ignore'):
+                weights = market_values / self.total_value * 100
+                returns = pnl / cost_basis * 100
+            snapshot['holdings'] = pd.DataFrame({
+                'Symbol': self.symbols,
+                'Current_Price': self.prices,
+                'Market_Value': market_values,
+                'P&L': pnl,
+                'Return_%': returns,
+                'Weight_%': weights
+            })
+        return snapshot
+
+
+class LiveValuationEngine:
+    """Routes ticks to every holding of the symbol and publishes coalesced frames"""
+
+    def __init__(self, sector_mapping: Optional[Dict] = None, reporting: str = REPORTING_CURRENCY):
+        self.sector_mapping = sector_mapping or {}
+        self.reporting_currency = reporting
+        self.portfolios: Dict[str, LivePortfolio] = {}
+        self._subscribers: Dict[str, List[Tuple[LivePortfolio, int]]] = {}
+        self._dirty: Dict[str, LivePortfolio] = {}
+        self.ticks = 0
+        self.ignored_ticks = 0
+
+    def add_portfolio(self, portfolio_id: str, portfolio_df: pd.DataFrame) -> LivePortfolio:
+        self.remove_portfolio(portfolio_id)
+        portfolio = LivePortfolio(portfolio_id, portfolio_df, self.sector_mapping, self.reporting_currency)
+        self.portfolios[portfolio_id] = portfolio
+        for i, symbol in enumerate(portfolio.symbols):
+            self._subscribers.setdefault(symbol, []).append((portfolio, i))
+        self._dirty[portfolio_id] = portfolio
+        return portfolio
+
+    def remove_portfolio(self, portfolio_id: str):
+        portfolio = self.portfolios.pop(portfolio_id, None)
+        if portfolio is None:
+            return
+        for symbol in portfolio.symbols:
+            holders = [entry for entry in self._subscribers[symbol] if entry[0] is not portfolio]
+            if holders:
+                self._subscribers[symbol] = holders
+            else:
+                del self._subscribers[symbol]
+        self._dirty.pop(portfolio_id, None)
+
+    def apply_tick(self, tick: Tick):
+        holders = self._subscribers.get(tick.symbol)
+        if not holders or not tick.price > 0:
+            self.ignored_ticks += 1
+            return
+        for portfolio, i in holders:
+            portfolio.apply(i, tick.price)
+            self._dirty[portfolio.portfolio_id] = portfolio
+        self.ticks += 1
+
+    def drain(self, include_holdings: bool = False) -> Dict[str, Dict]:
+        """Snapshots of the portfolios changed since the last frame"""
+        dirty, self._dirty = self._dirty, {}
+        return {portfolio_id: portfolio.snapshot(include_holdings) for portfolio_id, portfolio in dirty.items()}
+
+    async def consume(self, feed: AsyncIterator[Tick]):
+        count = 0
+        async for tick in feed:
+            self.apply_tick(tick)
+            count += 1
+            if count % LIVE_YIELD_EVERY == 0:
+                # File and socket feeds can outpace the loop; let the publisher run between batches
+                await asyncio.sleep(0)
+
+    async def run(self, feed: AsyncIterator[Tick], on_frame: Callable[[Dict[str, Dict]], None],
+                  frame_rate: float = LIVE_FRAME_RATE, duration: Optional[float] = None,
+                  include_holdings: bool = False):
+        """Consume the feed and call on_frame with coalesced updates at a fixed rate"""
+        consumer = asyncio.ensure_future(self.consume(feed))
+        interval = 1.0 / frame_rate
+        deadline = None if duration is None else time.perf_counter() + duration
+        try:
+            while not consumer.done() and (deadline is None or time.perf_counter() < deadline):
+                await asyncio.wait([consumer], timeout=interval)
+                frame = self.drain(include_holdings)
+                if frame:
+                    on_frame(frame)
+        finally:
+            consumer.cancel()
+            await asyncio.gather(consumer, return_exceptions=True)
+        frame = self.drain(include_holdings)  # Final flush for a finished replay
+        if frame:
+            on_frame(frame)
+        if consumer.done() and not consumer.cancelled() and consumer.exception():
+            raise consumer.exception()
+
+
+def write_replay(path: str, prices: Dict[str, float], n_ticks: int, seed: Optional[int] = None,
+                 rate: int = LIVE_TICK_RATE):
+    """Record a simulated session to a replay file (symbol,price,timestamp)"""
+    rng = random.Random(seed)
+    symbols = list(prices)
+    current = dict(prices)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['symbol', 'price', 'timestamp'])
+        for i in range(n_ticks):
+            symbol = rng.choice(symbols)
+            current[symbol] *= 1 + rng.gauss(0, 0.0005)
+            writer.writerow([symbol, f"{current[symbol]:.4f}", f"{i / rate:.6f}"])
+
+
+async def serve_replay(path: str, address: str = LIVE_SOCKET_ADDRESS, speed: float = 1.0):
+    """Local stand-in for a market data socket: streams a replay file to every client"""
+    async def handle(reader, writer):
+        try:
+            async for tick in replay_feed(path, speed):
+                writer.write(f"{tick.symbol},{tick.price},{tick.timestamp}\n".encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    host, port = address.rsplit(':', 1)
+    server = await asyncio.start_server(handle, host, int(port))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    from utils.data_generator import STOCK_PRICES
+
+    parser = argparse.ArgumentParser(description="Record or serve price ticks for live valuation")
+    parser.add_argument("--record", type=int, metavar="N", help="Write N simulated ticks to --path")
+    parser.add_argument("--serve", action="store_true", help="Stream --path over TCP at --address")
+    parser.add_argument("--path", default=LIVE_REPLAY_PATH)
+    parser.add_argument("--address", default=LIVE_SOCKET_ADDRESS)
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed for --serve (0 = unthrottled)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.record:
+        write_replay(args.path, STOCK_PRICES, args.record, args.seed)
+        print(f"Wrote {args.record:,} ticks to {args.path}")
+    if args.serve:
+        print(f"Serving {args.path} on {args.address}")
+        asyncio.run(serve_replay(args.path, args.address, args.speed))
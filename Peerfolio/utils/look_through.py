@@ -0,0 +1,275 @@
+import argparse
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import FUND_CONSTITUENTS_DIR, LOOK_THROUGH_TOP_ISSUERS
+from utils.lazy_imports import lazy_import
+
+sparse = lazy_import('scipy.sparse')  # ~100 ms to import, so deferred until a fund is held
+
+UNMAPPED_SECTOR = 'Other'
+NEUTRAL_ESG_SCORE = 5.0
+
+# Sample constituents (weight %) per fund: each fund's largest holdings, rescaled to 100% when loaded.
+# A FUND_CONSTITUENTS_DIR/<TICKER>.csv replaces the fund's sample
+SAMPLE_FUNDS = {
+    'SPY': {
+        'MSFT': 7.1, 'AAPL': 6.9, 'NVDA': 6.5, 'AMZN': 3.8, 'META': 2.5, 'GOOGL': 2.1, 'GOOG': 1.8, 'BRK-B': 1.7,
+        'AVGO': 1.6, 'LLY': 1.4, 'JPM': 1.3, 'TSLA': 1.2, 'UNH': 1.1, 'XOM': 1.1, 'V': 1.0, 'MA': 0.9, 'PG': 0.9,
+        'JNJ': 0.9, 'HD': 0.8, 'COST': 0.8
+    },
+    'QQQ': {
+        'MSFT': 8.8, 'AAPL': 8.5, 'NVDA': 7.9, 'AMZN': 5.3, 'AVGO': 5.0, 'META': 4.9, 'TSLA': 2.6, 'GOOGL': 2.6,
+        'GOOG': 2.5, 'COST': 2.5, 'NFLX': 1.9, 'AMD': 1.6, 'ADBE': 1.5, 'PEP': 1.4
+    },
+    'ESGU': {
+        'MSFT': 6.7, 'AAPL': 6.3, 'NVDA': 6.0, 'AMZN': 3.6, 'GOOGL': 2.2, 'META': 2.1, 'GOOG': 1.9, 'AVGO': 1.5,
+        'TSLA': 1.3, 'LLY': 1.3, 'JPM': 1.2, 'UNH': 1.0, 'V': 1.0, 'HD': 0.9, 'PG': 0.9, 'MA': 0.9, 'KO': 0.8
+    },
+    'ICLN': {
+        'FSLR': 8.5, 'NEE': 7.0, 'ENPH': 5.5, 'ED': 4.5, 'BEP': 4.0, 'ORA': 3.5, 'SEDG': 2.5, 'PLUG': 2.0
+    },
+    'VNQ': {
+        'PLD': 7.5, 'AMT': 6.0, 'EQIX': 5.5, 'WELL': 4.5, 'SPG': 3.5, 'PSA': 3.0, 'O': 3.0, 'DLR': 3.0
+    }
+}
+# Sector and ESG score of sample constituents outside the analyzer's mappings
+SAMPLE_SECURITIES = {
+    'GOOG': ('Technology', 7.8), 'LLY': ('Healthcare', 7.4), 'XOM': ('Energy', 3.9),
+    'NFLX': ('Communication Services', 6.4), 'AMD': ('Technology', 7.3), 'FSLR': ('Technology', 8.4),
+    'NEE': ('Utilities', 8.1), 'ENPH': ('Technology', 7.9), 'ED': ('Utilities', 7.2), 'BEP': ('Utilities', 8.0),
+    'ORA': ('Utilities', 7.6), 'SEDG': ('Technology', 7.4), 'PLUG': ('Other', 6.8), 'PLD': ('Real Estate', 7.5),
+    'AMT': ('Real Estate', 6.9), 'EQIX': ('Real Estate', 7.7), 'WELL': ('Real Estate', 6.8),
+    'SPG': ('Real Estate', 6.2), 'PSA': ('Real Estate', 6.0), 'O': ('Real Estate', 6.3), 'DLR': ('Real Estate', 7.1)
+}
+# Share classes that roll up into one issuer; any other security is its own issuer
+ISSUERS = {'GOOGL': 'Alphabet', 'GOOG': 'Alphabet', 'BRK-B': 'Berkshire Hathaway', 'BRK-A': 'Berkshire Hathaway'}
+
+
+def read_constituents(path: str) -> pd.DataFrame:
+    """Constituent rows (symbol, weight and optional sector, issuer, esg_score) from a CSV or Parquet file"""
+    constituents = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    constituents.columns = [str(column).strip().lower() for column in constituents.columns]
+    return constituents
+
+
+class LookThrough:
+    """Fund constituents as a CSR matrix (funds x securities); a fund's file is read the first time it is held"""
+
+    def __init__(self, sector_mapping: Optional[Dict] = None, esg_scores: Optional[Dict] = None,
+                 directory: str = FUND_CONSTITUENTS_DIR, samples: Optional[Dict] = None):
+        self.sector_mapping = sector_mapping or {}
+        self.esg_scores = esg_scores or {}
+        self.samples = SAMPLE_FUNDS if samples is None else samples
+        # Only the listing is read up front; constituents load per fund on first use
+        self.files = {
+            os.path.splitext(name)[0].upper(): os.path.join(directory, name)
+            for name in (os.listdir(directory) if os.path.isdir(directory) else [])
+            if name.endswith(('.csv', '.parquet'))
+        }
+        self.funds: List[str] = []
+        self.securities: List[str] = []
+        self._fund_rows: Dict[str, int] = {}
+        self._columns: Dict[str, int] = {}
+        self._sectors: List[str] = []
+        self._issuers: List[str] = []
+        self._esg: List[float] = []
+        self._constituents: List[Tuple[np.ndarray, np.ndarray]] = []  # Per fund: security columns, weights
+        self._matrix = None
+        self._attributes = None
+        # One analyzer serves every session: loading, registering and rebuilding the views happen under one lock
+        self._lock = threading.Lock()
+
+    def is_fund(self, symbol: str) -> bool:
+        return symbol in self._fund_rows or symbol in self.files or symbol in self.samples
+
+    def _register(self, symbols, sectors=None, issuers=None, esg_scores=None) -> np.ndarray:
+        """Column per security, adding unseen ones; the analyzer's mappings win over fund-supplied attributes"""
+        columns = np.empty(len(symbols), dtype=int)
+        for i, symbol in enumerate(symbols):
+            column = self._columns.get(symbol)
+            sample_sector, sample_esg = SAMPLE_SECURITIES.get(symbol, (UNMAPPED_SECTOR, NEUTRAL_ESG_SCORE))
+            given_sector = sectors[i] if sectors is not None and pd.notna(sectors[i]) else None
+            if column is None:
+                column = self._columns[symbol] = len(self.securities)
+                self.securities.append(symbol)
+                self._sectors.append(self.sector_mapping.get(symbol) or given_sector or sample_sector)
+                self._issuers.append(
+                    issuers[i] if issuers is not None and pd.notna(issuers[i]) else ISSUERS.get(symbol, symbol)
+                )
+                given_esg = esg_scores[i] if esg_scores is not None and pd.notna(esg_scores[i]) else None
+                self._esg.append(float(self.esg_scores.get(symbol, given_esg or sample_esg)))
+                self._attributes = None
+            elif given_sector and symbol not in self.sector_mapping and self._sectors[column] == UNMAPPED_SECTOR:
+                # Held directly before any fund named its sector
+                self._sectors[column] = given_sector
+                self._attributes = None
+            columns[i] = column
+        return columns
+
+    def _load(self, fund: str) -> int:
+        """Row of a fund in the matrix, reading its constituents on first use"""
+        row = self._fund_rows.get(fund)
+        if row is not None:
+            return row
+        if fund in self.files:
+            constituents = read_constituents(self.files[fund])
+        else:
+            constituents = pd.DataFrame({
+                'symbol': list(self.samples[fund]), 'weight': list(self.samples[fund].values())
+            })
+        # Repeated symbols (e.g. several lines of one security) add up; weights are normalized to sum to 1
+        constituents = constituents.groupby('symbol', sort=False).agg(
+            {column: ('sum' if column == 'weight' else 'first') for column in constituents.columns if column != 'symbol'}
+        ).reset_index()
+        weights = constituents['weight'].to_numpy(dtype=float)
+        columns = self._register(
+            constituents['symbol'].astype(str).to_numpy(),
+            *(constituents[column].to_numpy() if column in constituents else None
+              for column in ('sector', 'issuer', 'esg_score'))
+        )
+        total = weights.sum()
+        row = self._fund_rows[fund] = len(self.funds)
+        self.funds.append(fund)
+        self._constituents.append((columns, weights / total if total else weights))
+        self._matrix = None
+        return row
+
+    @property
+    def matrix(self) -> 'sparse.csr_matrix':
+        """Funds x securities constituent weights for every fund loaded so far"""
+        with self._lock:
+            return self._build_matrix()
+
+    def _build_matrix(self) -> 'sparse.csr_matrix':
+        if self._matrix is None or self._matrix.shape != (len(self.funds), len(self.securities)):
+            lengths = [len(columns) for columns, _ in self._constituents]
+            self._matrix = sparse.csr_matrix(
+                (np.concatenate([weights for _, weights in self._constituents] or [np.empty(0)]),
+                 np.concatenate([columns for columns, _ in self._constituents] or [np.empty(0, dtype=int)]),
+                 np.concatenate([[0], np.cumsum(lengths, dtype=int)])),
+                shape=(len(self.funds), len(self.securities))
+            )
+        return self._matrix
+
+    def symbol_matrix(self, symbols) -> 'sparse.csr_matrix':
+        """Symbols x securities: a fund's constituent weights, or a unit entry for a directly held security"""
+        return self._resolve(symbols)[0]
+
+    def _resolve(self, symbols) -> Tuple['sparse.csr_matrix', Tuple]:
+        """symbol_matrix and the attributes of exactly the securities it spans, taken together under the lock"""
+        symbols = [str(symbol) for symbol in symbols]
+        with self._lock:
+            fund = np.array([self.is_fund(symbol) for symbol in symbols], dtype=bool)
+            fund_rows = np.array([self._load(symbol) for symbol in np.asarray(symbols, dtype=object)[fund]],
+                                 dtype=int)
+            direct = self._register(np.asarray(symbols, dtype=object)[~fund])
+            matrix, attributes = self._build_matrix(), self._build_attributes()
+        n_securities = len(attributes[4])
+        stacked = sparse.vstack([
+            matrix[fund_rows],
+            sparse.csr_matrix(
+                (np.ones(len(direct)), (np.arange(len(direct)), direct)), shape=(len(direct), n_securities)
+            )
+        ], format='csr')
+        # Back to symbol order: funds were stacked first, direct holdings after them
+        position = np.empty(len(symbols), dtype=int)
+        position[fund] = np.arange(len(fund_rows))
+        position[~fund] = len(fund_rows) + np.arange(len(direct))
+        return stacked[position], attributes
+
+    def attributes(self) -> Tuple[List[str], 'sparse.csr_matrix', List[str], 'sparse.csr_matrix', np.ndarray]:
+        """(sectors, securities x sectors, issuers, securities x issuers, ESG per security), cached until one is added"""
+        with self._lock:
+            return self._build_attributes()
+
+    def _build_attributes(self) -> Tuple:
+        if self._attributes is None or self._attributes[4].shape[0] != len(self.securities):
+            n = len(self.securities)
+            onehots = []
+            for labels in (self._sectors, self._issuers):
+                codes, names = pd.factorize(np.asarray(labels, dtype=object), sort=True)
+                onehots.append((list(names), sparse.csr_matrix(
+                    (np.ones(n), (np.arange(n), codes)), shape=(n, len(names))
+                )))
+            (sectors, by_sector), (issuers, by_issuer) = onehots
+            self._attributes = (sectors, by_sector, issuers, by_issuer, np.asarray(self._esg, dtype=float))
+        return self._attributes
+
+    def security_values(self, symbols, market_values: np.ndarray) -> np.ndarray:
+        """Value held in each underlying security, funds replaced by their constituents: one sparse product"""
+        return self._security_values(symbols, market_values)[0]
+
+    def _security_values(self, symbols, market_values: np.ndarray) -> Tuple[np.ndarray, Tuple]:
+        codes, distinct = pd.factorize(np.asarray(symbols, dtype=object))
+        by_symbol = np.bincount(codes, weights=np.asarray(market_values, dtype=float), minlength=len(distinct))
+        by_security, attributes = self._resolve(distinct)
+        return by_security.T @ by_symbol, attributes
+
+    def exposures(self, symbols, market_values: np.ndarray, top_issuers: int = LOOK_THROUGH_TOP_ISSUERS) -> Dict:
+        """Effective sector allocation, ESG score and largest issuers of one portfolio, through its funds"""
+        market_values = np.asarray(market_values, dtype=float)
+        fund = np.array([self.is_fund(str(symbol)) for symbol in symbols], dtype=bool)
+        # Attributes come with the values: another session may add securities in between
+        values, (sectors, by_sector, issuers, by_issuer, esg) = self._security_values(symbols, market_values)
+        sector_values = by_sector.T @ values
+        issuer_values = by_issuer.T @ values
+        total = values.sum()
+        largest = np.argsort(-issuer_values, kind='stable')[:top_issuers]
+        return {
+            'sector_allocation': {
+                sector: float(value) for sector, value in zip(sectors, sector_values) if value != 0
+            },
+            'esg_score': float(values @ esg / total) if total else NEUTRAL_ESG_SCORE,
+            'issuer_exposure': {
+                issuers[i]: float(issuer_values[i]) for i in largest if issuer_values[i] != 0
+            },
+            'fund_value': float(market_values[fund].sum()),
+            'funds': sorted({str(symbol) for symbol in np.asarray(symbols, dtype=object)[fund]})
+        }
+
+    def book_security_values(self, holdings: pd.DataFrame) -> Tuple[np.ndarray, 'sparse.csr_matrix']:
+        """(portfolio ids, portfolios x securities values) for long-format portfolio_id, Symbol, Shares,
+        Current_Price rows; the whole book is one sparse matrix product"""
+        return self._book_security_values(holdings)[:2]
+
+    def _book_security_values(self, holdings: pd.DataFrame) -> Tuple[np.ndarray, 'sparse.csr_matrix', Tuple]:
+        codes, ids = pd.factorize(holdings['portfolio_id'], sort=True)
+        symbol_codes, symbols = pd.factorize(holdings['Symbol'])
+        market_values = holdings['Shares'].to_numpy(dtype=float) * holdings['Current_Price'].to_numpy(dtype=float)
+        # Duplicate (portfolio, symbol) rows such as tax lots add up on conversion
+        positions = sparse.csr_matrix((market_values, (codes, symbol_codes)), shape=(len(ids), len(symbols)))
+        by_security, attributes = self._resolve(symbols)
+        return np.asarray(ids), sparse.csr_matrix(positions @ by_security), attributes
+
+    def book_exposures(self, holdings: pd.DataFrame) -> pd.DataFrame:
+        """Effective sector values and ESG score per portfolio for a whole book, indexed by portfolio id"""
+        ids, values, (sectors, by_sector, _, _, esg) = self._book_security_values(holdings)
+        totals = np.asarray(values.sum(axis=1)).ravel()
+        exposures = pd.DataFrame((values @ by_sector).toarray(), index=pd.Index(ids, name='portfolio_id'),
+                                 columns=sectors)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            exposures['esg_score'] = np.where(totals > 0, values @ esg / totals, NEUTRAL_ESG_SCORE)
+        return exposures
+
+
+if __name__ == "__main__":
+    from utils.portfolio_analyzer import PortfolioAnalyzer
+
+    parser = argparse.ArgumentParser(description="Look through the funds held across a load-test book")
+    parser.add_argument("--book", default=os.path.join("data", "load_test"), help="Directory with holdings.parquet")
+    args = parser.parse_args()
+
+    analyzer = PortfolioAnalyzer()
+    holdings = pd.read_parquet(os.path.join(args.book, "holdings.parquet"))
+    exposures = analyzer.look_through.book_exposures(holdings)
+    funds = analyzer.look_through.funds
+    print(f"{len(exposures):,} portfolios, {len(funds)} funds held ({', '.join(funds) or 'none'}), "
+          f"{len(analyzer.look_through.securities):,} underlying securities")
+    sector_share = exposures.drop(columns='esg_score').sum() / exposures.drop(columns='esg_score').to_numpy().sum()
+    print((sector_share * 100).sort_values(ascending=False).round(2).to_string())
+    print(exposures['esg_score'].describe(percentiles=[0.05, 0.5, 0.95]).round(2).to_string())
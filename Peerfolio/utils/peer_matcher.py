@@ -1,42 +1,206 @@
 import pandas as pd
 import numpy as np
 from typing import Dict, List
+import bisect
 import random
+from operator import itemgetter
+
+from config.settings import (
+    BACKTEST_REBALANCE_DAYS, NET_WORTH_RANGES, PEER_AGE_BANDS, PEER_ALLOCATION_TILT, PEER_RISK_VOLATILITY_BANDS,
+    STRATEGY_REBALANCE_DAYS
+)
+from utils.backtester import Backtester
+from utils.peer_cube import PeerCube
+from utils.peer_store import PeerStore
+from utils.quantile_sketch import CohortSketches
+from utils.tracing import traced
+
+PEER_LOCATIONS = ["Singapore", "Hong Kong", "Switzerland", "New York", "London", "Dubai"]
+PEER_STRATEGIES = [
+    "Growth-Focused Tech", "Diversified Blue-Chip", "ESG-Sustainable", 
+    "Crypto-Enhanced", "Dividend Income", "Emerging Markets",
+    "Real Estate Heavy", "Index Fund Core", "Active Trading"
+]
+INVESTMENT_STYLES = [
+    "Conservative", "Moderate", "Aggressive", 
+    "Crypto-focused", "ESG-focused", "Tech-focused"
+]
+RISK_LEVELS = ["Low", "Moderate", "High"]
+COHORT_DIMENSIONS = ['location', 'age_band', 'net_worth']
+LEADERBOARD_DIMENSIONS = ['strategy', 'location']
+
+AGE_BAND_LABELS = (
+    [f"<{PEER_AGE_BANDS[0]}"]
+    + [f"{low}-{high - 1}" for low, high in zip(PEER_AGE_BANDS, PEER_AGE_BANDS[1:])]
+    + [f"{PEER_AGE_BANDS[-1]}+"]
+)
+
+def age_band(age: int) -> str:
+    """Cohort age band label, e.g. '35-44' or '55+'"""
+    return AGE_BAND_LABELS[bisect.bisect_right(PEER_AGE_BANDS, age)]
+
+def new_peer_cube() -> PeerCube:
+    """Empty cohort cube over every peer dimension the insights pages slice by"""
+    return PeerCube({
+        'location': PEER_LOCATIONS,
+        'age_band': AGE_BAND_LABELS,
+        'net_worth': NET_WORTH_RANGES,
+        'investment_style': INVESTMENT_STYLES,
+        'strategy': PEER_STRATEGIES
+    })
+
+# Label of a peer record per indexed dimension
+PEER_DIMENSIONS = {
+    'location': itemgetter('location'),
+    'age_band': lambda peer: age_band(peer['age']),
+    'net_worth': itemgetter('net_worth'),
+    'investment_style': itemgetter('investment_style'),
+    'strategy': itemgetter('strategy'),
+    'risk_level': itemgetter('risk_level')
+}
+
+def new_peer_store(peers: List[Dict]) -> PeerStore:
+    """Versioned peer store with category indexes, the cohort cube and sketches, and return leaderboards"""
+    return PeerStore(peers, PEER_DIMENSIONS, new_peer_cube(), COHORT_DIMENSIONS, LEADERBOARD_DIMENSIONS)
+
+def cohort_frame(peers) -> pd.DataFrame:
+    """Peers (records or a DataFrame) with their age band, ready for PeerCube.add"""
+    frame = peers if isinstance(peers, pd.DataFrame) else pd.DataFrame.from_records(peers)
+    bands = np.searchsorted(PEER_AGE_BANDS, frame['age'].to_numpy(), side='right')
+    return frame.assign(age_band=np.asarray(AGE_BAND_LABELS)[bands])
+
+def strategy_allocation(strategy: str) -> Dict[str, float]:
+    """Model sector allocation (%) for a peer strategy"""
+    if "Tech" in strategy:
+        return {
+            "Technology": 45,
+            "Healthcare": 20,
+            "Financial Services": 15,
+            "Consumer": 10,
+            "Real Estate": 5,
+            "Other": 5
+        }
+    elif "ESG" in strategy:
+        return {
+            "Technology": 25,
+            "Healthcare": 20,
+            "Renewable Energy": 25,
+            "Financial Services": 15,
+            "Consumer": 10,
+            "Other": 5
+        }
+    elif "Crypto" in strategy:
+        return {
+            "Cryptocurrency": 30,
+            "Technology": 25,
+            "Financial Services": 20,
+            "Healthcare": 15,
+            "Other": 10
+        }
+    elif "Real Estate" in strategy:
+        return {
+            "Real Estate": 40,
+            "Financial Services": 25,
+            "Technology": 15,
+            "Healthcare": 10,
+            "Consumer": 5,
+            "Other": 5
+        }
+    elif "Dividend" in strategy:
+        return {
+            "Financial Services": 30,
+            "Utilities": 25,
+            "Consumer Staples": 20,
+            "Healthcare": 15,
+            "Technology": 5,
+            "Other": 5
+        }
+    else:  # Diversified
+        return {
+            "Technology": 25,
+            "Healthcare": 20,
+            "Financial Services": 20,
+            "Consumer": 15,
+            "Real Estate": 10,
+            "Other": 10
+        }
+
+# Every sleeve any template uses, and the template weights (%) per strategy in PEER_STRATEGIES order
+ALLOCATION_SLEEVES = sorted({sleeve for strategy in PEER_STRATEGIES for sleeve in strategy_allocation(strategy)})
+STRATEGY_WEIGHTS = np.array([
+    [strategy_allocation(strategy).get(sleeve, 0.0) for sleeve in ALLOCATION_SLEEVES]
+    for strategy in PEER_STRATEGIES
+])
+
+def strategy_rebalance_days(strategies) -> np.ndarray:
+    """Trading days between rebalances for each strategy"""
+    return np.array([STRATEGY_REBALANCE_DAYS.get(strategy, BACKTEST_REBALANCE_DAYS) for strategy in strategies])
+
+def peer_allocations(strategy_idx: np.ndarray, rng) -> np.ndarray:
+    """Sleeve weights (%) per peer: the strategy template tilted log-normally, so peers on one strategy differ"""
+    tilted = STRATEGY_WEIGHTS[strategy_idx] * rng.lognormal(
+        0.0, PEER_ALLOCATION_TILT, (len(strategy_idx), len(ALLOCATION_SLEEVES))
+    )
+    return np.round(tilted / tilted.sum(axis=1, keepdims=True) * 100, 1)
+
+def backtest_peers(backtester: Backtester, strategy_idx: np.ndarray, weights: np.ndarray) -> pd.DataFrame:
+    """Backtested return, volatility and drawdown per peer allocation, with the risk level they imply"""
+    results = backtester.run(
+        weights, ALLOCATION_SLEEVES, strategy_rebalance_days(np.asarray(PEER_STRATEGIES)[strategy_idx])
+    )
+    results['risk_level'] = np.asarray(RISK_LEVELS)[
+        np.searchsorted(PEER_RISK_VOLATILITY_BANDS, results['volatility'].to_numpy(), side='right')
+    ]
+    return results
+
 
 class PeerMatcher:
     """AI-powered peer matching system for HNWIs"""
     
     def __init__(self):
-        # Sample peer database (in production, this would be from a secure database)
-        self.peer_database = self._generate_peer_database()
+        # Strategy and peer returns are backtested over the sector history, not drawn at random
+        self.backtester = Backtester.load()
+        self.strategy_backtests = self.backtester.run_allocations(
+            [strategy_allocation(strategy) for strategy in PEER_STRATEGIES],
+            strategy_rebalance_days(PEER_STRATEGIES), index=PEER_STRATEGIES
+        )
+        # Sample peer database (in production, this would be from a secure database); every change publishes
+        # a new version with its indexes, sketches, cohort cube and leaderboards updated per changed peer
+        self.peer_store = new_peer_store(self._generate_peer_database())
+    
+    @property
+    def peer_database(self) -> List[Dict]:
+        return self.peer_store.current.peers
+    
+    @property
+    def performance_sketches(self) -> CohortSketches:
+        """Return distribution per location x age band x net worth slice of the latest version"""
+        return self.peer_store.current.sketches
+    
+    @property
+    def cohort_cube(self) -> PeerCube:
+        """Count / sum / sum-of-squares per cohort cell of the latest version"""
+        return self.peer_store.current.cube
+    
+    def add_peers(self, peers: List[Dict]):
+        """Append peers and refresh the sketches and cohort cube incrementally"""
+        self.peer_store.append(peers)
+    
+    def apply_peer_changes(self, append: List[Dict] = (), update: List[Dict] = (), delete: List[str] = ()):
+        """Daily delta of joining, rebalanced and departing peers, at a cost proportional to the changes"""
+        return self.peer_store.apply(append=append, update=update, delete=delete)
     
     def _generate_peer_database(self) -> List[Dict]:
         """Generate sample peer data for demonstration"""
-        locations = ["Singapore", "Hong Kong", "Switzerland", "New York", "London", "Dubai"]
-        strategies = [
-            "Growth-Focused Tech", "Diversified Blue-Chip", "ESG-Sustainable", 
-            "Crypto-Enhanced", "Dividend Income", "Emerging Markets",
-            "Real Estate Heavy", "Index Fund Core", "Active Trading"
-        ]
-        sectors = ["Technology", "Healthcare", "Financial Services", "Real Estate", "Energy", "Consumer"]
-        
         peers = []
         for i in range(500):  # Generate 500 sample peers
             age = random.randint(25, 65)
-            location = random.choice(locations)
+            location = random.choice(PEER_LOCATIONS)
             
             # Generate net worth based on realistic distributions
-            net_worth_ranges = [
-                "$1M - $2.5M", "$2.5M - $5M", "$5M - $10M", 
-                "$10M - $25M", "$25M+"
-            ]
-            net_worth = random.choice(net_worth_ranges)
-            
-            strategy = random.choice(strategies)
-            performance = np.random.normal(8.5, 12.0)  # Average 8.5% with volatility
+            net_worth = random.choice(NET_WORTH_RANGES)
             
-            # Generate realistic portfolio allocation
-            allocation = self._generate_allocation(strategy)
+            strategy = random.choice(PEER_STRATEGIES)
             
             peer = {
                 'id': f"peer_{i:03d}",
@@ -44,76 +208,32 @@ class PeerMatcher:
                 'location': location,
                 'net_worth': net_worth,
                 'strategy': strategy,
-                'performance': performance,
-                'top_sector': max(allocation, key=allocation.get),
-                'risk_level': random.choice(["Low", "Moderate", "High"]),
-                'allocation': allocation,
                 'years_experience': random.randint(1, 20),
-                'investment_style': random.choice([
-                    "Conservative", "Moderate", "Aggressive", 
-                    "Crypto-focused", "ESG-focused", "Tech-focused"
-                ])
+                'investment_style': random.choice(INVESTMENT_STYLES)
             }
             peers.append(peer)
         
-        return peers
-    
-    def _generate_allocation(self, strategy: str) -> Dict[str, float]:
-        """Generate portfolio allocation based on strategy"""
-        if "Tech" in strategy:
-            return {
-                "Technology": 45,
-                "Healthcare": 20,
-                "Financial Services": 15,
-                "Consumer": 10,
-                "Real Estate": 5,
-                "Other": 5
-            }
-        elif "ESG" in strategy:
-            return {
-                "Technology": 25,
-                "Healthcare": 20,
-                "Renewable Energy": 25,
-                "Financial Services": 15,
-                "Consumer": 10,
-                "Other": 5
-            }
-        elif "Crypto" in strategy:
-            return {
-                "Cryptocurrency": 30,
-                "Technology": 25,
-                "Financial Services": 20,
-                "Healthcare": 15,
-                "Other": 10
-            }
-        elif "Real Estate" in strategy:
-            return {
-                "Real Estate": 40,
-                "Financial Services": 25,
-                "Technology": 15,
-                "Healthcare": 10,
-                "Consumer": 5,
-                "Other": 5
-            }
-        elif "Dividend" in strategy:
-            return {
-                "Financial Services": 30,
-                "Utilities": 25,
-                "Consumer Staples": 20,
-                "Healthcare": 15,
-                "Technology": 5,
-                "Other": 5
-            }
-        else:  # Diversified
-            return {
-                "Technology": 25,
-                "Healthcare": 20,
-                "Financial Services": 20,
-                "Consumer": 15,
-                "Real Estate": 10,
-                "Other": 10
+        # Every peer's allocation is backtested in one matrix pass over the history
+        strategy_idx = np.array([PEER_STRATEGIES.index(peer['strategy']) for peer in peers], dtype=int)
+        weights = peer_allocations(strategy_idx, np.random)
+        backtests = backtest_peers(self.backtester, strategy_idx, weights)
+        for peer, peer_weights, metrics in zip(peers, weights, backtests.to_dict('records')):
+            allocation = {
+                sleeve: float(weight) for sleeve, weight in zip(ALLOCATION_SLEEVES, peer_weights) if weight > 0
             }
+            peer.update({
+                'performance': metrics['annual_return'],
+                'volatility': metrics['volatility'],
+                'max_drawdown': metrics['max_drawdown'],
+                'sharpe_ratio': metrics['sharpe_ratio'],
+                'top_sector': max(allocation, key=allocation.get),
+                'risk_level': metrics['risk_level'],
+                'allocation': allocation
+            })
+        
+        return peers
     
+    @traced('peer_matcher.find_similar_peers', rows=lambda self, *args, **kwargs: len(self.peer_store.current))
     def find_similar_peers(self, user_profile: Dict, max_results: int = 50) -> List[Dict]:
         """Find peers similar to the user based on profile"""
         user_age = user_profile.get('age', 35)
@@ -215,6 +335,38 @@ class PeerMatcher:
                 return True
         return False
     
+    def performance_percentiles(self, user_profile: Dict, user_return: float) -> List[Dict]:
+        """Percentile of the user's return within their cohort slice and each coarser cohort"""
+        user_slice = {
+            'location': user_profile.get('location', 'Singapore'),
+            'age_band': age_band(user_profile.get('age', 35)),
+            'net_worth': user_profile.get('net_worth', '$2.5M - $5M')
+        }
+        cohorts = [
+            ('Location, age & net worth', COHORT_DIMENSIONS),
+            ('Location & net worth', ['location', 'net_worth']),
+            ('Age & net worth', ['age_band', 'net_worth']),
+            ('Location', ['location']),
+            ('Age band', ['age_band']),
+            ('Net worth', ['net_worth']),
+            ('All peers', [])
+        ]
+        
+        rows = []
+        for label, dimensions in cohorts:
+            # Slice sketches merge on the fly; each lookup is a binary search, not a sort
+            sketch = self.performance_sketches.cohort(**{name: user_slice[name] for name in dimensions})
+            if not len(sketch):
+                continue
+            rows.append({
+                'cohort': label,
+                'peers': len(sketch),
+                'percentile': sketch.rank(user_return) * 100,
+                'median_return': sketch.quantile(0.5),
+                'top_decile_return': sketch.quantile(0.9)
+            })
+        return rows
+    
     def get_peer_insights(self, similar_peers: List[Dict]) -> Dict:
         """Generate insights from similar peer data"""
         if not similar_peers:
@@ -222,6 +374,8 @@ class PeerMatcher:
         
         # Calculate aggregate statistics
         avg_performance = np.mean([peer['performance'] for peer in similar_peers])
+        avg_volatility = np.mean([peer['volatility'] for peer in similar_peers])
+        avg_max_drawdown = np.mean([peer['max_drawdown'] for peer in similar_peers])
         top_strategies = {}
         top_sectors = {}
         
@@ -239,6 +393,8 @@ class PeerMatcher:
         return {
             'total_peers': len(similar_peers),
             'avg_performance': avg_performance,
+            'avg_volatility': avg_volatility,
+            'avg_max_drawdown': avg_max_drawdown,
             'top_strategy': popular_strategies[0][0] if popular_strategies else "Diversified",
             'top_sector': popular_sectors[0][0] if popular_sectors else "Technology",
             'strategy_distribution': dict(popular_strategies[:5]),
@@ -0,0 +1,346 @@
+import argparse
+import bisect
+import heapq
+import numbers
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from config.settings import PEER_LEADERBOARD_SIZE, PEER_SKETCH_REBUILD_FRACTION
+from utils.peer_cube import PeerCube
+from utils.quantile_sketch import CohortSketches
+
+Chain = List[Tuple[int, Optional[Dict]]]  # (version, record or None once deleted), oldest first
+BoardKey = Tuple[Optional[str], Optional[str]]  # (dimension, label); (None, None) is the overall board
+# (-measure, id) entries best first, plus whether they are every member rather than just the best ones
+Leaderboard = Tuple[Tuple[Tuple[float, str], ...], bool]
+
+
+def _visible(chain: Optional[Chain], version: int) -> Optional[Dict]:
+    """Record a snapshot at `version` sees; chains are a handful of entries at most"""
+    for entry_version, record in reversed(chain or ()):
+        if entry_version <= version:
+            return record
+    return None
+
+
+class PeerSnapshot:
+    """Consistent, read-only view of the peer store at one version; writers never change it"""
+
+    def __init__(self, store: 'PeerStore', version: int, count: int, cube: PeerCube,
+                 sketches: CohortSketches, leaderboards: Dict[BoardKey, Leaderboard]):
+        self._store = store
+        self.version = version
+        self.count = count
+        self.cube = cube
+        self.sketches = sketches
+        self.leaderboards = leaderboards
+        self._peers: Optional[List[Dict]] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, peer_id: str) -> Optional[Dict]:
+        with self._store._lock:
+            return _visible(self._store._records.get(peer_id), self.version)
+
+    @property
+    def peers(self) -> List[Dict]:
+        """Every peer at this version in insertion order, listed once per snapshot"""
+        if self._peers is None:
+            with self._store._lock:
+                visible = (_visible(chain, self.version) for chain in self._store._records.values())
+                self._peers = [peer for peer in visible if peer is not None]
+        return self._peers
+
+    def select(self, **filters) -> List[Dict]:
+        """Peers matching a label (or list of labels) per dimension, read from the category indexes"""
+        if not filters:
+            return list(self.peers)
+        with self._store._lock:
+            return self._store._select(filters, self.version)
+
+    def leaderboard(self, dimension: Optional[str] = None, label: Optional[str] = None,
+                    k: int = PEER_LEADERBOARD_SIZE) -> List[Dict]:
+        """Top k peers by the measure, overall or within one label of a leaderboard dimension"""
+        if dimension is not None and dimension not in self._store.leaderboard_dimensions:
+            raise ValueError(f"No leaderboard for dimension: {dimension}")
+        entries, _ = self.leaderboards.get((dimension, label), ((), True))
+        with self._store._lock:
+            return [_visible(self._store._records[peer_id], self.version) for _, peer_id in entries[:k]]
+
+
+class PeerStore:
+    """Versioned peer records whose category indexes, cohort aggregates and leaderboards follow each change"""
+
+    def __init__(self, peers: Iterable[Dict], dimensions: Dict[str, Callable[[Dict], str]], cube: PeerCube,
+                 cohort_dimensions: List[str], leaderboard_dimensions: List[str] = (),
+                 measure: str = 'performance', leaderboard_size: int = PEER_LEADERBOARD_SIZE):
+        self.dimensions = dimensions
+        self.cohort_dimensions = list(cohort_dimensions)
+        self.leaderboard_dimensions = list(leaderboard_dimensions)
+        self.measure = measure
+        self.leaderboard_size = leaderboard_size
+        # Boards keep spare entries, so only losing half of them to removals forces a rescan of members
+        self._capacity = 2 * leaderboard_size
+        self._lock = threading.Lock()
+        self._records: Dict[str, Chain] = {}
+        # Label -> ids (an insertion-ordered dict as a set) holding it in any version a live snapshot can see
+        self._index: Dict[str, Dict[str, Dict[str, None]]] = {name: {} for name in dimensions}
+        self._retired = deque()  # (version, id): older record versions can go once no snapshot predates version
+        self._snapshots = weakref.WeakSet()
+        self._publish(PeerSnapshot(self, 0, 0, cube, CohortSketches(self.cohort_dimensions), {}))
+        self.apply(append=peers)
+
+    def _publish(self, snapshot: PeerSnapshot) -> PeerSnapshot:
+        self._snapshots.add(snapshot)
+        self.current = snapshot
+        return snapshot
+
+    def snapshot(self) -> PeerSnapshot:
+        """Latest version; keep the object to keep reading that version while writers move on"""
+        return self.current
+
+    def _cohort_key(self, peer: Dict) -> Tuple:
+        return tuple(self.dimensions[name](peer) for name in self.cohort_dimensions)
+
+    def _frame(self, peers: List[Dict], cube: PeerCube) -> pd.DataFrame:
+        columns = {name: [self.dimensions[name](peer) for peer in peers] for name in cube.dimensions}
+        columns[self.measure] = [peer[self.measure] for peer in peers]
+        return pd.DataFrame(columns)
+
+    def _select(self, filters: Dict, version: int) -> List[Dict]:
+        unknown = set(filters) - set(self.dimensions)
+        if unknown:
+            raise ValueError(f"Unknown peer dimensions: {', '.join(sorted(unknown))}")
+        wanted = {
+            name: set(value) if isinstance(value, (list, tuple)) else {value} for name, value in filters.items()
+        }
+        # Walk the smallest posting lists; the index may still name ids whose label changed since
+        postings = min(
+            ([self._index[name].get(label, {}) for label in labels] for name, labels in wanted.items()),
+            key=lambda lists: sum(map(len, lists))
+        )
+        matches, seen = [], set()
+        for ids in postings:
+            for peer_id in ids:
+                if peer_id in seen:
+                    continue
+                seen.add(peer_id)
+                peer = _visible(self._records.get(peer_id), version)
+                if peer is not None and all(
+                    self.dimensions[name](peer) in labels for name, labels in wanted.items()
+                ):
+                    matches.append(peer)
+        return matches
+
+    def _validate(self, peer: Dict):
+        """Reject a record whose measure or dimension fields are missing before a batch mutates anything"""
+        for name, label_of in self.dimensions.items():
+            try:
+                label_of(peer)
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Peer {peer['id']} has no valid '{name}': {e!r}") from e
+        if not isinstance(peer.get(self.measure), numbers.Real):
+            raise ValueError(f"Peer {peer['id']} needs a numeric '{self.measure}'")
+
+    def _rollback(self, version: int, peer_ids: List[str], indexed: List[Tuple[str, str, str]], retired: int):
+        """Undo the record versions and index entries of a batch that failed before it was published"""
+        for _ in range(retired):
+            self._retired.pop()
+        for peer_id in peer_ids:
+            chain = self._records.get(peer_id)
+            if chain and chain[-1][0] == version:
+                chain.pop()
+            if not chain:
+                self._records.pop(peer_id, None)
+        for name, label, peer_id in indexed:
+            ids = self._index[name][label]
+            ids.pop(peer_id, None)
+            if not ids:
+                del self._index[name][label]
+
+    def _board_keys(self, peer: Dict) -> List[BoardKey]:
+        return [(None, None)] + [(name, self.dimensions[name](peer)) for name in self.leaderboard_dimensions]
+
+    def _refill(self, key: BoardKey, version: int) -> Leaderboard:
+        """Board rebuilt from its members, once removals have eaten into its spare entries"""
+        dimension, label = key
+        if dimension is None:
+            members = (_visible(chain, version) for chain in self._records.values())
+            members = [peer for peer in members if peer is not None]
+        else:
+            members = self._select({dimension: label}, version)
+        entries = heapq.nsmallest(self._capacity, ((-peer[self.measure], peer['id']) for peer in members))
+        return tuple(entries), len(members) <= self._capacity
+
+    def apply(self, append: Iterable[Dict] = (), update: Iterable[Dict] = (),
+              delete: Iterable[str] = ()) -> PeerSnapshot:
+        """Publish one atomic batch as a new version: new peers, {id, changed fields...} updates and deleted ids"""
+        append, update, delete = list(append), list(update), list(delete)
+        with self._lock:
+            version = self.current.version + 1
+            latest = {}
+            for peer_id in [peer['id'] for peer in append + update] + delete:
+                if peer_id in latest:
+                    raise ValueError(f"Peer {peer_id} appears more than once in the batch")
+                latest[peer_id] = _visible(self._records.get(peer_id), self.current.version)
+            for peer in append:
+                if latest[peer['id']] is not None:
+                    raise ValueError(f"Peer {peer['id']} already exists")
+            for peer_id in [peer['id'] for peer in update] + delete:
+                if latest[peer_id] is None:
+                    raise KeyError(f"Unknown peer: {peer_id}")
+
+            # (old, new) per change; None stands for absent
+            changes = [(None, dict(peer)) for peer in append]
+            changes += [(latest[peer['id']], {**latest[peer['id']], **peer}) for peer in update]
+            changes += [(latest[peer_id], None) for peer_id in delete]
+            for _, new in changes:
+                if new is not None:
+                    self._validate(new)
+
+            # Records and indexes are shared with live snapshots; a failure below undoes this batch's entries
+            peer_ids, indexed, retired = [], [], 0
+            try:
+                for old, new in changes:
+                    peer_id = (new or old)['id']
+                    self._records.setdefault(peer_id, []).append((version, new))
+                    peer_ids.append(peer_id)
+                    if old is not None:
+                        self._retired.append((version, peer_id))
+                        retired += 1
+                    if new is not None:
+                        for name, label_of in self.dimensions.items():
+                            label = label_of(new)
+                            ids = self._index[name].setdefault(label, {})
+                            if peer_id not in ids:
+                                ids[peer_id] = None
+                                indexed.append((name, label, peer_id))
+
+                removed = [old for old, _ in changes if old is not None]
+                added = [new for _, new in changes if new is not None]
+                previous = self.current
+                cube = previous.cube.copy()
+                cube.remove(self._frame(removed, cube))
+                cube.add(self._frame(added, cube))
+
+                sketches = previous.sketches.copy()
+                for peer in removed:
+                    sketches.remove(self._cohort_key(peer), peer[self.measure])
+                for peer in added:
+                    sketches.add(self._cohort_key(peer), peer[self.measure])
+                for key in {self._cohort_key(peer) for peer in removed}:
+                    if sketches.removed_fraction(key) > PEER_SKETCH_REBUILD_FRACTION:
+                        members = self._select(dict(zip(self.cohort_dimensions, key)), version)
+                        sketches.rebuild(key, [peer[self.measure] for peer in members])
+
+                leaderboards = dict(previous.leaderboards)
+                boards: Dict[BoardKey, List] = {}  # Boards this batch touches, copied on first write
+                for old, new in changes:
+                    for peer, sign in ((old, -1), (new, 1)):
+                        if peer is None:
+                            continue
+                        entry = (-peer[self.measure], peer['id'])
+                        for key in self._board_keys(peer):
+                            if key not in boards:
+                                entries, complete = leaderboards.get(key, ((), True))
+                                boards[key] = [list(entries), complete]
+                            board = boards[key]
+                            entries = board[0]
+                            position = bisect.bisect_left(entries, entry)
+                            if sign < 0:
+                                if position < len(entries) and entries[position] == entry:
+                                    del entries[position]
+                            elif board[1] or (entries and entry < entries[-1]):
+                                # Beating the last kept entry proves a place among the best; else wait for a refill
+                                entries.insert(position, entry)
+                                if len(entries) > self._capacity:
+                                    entries.pop()
+                                    board[1] = False
+                for key, (entries, complete) in boards.items():
+                    if len(entries) < self.leaderboard_size and not complete:
+                        leaderboards[key] = self._refill(key, version)
+                    else:
+                        leaderboards[key] = (tuple(entries), complete)
+            except BaseException:
+                self._rollback(version, peer_ids, indexed, retired)
+                raise
+
+            count = previous.count + sum((new is not None) - (old is not None) for old, new in changes)
+            snapshot = self._publish(PeerSnapshot(self, version, count, cube, sketches, leaderboards))
+            self._collect()
+        return snapshot
+
+    def _collect(self):
+        """Drop record versions and index entries that no live snapshot can see any more"""
+        horizon = min(snapshot.version for snapshot in list(self._snapshots))
+        while self._retired and self._retired[0][0] <= horizon:
+            _, peer_id = self._retired.popleft()
+            chain = self._records.get(peer_id)
+            if chain is None:
+                continue
+            # Keep the entry visible at the horizon and everything newer
+            start = max(i for i, (entry_version, _) in enumerate(chain) if entry_version <= horizon)
+            dropped, kept = chain[:start], chain[start:]
+            if not dropped:
+                continue
+            if len(kept) == 1 and kept[0][1] is None:
+                del self._records[peer_id]
+                kept = []
+            else:
+                self._records[peer_id] = kept
+            for name, label_of in self.dimensions.items():
+                labels = {label_of(record) for _, record in kept if record is not None}
+                for _, record in dropped:
+                    if record is not None and label_of(record) not in labels:
+                        self._index[name].get(label_of(record), {}).pop(peer_id, None)
+
+    def append(self, peers: Iterable[Dict]) -> PeerSnapshot:
+        return self.apply(append=peers)
+
+    def update(self, peers: Iterable[Dict]) -> PeerSnapshot:
+        return self.apply(update=peers)
+
+    def delete(self, peer_ids: Iterable[str]) -> PeerSnapshot:
+        return self.apply(delete=peer_ids)
+
+
+if __name__ == "__main__":
+    import numpy as np
+
+    from utils.bulk_generator import generate_peer_chunk, iter_peer_chunks
+    from utils.peer_matcher import new_peer_store
+
+    parser = argparse.ArgumentParser(description="Time a daily peer delta against rebuilding the peer store")
+    parser.add_argument("--peers", type=int, default=100_000)
+    parser.add_argument("--delta", type=float, default=0.01, help="Share of peers appended, updated and deleted")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    peers = [record for chunk in iter_peer_chunks(args.peers, seed=args.seed) for record in chunk.to_dict('records')]
+    started = time.perf_counter()
+    store = new_peer_store(peers)
+    built = time.perf_counter() - started
+
+    rng = np.random.default_rng(args.seed)
+    n_changes = max(1, int(args.peers * args.delta / 3))
+    picked = rng.choice(len(peers), 2 * n_changes, replace=False)
+    updates = [
+        {'id': peers[i]['id'], 'performance': peers[i]['performance'] + rng.normal(0, 2)} for i in picked[:n_changes]
+    ]
+    deletes = [peers[i]['id'] for i in picked[n_changes:]]
+    appends = generate_peer_chunk(n_changes, rng, id_offset=args.peers).to_dict('records')
+    reader = store.snapshot()
+    started = time.perf_counter()
+    snapshot = store.apply(append=appends, update=updates, delete=deletes)
+    applied = time.perf_counter() - started
+
+    print(f"Built {len(reader):,} peers in {built:.2f}s; "
+          f"applied {3 * n_changes:,} changes in {applied * 1000:.1f} ms "
+          f"(version {reader.version} -> {snapshot.version}, {len(snapshot):,} peers)")
+    print(pd.DataFrame(snapshot.leaderboard())[['id', 'strategy', 'location', 'performance']].round(2).to_string())
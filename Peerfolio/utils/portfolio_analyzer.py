@@ -1,44 +1,61 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List
-import yfinance as yf
+from typing import Dict, List, Optional
+
+from utils.recommendation_rules import SUMMARY_ENGINE, build_context
+from utils.cost_basis import compute_cost_basis
+from utils.tax_harvesting import scan_harvest_opportunities, summarize_by_symbol
+from utils.portfolio_frame import PortfolioFrame
+from utils.fx import FX_RATES, conversion_rates, reporting_currency
+from utils.diversification import DiversificationModel
+from utils.factor_risk import FactorRiskModel
+from utils.look_through import LookThrough
+from utils.stress_testing import STRESS_ENGINE
+from utils.tracing import traced
+from config.settings import COST_BASIS_METHOD
+
+# Sector per known symbol, shared with the advisor so both classify holdings the same way
+SECTOR_MAPPING = {
+    'AAPL': 'Technology',
+    'MSFT': 'Technology', 
+    'GOOGL': 'Technology',
+    'AMZN': 'Consumer Discretionary',
+    'TSLA': 'Consumer Discretionary',
+    'NVDA': 'Technology',
+    'META': 'Technology',
+    'BRK-B': 'Financial Services',
+    'UNH': 'Healthcare',
+    'JNJ': 'Healthcare',
+    'V': 'Financial Services',
+    'WMT': 'Consumer Staples',
+    'JPM': 'Financial Services',
+    'PG': 'Consumer Staples',
+    'MA': 'Financial Services',
+    'HD': 'Consumer Discretionary',
+    'CVX': 'Energy',
+    'ABBV': 'Healthcare',
+    'KO': 'Consumer Staples',
+    'BAC': 'Financial Services',
+    'PFE': 'Healthcare',
+    'AVGO': 'Technology',
+    'PEP': 'Consumer Staples',
+    'TMO': 'Healthcare',
+    'COST': 'Consumer Staples',
+    'DIS': 'Communication Services',
+    'ABT': 'Healthcare',
+    'VZ': 'Communication Services',
+    'ADBE': 'Technology',
+    'WFC': 'Financial Services'
+}
 
 class PortfolioAnalyzer:
     """Advanced portfolio analysis with AI-powered insights"""
     
     def __init__(self):
-        self.sector_mapping = {
-            'AAPL': 'Technology',
-            'MSFT': 'Technology', 
-            'GOOGL': 'Technology',
-            'AMZN': 'Consumer Discretionary',
-            'TSLA': 'Consumer Discretionary',
-            'NVDA': 'Technology',
-            'META': 'Technology',
-            'BRK-B': 'Financial Services',
-            'UNH': 'Healthcare',
-            'JNJ': 'Healthcare',
-            'V': 'Financial Services',
-            'WMT': 'Consumer Staples',
-            'JPM': 'Financial Services',
-            'PG': 'Consumer Staples',
-            'MA': 'Financial Services',
-            'HD': 'Consumer Discretionary',
-            'CVX': 'Energy',
-            'ABBV': 'Healthcare',
-            'KO': 'Consumer Staples',
-            'BAC': 'Financial Services',
-            'PFE': 'Healthcare',
-            'AVGO': 'Technology',
-            'PEP': 'Consumer Staples',
-            'TMO': 'Healthcare',
-            'COST': 'Consumer Staples',
-            'DIS': 'Communication Services',
-            'ABT': 'Healthcare',
-            'VZ': 'Communication Services',
-            'ADBE': 'Technology',
-            'WFC': 'Financial Services'
-        }
+        # Optional hook called with (name, seconds) for every rule and feature evaluated
+        self.rule_profile = None
+        
+        self.sector_mapping = SECTOR_MAPPING
         
         self.esg_scores = {
             'AAPL': 8.5, 'MSFT': 9.2, 'GOOGL': 7.8, 'AMZN': 6.9,
@@ -47,85 +64,188 @@ class PortfolioAnalyzer:
             'JPM': 7.2, 'PG': 8.9, 'MA': 7.6, 'HD': 7.4,
             'CVX': 4.2, 'ABBV': 7.8, 'KO': 6.8, 'BAC': 6.9
         }
+        
+        # Market + sector factor model over the sector mapping; O(holdings x factors) per query
+        self.risk_model = FactorRiskModel.load(sector_mapping=self.sector_mapping)
+        # Harvest replacements are ranked by factor-model correlation among the mapped names
+        self.replacement_covariance = self.risk_model.covariance(
+            list(self.sector_mapping), list(self.sector_mapping.values())
+        )
+        # Correlation eigendecompositions cached per holding universe; one changed holding is a low-rank update
+        self.diversification = DiversificationModel(self.risk_model)
+        # Fund constituents (funds x securities, sparse) so ETF holdings count toward what they hold
+        self.look_through = LookThrough(self.sector_mapping, self.esg_scores)
 
-    def analyze(self, portfolio_df: pd.DataFrame, user_profile: Dict) -> Dict:
+    @traced('portfolio_analyzer.analyze', rows=lambda self, portfolio_df, *args, **kwargs: len(portfolio_df))
+    def analyze(self, portfolio_df: pd.DataFrame, user_profile: Dict,
+                sales_df: Optional[pd.DataFrame] = None) -> Dict:
         """Comprehensive portfolio analysis"""
         
-        # Calculate basic metrics
-        portfolio_df['Market_Value'] = portfolio_df['Shares'] * portfolio_df['Current_Price']
-        portfolio_df['Cost_Basis'] = portfolio_df['Shares'] * portfolio_df['Purchase_Price']
-        portfolio_df['P&L'] = portfolio_df['Market_Value'] - portfolio_df['Cost_Basis']
-        portfolio_df['Return_%'] = (portfolio_df['P&L'] / portfolio_df['Cost_Basis']) * 100
+        reporting = reporting_currency(user_profile)
+        currencies, fx_rates, purchase_fx_rates = conversion_rates(portfolio_df, reporting)
         
-        total_value = portfolio_df['Market_Value'].sum()
-        total_cost = portfolio_df['Cost_Basis'].sum()
-        total_return = ((total_value - total_cost) / total_cost) * 100
-        
-        # Sector allocation
-        portfolio_df['Sector'] = portfolio_df['Symbol'].map(
-            lambda x: self.sector_mapping.get(x, 'Other')
+        # Lot-level cost basis; several rows per symbol are tax lots folded into one position,
+        # and sales (Symbol, Shares, Sale_Price) are relieved against them by the profile's method.
+        # Lots and sales are priced in the reporting currency, so P&L and harvest losses add up across currencies
+        cost_basis = compute_cost_basis(
+            portfolio_df.assign(
+                Purchase_Price=portfolio_df['Purchase_Price'].to_numpy(dtype=float) * purchase_fx_rates,
+                Current_Price=portfolio_df['Current_Price'].to_numpy(dtype=float) * fx_rates
+            ),
+            self.convert_sales(sales_df, portfolio_df['Symbol'], fx_rates),
+            method=user_profile.get('cost_basis_method', COST_BASIS_METHOD)
+        )
+        if portfolio_df['Symbol'].duplicated().any():
+            lots = pd.DataFrame({
+                'Symbol': portfolio_df['Symbol'].to_numpy(),
+                'Currency': currencies,
+                'FX_Rate': fx_rates,
+                'Lot_Cost': portfolio_df['Shares'].to_numpy(dtype=float)
+                            * portfolio_df['Purchase_Price'].to_numpy(dtype=float)
+            })
+            lots['Purchase_Cost'] = lots['Lot_Cost'] * purchase_fx_rates
+            # Positions take the symbol's quote currency and a cost-weighted purchase rate across lots
+            by_symbol = lots.groupby('Symbol', sort=False).agg(
+                Currency=('Currency', 'last'), FX_Rate=('FX_Rate', 'last'),
+                Lot_Cost=('Lot_Cost', 'sum'), Purchase_Cost=('Purchase_Cost', 'sum')
+            )
+            portfolio_df = cost_basis['positions']
+            by_symbol = by_symbol.reindex(portfolio_df['Symbol'].to_numpy())
+            currencies = by_symbol['Currency'].to_numpy()
+            fx_rates = by_symbol['FX_Rate'].to_numpy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                purchase_fx_rates = np.where(
+                    by_symbol['Lot_Cost'] != 0, by_symbol['Purchase_Cost'] / by_symbol['Lot_Cost'], fx_rates
+                )
+            # Positions come back in the reporting currency; the frame applies the rates to local prices itself
+            portfolio_df = portfolio_df.assign(
+                Purchase_Price=portfolio_df['Purchase_Price'].to_numpy() / purchase_fx_rates,
+                Current_Price=portfolio_df['Current_Price'].to_numpy() / fx_rates
+            )
+        harvest = scan_harvest_opportunities(
+            cost_basis['lots'], covariance=self.replacement_covariance, sector_mapping=self.sector_mapping
         )
-        sector_allocation = portfolio_df.groupby('Sector')['Market_Value'].sum().to_dict()
         
-        # Diversification analysis
-        diversification_score = self.calculate_diversification_score(sector_allocation, total_value)
+        # Derived columns live on a read-only frame; the caller's DataFrame is never modified
+        portfolio = PortfolioFrame(portfolio_df, self.sector_mapping, fx_rates, purchase_fx_rates)
+        
+        total_value = portfolio.total('Market_Value')
+        total_cost = portfolio.total('Cost_Basis')
+        # Gifted or granted shares carry a zero basis; a book of only those has no meaningful return
+        total_return = (total_value - total_cost) / total_cost * 100 if total_cost else 0.0
+        
+        # Sector allocation, through any funds held to their underlying securities
+        look_through = self.calculate_look_through(portfolio)
+        sector_allocation = look_through['sector_allocation']
+        
+        # Diversification analysis: independent bets implied by the holdings' correlations
+        diversification = self.calculate_diversification(portfolio)
+        diversification_score = diversification['score']
         
         # Risk assessment
-        risk_metrics = self.assess_risk(portfolio_df, user_profile)
+        risk_metrics = self.assess_risk(portfolio, user_profile)
+        factor_risk = self.calculate_factor_risk(portfolio, total_value)
+        stress_tests = self.calculate_stress_tests(sector_allocation)
         
         # ESG scoring
-        esg_score = self.calculate_esg_score(portfolio_df)
+        esg_score = look_through['esg_score']
         
         # Generate recommendations
         recommendations = self.generate_recommendations(
-            portfolio_df, sector_allocation, diversification_score, risk_metrics, user_profile
+            portfolio.view(['Symbol', 'Shares', 'Purchase_Price', 'Current_Price', 'Market_Value', 'Cost_Basis']),
+            sector_allocation, diversification_score, risk_metrics, user_profile, esg_score
         )
         
         # Holdings analysis for charts
-        holdings_data = self.analyze_holdings(portfolio_df)
+        holdings_data = self.analyze_holdings(portfolio, factor_risk.pop('holding_volatility'))
+        
+        # Currency exposure and the volatility FX adds on top of local returns
+        currency_risk = FX_RATES.currency_risk(currencies, portfolio.values('Market_Value'), reporting)
         
         return {
             'total_value': total_value,
             'total_return': total_return,
+            'reporting_currency': reporting,
+            'fx_pnl': portfolio.total('FX_P&L'),
+            **currency_risk,
             'diversification_score': diversification_score,
+            'effective_bets': diversification['effective_bets'],
+            'diversification_ratio': diversification['diversification_ratio'],
             'risk_level': risk_metrics['level'],
             'risk_score': risk_metrics['score'],
             'esg_score': esg_score,
+            'volatility': factor_risk['volatility'],
+            'factor_risk': factor_risk,
+            'stress_tests': stress_tests,
             'sector_allocation': sector_allocation,
+            'issuer_exposure': look_through['issuer_exposure'],
+            'fund_value': look_through['fund_value'],
+            'cost_basis': {key: value for key, value in cost_basis.items() if key != 'positions'},
+            'harvest_opportunities': summarize_by_symbol(harvest),
             'recommendations': recommendations,
             'holdings_risk': holdings_data['risk'],
             'holdings_return': holdings_data['return'],
-            'holdings_symbols': holdings_data['symbols']
+            'holdings_symbols': holdings_data['symbols'],
+            'holdings_risk_contribution': factor_risk.pop('holding_contribution').tolist()
         }
 
-    def calculate_diversification_score(self, sector_allocation: Dict, total_value: float) -> float:
-        """Calculate portfolio diversification score (0-10)"""
-        if not sector_allocation or total_value == 0:
-            return 0.0
-        
-        # Calculate concentration (Herfindahl index)
-        weights = [value / total_value for value in sector_allocation.values()]
-        herfindahl = sum(w**2 for w in weights)
-        
-        # Convert to diversification score (lower concentration = higher score)
-        max_herfindahl = 1.0  # Completely concentrated
-        min_herfindahl = 1.0 / len(weights) if len(weights) > 0 else 1.0  # Perfectly diversified
-        
-        if max_herfindahl == min_herfindahl:
-            return 10.0
-        
-        normalized = (max_herfindahl - herfindahl) / (max_herfindahl - min_herfindahl)
-        return min(10.0, max(0.0, normalized * 10))
+    def convert_sales(self, sales_df: Optional[pd.DataFrame], symbols: pd.Series,
+                      fx_rates: np.ndarray) -> Optional[pd.DataFrame]:
+        """Sale prices in the reporting currency, at today's rate of the sold holding's currency"""
+        if sales_df is None or sales_df.empty:
+            return sales_df
+        symbol_rates = pd.Series(fx_rates, index=symbols.to_numpy())
+        symbol_rates = symbol_rates[~symbol_rates.index.duplicated(keep='last')]
+        # Symbols with no lots keep their price; compute_cost_basis rejects them
+        return sales_df.assign(
+            Sale_Price=sales_df['Sale_Price'].to_numpy(dtype=float)
+                       * sales_df['Symbol'].map(symbol_rates).fillna(1.0).to_numpy()
+        )
+
+    def calculate_diversification(self, portfolio_df: pd.DataFrame) -> Dict:
+        """Deterministic 0-10 diversification score from the holdings' correlation matrix"""
+        return self.diversification.score(
+            portfolio_df['Symbol'].to_numpy(), portfolio_df['Market_Value'].to_numpy(),
+            portfolio_df['Sector'].to_numpy()
+        )
+
+    def calculate_factor_risk(self, portfolio_df: pd.DataFrame, total_value: float) -> Dict:
+        """Factor model volatility of the portfolio, split into factor and specific risk"""
+        market_value = portfolio_df['Market_Value'].to_numpy()
+        weights = market_value / total_value if total_value else market_value
+        return self.risk_model.risk(portfolio_df['Symbol'].to_numpy(), weights, portfolio_df['Sector'].to_numpy())
+
+    def calculate_look_through(self, portfolio_df: pd.DataFrame) -> Dict:
+        """Sector allocation, ESG score and issuer exposure with funds replaced by their constituents"""
+        symbols = portfolio_df['Symbol'].to_numpy()
+        if any(self.look_through.is_fund(str(symbol)) for symbol in symbols):
+            return self.look_through.exposures(symbols, portfolio_df['Market_Value'].to_numpy())
+        # No funds: the direct holdings already are the underlying securities
+        return {
+            'sector_allocation': portfolio_df.group_sum('Sector', 'Market_Value'),
+            'esg_score': self.calculate_esg_score(portfolio_df),
+            'issuer_exposure': {},
+            'fund_value': 0.0,
+            'funds': []
+        }
+
+    def calculate_stress_tests(self, sector_allocation: Dict) -> Dict:
+        """P&L of the holdings under every historical and hypothetical scenario, worst first"""
+        exposures = STRESS_ENGINE.exposures(
+            np.array(list(sector_allocation), dtype=object), np.array(list(sector_allocation.values()), dtype=float)
+        )
+        return STRESS_ENGINE.report(exposures)
 
     def assess_risk(self, portfolio_df: pd.DataFrame, user_profile: Dict) -> Dict:
         """Assess portfolio risk level"""
         # Simple risk assessment based on sector concentration and volatility proxies
         tech_weight = 0
-        total_value = portfolio_df['Market_Value'].sum()
+        market_value = portfolio_df['Market_Value']
+        total_value = market_value.sum()
         
         if total_value > 0:
             tech_symbols = ['AAPL', 'MSFT', 'GOOGL', 'NVDA', 'META', 'ADBE']
-            tech_value = portfolio_df[portfolio_df['Symbol'].isin(tech_symbols)]['Market_Value'].sum()
+            tech_value = market_value[portfolio_df['Symbol'].isin(tech_symbols)].sum()
             tech_weight = tech_value / total_value
         
         # Risk scoring logic
@@ -146,99 +266,37 @@ class PortfolioAnalyzer:
 
     def calculate_esg_score(self, portfolio_df: pd.DataFrame) -> float:
         """Calculate weighted ESG score for portfolio"""
-        total_value = portfolio_df['Market_Value'].sum()
+        market_value = portfolio_df['Market_Value'].to_numpy()
+        total_value = market_value.sum()
         if total_value == 0:
             return 5.0
         
-        weighted_score = 0
-        for _, row in portfolio_df.iterrows():
-            symbol = row['Symbol']
-            weight = row['Market_Value'] / total_value
-            esg_score = self.esg_scores.get(symbol, 5.0)  # Default neutral score
-            weighted_score += weight * esg_score
-        
-        return weighted_score
+        esg_scores = portfolio_df['Symbol'].map(self.esg_scores).fillna(5.0).to_numpy()  # Default neutral score
+        return float(market_value @ esg_scores / total_value)
 
-    def analyze_holdings(self, portfolio_df: pd.DataFrame) -> Dict:
+    def analyze_holdings(self, portfolio_df: pd.DataFrame, holding_volatility: np.ndarray) -> Dict:
         """Analyze individual holdings for risk/return visualization"""
-        # Mock risk/return data for visualization
-        risk_data = []
-        return_data = []
-        symbols = []
-        
-        for _, row in portfolio_df.iterrows():
-            symbol = row['Symbol']
-            return_pct = row['Return_%']
-            
-            # Mock risk calculation (in reality, would use historical volatility)
-            risk = abs(np.random.normal(15, 5))  # Mock volatility
-            
-            risk_data.append(risk)
-            return_data.append(return_pct)
-            symbols.append(symbol)
-        
         return {
-            'risk': risk_data,
-            'return': return_data,
-            'symbols': symbols
+            'risk': holding_volatility.tolist(),
+            'return': portfolio_df['Return_%'].tolist(),
+            'symbols': portfolio_df['Symbol'].tolist()
         }
 
     def generate_recommendations(self, portfolio_df: pd.DataFrame, sector_allocation: Dict, 
                                diversification_score: float, risk_metrics: Dict, 
-                               user_profile: Dict) -> List[str]:
+                               user_profile: Dict, esg_score: Optional[float] = None) -> List[str]:
         """Generate actionable portfolio recommendations"""
-        recommendations = []
-        
-        # Diversification recommendations
-        if diversification_score < 5:
-            recommendations.append(
-                "🎯 **Improve Diversification**: Your portfolio is heavily concentrated. "
-                "Consider adding holdings from underrepresented sectors."
-            )
-        
-        # Sector-specific recommendations
-        total_value = portfolio_df['Market_Value'].sum()
-        if total_value > 0:
-            for sector, value in sector_allocation.items():
-                weight = value / total_value
-                if weight > 0.4:  # Over 40% concentration
-                    recommendations.append(
-                        f"⚖️ **Reduce {sector} Exposure**: {weight:.1%} allocation is high. "
-                        f"Consider rebalancing to reduce concentration risk."
-                    )
-        
-        # Risk-based recommendations
-        if risk_metrics['level'] == 'High' and user_profile.get('investment_style') == 'Conservative':
-            recommendations.append(
-                "🛡️ **Risk Mismatch**: Your portfolio has high risk but you prefer conservative investments. "
-                "Consider adding bonds or defensive stocks."
-            )
-        
-        # ESG recommendations
-        esg_score = self.calculate_esg_score(portfolio_df)
-        if esg_score < 6 and user_profile.get('investment_style') == 'ESG-focused':
-            recommendations.append(
-                "🌱 **ESG Enhancement**: Consider adding more sustainable investments "
-                "to align with your ESG preferences."
-            )
-        
-        # Age-based recommendations
-        age = user_profile.get('age', 35)
-        if age < 40:
-            recommendations.append(
-                "🚀 **Growth Focus**: At your age, consider increasing exposure to growth stocks "
-                "and emerging technologies for long-term wealth building."
-            )
-        elif age > 50:
-            recommendations.append(
-                "🏛️ **Stability Focus**: Consider increasing allocation to dividend-paying stocks "
-                "and bonds for income generation and capital preservation."
-            )
-        
-        if not recommendations:
-            recommendations.append(
-                "✅ **Well-Balanced Portfolio**: Your portfolio shows good diversification "
-                "and aligns well with your investment profile."
-            )
+        context = build_context(
+            portfolio_df, user_profile,
+            sector_mapping=self.sector_mapping, esg_scores=self.esg_scores
+        )
         
-        return recommendations
+        # Seed the features this analysis has already computed
+        seed = {
+            'sector_allocation': sector_allocation,
+            'diversification_score': diversification_score,
+            'risk_level': risk_metrics['level']
+        }
+        if esg_score is not None:
+            seed['esg_score'] = esg_score
+        return SUMMARY_ENGINE.evaluate_group('summary', context, seed=seed, profile=self.rule_profile)
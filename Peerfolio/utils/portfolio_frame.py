@@ -0,0 +1,129 @@
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.portfolio_ingest import NUMERIC_COLUMNS
+
+# Derived column name -> function(frame) returning its values; evaluated at most once per frame
+DERIVED_COLUMNS: Dict[str, Callable] = {}
+
+
+def derived(name: str):
+    """Register a derived portfolio column"""
+    def register(func: Callable) -> Callable:
+        DERIVED_COLUMNS[name] = func
+        return func
+    return register
+
+
+class PortfolioFrame:
+    """Read-only holdings whose derived columns are computed once and shared, never copied"""
+
+    def __init__(self, portfolio_df: pd.DataFrame, sector_mapping: Optional[Dict] = None,
+                 fx_rates: Optional[np.ndarray] = None, purchase_fx_rates: Optional[np.ndarray] = None):
+        self.sector_mapping = sector_mapping or {}
+
+        # One snapshot of the inputs; later edits to the caller's frame cannot leak into cached columns
+        index = pd.RangeIndex(len(portfolio_df))
+        self._columns = {'Symbol': pd.Series(portfolio_df['Symbol'].to_numpy(), index=index, name='Symbol')}
+        for col in NUMERIC_COLUMNS:
+            self._columns[col] = self._wrap(col, np.array(portfolio_df[col], dtype=float), index)
+
+        # Local-to-reporting currency factors, now and at purchase; 1.0 leaves prices as given
+        fx_rates = np.ones(len(index)) if fx_rates is None else np.array(fx_rates, dtype=float)
+        purchase_fx_rates = fx_rates if purchase_fx_rates is None else np.array(purchase_fx_rates, dtype=float)
+        self._columns['FX_Rate'] = self._wrap('FX_Rate', fx_rates, index)
+        self._columns['Purchase_FX_Rate'] = self._wrap('Purchase_FX_Rate', purchase_fx_rates, index)
+
+    @staticmethod
+    def _wrap(name: str, values, index: pd.Index) -> pd.Series:
+        # Lock a view, not the array: consumers cannot write through the frame, while an array handed in by a
+        # caller (with_columns) keeps its own flags and stays writable for that caller
+        values = np.asarray(values).view()
+        values.flags.writeable = False
+        return pd.Series(values, index=index, name=name, copy=False)
+
+    def __len__(self) -> int:
+        return len(self._columns['Symbol'])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns or name in DERIVED_COLUMNS
+
+    def __getitem__(self, name: str) -> pd.Series:
+        """Column as a read-only Series, deriving and caching it on first access"""
+        column = self._columns.get(name)
+        if column is None:
+            if name not in DERIVED_COLUMNS:
+                raise KeyError(name)
+            column = self._wrap(name, DERIVED_COLUMNS[name](self), self._columns['Symbol'].index)
+            self._columns[name] = column
+        return column
+
+    def values(self, name: str) -> np.ndarray:
+        return self[name].to_numpy()
+
+    def total(self, name: str) -> float:
+        return float(self.values(name).sum())
+
+    def group_sum(self, by: str, name: str) -> Dict:
+        """Sum of `name` per value of `by`, keys in sorted order like groupby().sum()"""
+        codes, keys = pd.factorize(self[by], sort=True)
+        sums = np.bincount(codes, weights=self.values(name), minlength=len(keys))
+        return dict(zip(keys.tolist(), sums.tolist()))
+
+    def view(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """DataFrame over the cached columns without copying them (inputs plus anything derived so far)"""
+        names = columns or list(self._columns)
+        return pd.DataFrame({name: self[name] for name in names}, copy=False)
+
+    def with_columns(self, columns: Dict[str, np.ndarray]) -> 'PortfolioFrame':
+        """New frame sharing every cached column, plus extra ones such as chart-only proxies (shared, not copied)"""
+        extended = dict(self._columns)
+        index = self._columns['Symbol'].index
+        for name, values in columns.items():
+            extended[name] = self._wrap(name, values, index)
+        frame = PortfolioFrame.__new__(PortfolioFrame)
+        frame.sector_mapping = self.sector_mapping
+        frame._columns = extended
+        return frame
+
+
+@derived('Market_Value')
+def _market_value(frame: PortfolioFrame) -> np.ndarray:
+    return frame.values('Shares') * frame.values('Current_Price') * frame.values('FX_Rate')
+
+
+@derived('Cost_Basis')
+def _cost_basis(frame: PortfolioFrame) -> np.ndarray:
+    return frame.values('Shares') * frame.values('Purchase_Price') * frame.values('Purchase_FX_Rate')
+
+
+@derived('P&L')
+def _pnl(frame: PortfolioFrame) -> np.ndarray:
+    return frame.values('Market_Value') - frame.values('Cost_Basis')
+
+
+@derived('FX_P&L')
+def _fx_pnl(frame: PortfolioFrame) -> np.ndarray:
+    # Currency move on today's local value; the rest of P&L is the price move at purchase rates
+    local_value = frame.values('Shares') * frame.values('Current_Price')
+    return local_value * (frame.values('FX_Rate') - frame.values('Purchase_FX_Rate'))
+
+
+@derived('Return_%')
+def _return_pct(frame: PortfolioFrame) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return frame.values('P&L') / frame.values('Cost_Basis') * 100
+
+
+@derived('Weight_%')
+def _weight_pct(frame: PortfolioFrame) -> np.ndarray:
+    market_value = frame.values('Market_Value')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return market_value / market_value.sum() * 100
+
+
+@derived('Sector')
+def _sector(frame: PortfolioFrame) -> np.ndarray:
+    return frame['Symbol'].map(frame.sector_mapping).fillna('Other').to_numpy(dtype=object)
@@ -0,0 +1,267 @@
+import io
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import ALLOWED_FILE_TYPES, MAX_UPLOAD_SIZE, INGEST_CHUNK_ROWS
+
+# Upload schema: column -> dtype after coercion
+PORTFOLIO_SCHEMA = {
+    'Symbol': 'object',
+    'Shares': 'float64',
+    'Purchase_Price': 'float64',
+    'Current_Price': 'float64'
+}
+NUMERIC_COLUMNS = ['Shares', 'Purchase_Price', 'Current_Price']
+# Kept when present: listing currency (ISO code) and lot purchase date (FX and holding-period basis)
+OPTIONAL_COLUMNS = ['Currency', 'Purchase_Date']
+# Sales relieved against the lots; every row must be valid since a dropped sale would overstate holdings
+SALES_SCHEMA = {
+    'Symbol': 'object',
+    'Shares': 'float64',
+    'Sale_Price': 'float64'
+}
+
+
+class IngestError(ValueError):
+    """Raised when an upload is rejected before or while it is parsed"""
+
+
+def check_upload(file_name: str, size_bytes: Optional[int] = None) -> str:
+    """Enforce ALLOWED_FILE_TYPES and MAX_UPLOAD_SIZE; returns the normalized extension"""
+    extension = os.path.splitext(file_name)[1].lstrip('.').lower()
+    if extension not in ALLOWED_FILE_TYPES:
+        raise IngestError(
+            f"Unsupported file type '.{extension}'. Allowed types: {', '.join(ALLOWED_FILE_TYPES)}"
+        )
+    if size_bytes is not None and size_bytes > MAX_UPLOAD_SIZE * 1024 * 1024:
+        raise IngestError(f"File is {size_bytes / 1024 / 1024:.1f} MB; the limit is {MAX_UPLOAD_SIZE} MB")
+    return extension
+
+
+def _normalize_columns(chunk: pd.DataFrame, schema: Dict = PORTFOLIO_SCHEMA,
+                       optional: List[str] = OPTIONAL_COLUMNS) -> pd.DataFrame:
+    """Match schema columns case- and whitespace-insensitively and drop everything else"""
+    lookup = {name.lower(): name for name in list(schema) + optional}
+    renamed = {}
+    for col in chunk.columns:
+        name = lookup.get(str(col).strip().lower())
+        # First match wins; 'Symbol' and 'symbol' side by side would otherwise duplicate a column
+        if name and name not in renamed.values():
+            renamed[col] = name
+    missing = [name for name in schema if name not in renamed.values()]
+    if missing:
+        raise IngestError(f"Missing required columns: {', '.join(missing)}")
+    return chunk[list(renamed)].rename(columns=renamed)
+
+
+def _to_float(values: pd.Series) -> pd.Series:
+    """Parse numbers, retrying only the failures with currency symbols and separators stripped"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype('float64')
+    result = pd.to_numeric(values, errors='coerce').astype('float64')
+    retry = result.isna() & values.notna()
+    if retry.any():
+        cleaned = values[retry].astype(str).str.replace(r'[$,\s]', '', regex=True)
+        result[retry] = pd.to_numeric(cleaned, errors='coerce')
+    return result
+
+
+def validate_chunk(chunk: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
+    """Coerce one chunk to the portfolio schema; returns (valid rows, rejected row count)"""
+    chunk = _normalize_columns(chunk)
+    symbols = chunk['Symbol'].astype('string').str.strip().str.upper()
+    numeric = {col: _to_float(chunk[col]) for col in NUMERIC_COLUMNS}
+
+    valid = (
+        symbols.notna() & (symbols != '')
+        & numeric['Shares'].gt(0)
+        & numeric['Purchase_Price'].ge(0)
+        & numeric['Current_Price'].ge(0)
+    ).to_numpy()
+
+    clean = pd.DataFrame({
+        'Symbol': symbols[valid].astype(object).to_numpy(),
+        **{col: values[valid].to_numpy() for col, values in numeric.items()}
+    })
+    if 'Currency' in chunk.columns:
+        currency = chunk['Currency'].astype('string').str.strip().str.upper()
+        clean['Currency'] = currency.where(currency != '')[valid].astype(object).to_numpy()
+    if 'Purchase_Date' in chunk.columns:
+        clean['Purchase_Date'] = pd.to_datetime(chunk['Purchase_Date'], errors='coerce')[valid].to_numpy()
+    return clean, int((~valid).sum())
+
+
+def validate_sales(frame: pd.DataFrame) -> pd.DataFrame:
+    """Coerce sale rows to SALES_SCHEMA, rejecting the whole set if any row is invalid"""
+    frame = _normalize_columns(frame, SALES_SCHEMA, [])
+    symbols = frame['Symbol'].astype('string').str.strip().str.upper()
+    shares = _to_float(frame['Shares'])
+    sale_price = _to_float(frame['Sale_Price'])
+
+    valid = (symbols.notna() & (symbols != '') & shares.gt(0) & sale_price.ge(0)).to_numpy()
+    if not valid.all():
+        rows = ', '.join(str(row + 1) for row in np.flatnonzero(~valid)[:10])
+        raise IngestError(f"Invalid sale rows: {rows}")
+    return pd.DataFrame({
+        'Symbol': symbols.astype(object).to_numpy(),
+        'Shares': shares.to_numpy(),
+        'Sale_Price': sale_price.to_numpy()
+    })
+
+
+class PositionAggregator:
+    """Folds lot rows into one position per symbol; memory grows with symbols, not rows"""
+
+    def __init__(self):
+        self._shares = pd.Series(dtype='float64')
+        self._cost = pd.Series(dtype='float64')
+        self._price = pd.Series(dtype='float64')
+        self._currency = pd.Series(dtype=object)
+
+    def update(self, lots: pd.DataFrame):
+        if lots.empty:
+            return
+        grouped = lots.assign(_cost=lots['Shares'] * lots['Purchase_Price']).groupby('Symbol', sort=False)
+        self._shares = self._shares.add(grouped['Shares'].sum(), fill_value=0)
+        self._cost = self._cost.add(grouped['_cost'].sum(), fill_value=0)
+        # The latest quoted price wins when a symbol spans several chunks
+        self._price = grouped['Current_Price'].last().combine_first(self._price)
+        if 'Currency' in lots.columns:
+            self._currency = grouped['Currency'].last().combine_first(self._currency)
+
+    def positions(self) -> pd.DataFrame:
+        """Current positions with share-weighted average purchase price"""
+        if self._shares.empty:
+            return pd.DataFrame(columns=list(PORTFOLIO_SCHEMA)).astype(PORTFOLIO_SCHEMA)
+        shares = self._shares.sort_index()
+        positions = pd.DataFrame({
+            'Symbol': shares.index.to_numpy(),
+            'Shares': shares.to_numpy(),
+            'Purchase_Price': np.round((self._cost[shares.index] / shares).to_numpy(), 4),
+            'Current_Price': self._price[shares.index].to_numpy()
+        })
+        if not self._currency.empty:
+            positions['Currency'] = self._currency.reindex(shares.index).to_numpy(dtype=object)
+        return positions
+
+
+def _stream_size(stream) -> Optional[int]:
+    size = getattr(stream, 'size', None)
+    if size is None and hasattr(stream, 'seek'):
+        position = stream.tell()
+        size = stream.seek(0, io.SEEK_END)
+        stream.seek(position)
+    return size
+
+
+def _csv_chunks(stream, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    # Symbols are pinned to text; numeric columns parse natively and only fall back to
+    # object (coerced row by row in validate_chunk) when a chunk holds a malformed cell
+    return pd.read_csv(stream, chunksize=chunk_rows, dtype={'Symbol': str}, skipinitialspace=True)
+
+
+def _excel_chunks(stream, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell) if cell is not None else '' for cell in next(rows, [])]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch or not header:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def _json_chunks(stream, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    stream.seek(stream.tell() - 1 if first else 0)
+
+    if first in (b'[', '['):
+        # A JSON array has to be parsed whole; the upload size limit bounds it
+        records = json.load(stream)
+        for start in range(0, max(len(records), 1), chunk_rows):
+            chunk = pd.DataFrame.from_records(records[start:start + chunk_rows])
+            yield chunk if len(chunk.columns) else pd.DataFrame(columns=list(PORTFOLIO_SCHEMA))
+    else:
+        # JSON lines: one record per line, read incrementally
+        yield from pd.read_json(stream, lines=True, chunksize=chunk_rows, dtype=False)
+
+
+CHUNK_READERS = {
+    'csv': _csv_chunks,
+    'xlsx': _excel_chunks,
+    'json': _json_chunks
+}
+
+
+def stream_portfolio(uploaded_file, file_name: Optional[str] = None,
+                     chunk_rows: int = INGEST_CHUNK_ROWS) -> Iterator[Dict]:
+    """Parse an upload chunk by chunk, yielding progress and positions so far, then a report adding the lots"""
+    file_name = file_name or getattr(uploaded_file, 'name', '')
+    total_bytes = _stream_size(uploaded_file)
+    extension = check_upload(file_name, total_bytes)
+
+    aggregator = PositionAggregator()
+    lot_chunks = []
+    rows_read = rows_rejected = 0
+
+    try:
+        for chunk in CHUNK_READERS[extension](uploaded_file, chunk_rows):
+            lots, rejected = validate_chunk(chunk)
+            aggregator.update(lots)
+            lot_chunks.append(lots)
+            rows_read += len(chunk)
+            rows_rejected += rejected
+
+            bytes_read = uploaded_file.tell() if hasattr(uploaded_file, 'tell') else None
+            report = {
+                'rows_read': rows_read,
+                'rows_rejected': rows_rejected,
+                'bytes_read': bytes_read,
+                'total_bytes': total_bytes,
+                'fraction': min(bytes_read / total_bytes, 1.0) if bytes_read and total_bytes else None,
+                'positions': aggregator.positions()
+            }
+            yield report
+    except IngestError:
+        raise
+    except Exception as e:
+        raise IngestError(f"Could not parse {file_name}: {e}") from e
+
+    if rows_read == rows_rejected:
+        raise IngestError(f"No valid holdings found in {file_name}")
+    # Bounded by MAX_UPLOAD_SIZE; aggregated positions are for display, analysis needs the lots themselves
+    yield {**report, 'lots': pd.concat(lot_chunks, ignore_index=True)}
+
+
+def read_sales(uploaded_file, file_name: Optional[str] = None) -> pd.DataFrame:
+    """Ingest a sales upload (Symbol, Shares, Sale_Price) whole; sales files are small next to lots"""
+    file_name = file_name or getattr(uploaded_file, 'name', '')
+    extension = check_upload(file_name, _stream_size(uploaded_file))
+    try:
+        frame = pd.concat(list(CHUNK_READERS[extension](uploaded_file, INGEST_CHUNK_ROWS)), ignore_index=True)
+    except Exception as e:
+        raise IngestError(f"Could not parse {file_name}: {e}") from e
+    return validate_sales(frame)
+
+
+def read_portfolio(uploaded_file, file_name: Optional[str] = None,
+                   chunk_rows: int = INGEST_CHUNK_ROWS) -> Tuple[pd.DataFrame, Dict]:
+    """Ingest a whole upload; returns (positions, final progress report with the lot rows)"""
+    report = {}
+    for report in stream_portfolio(uploaded_file, file_name, chunk_rows):
+        pass
+    return report.get('positions'), report
@@ -0,0 +1,295 @@
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config.settings import DEBUG_MODE, PROFILE_OUTPUT_DIR, PROFILE_SAMPLE_INTERVAL_MS, PROFILE_TOP_N
+
+PROFILE_ENV_VAR = "PEERFOLIO_PROFILE"
+PROFILE_MODES = ['sample', 'cprofile']
+
+# (function name, file, first line) identifies a frame in every output format
+FrameKey = Tuple[str, str, int]
+
+
+# Page renders profiled at once; tracemalloc runs while any of them is active
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def requested_mode(query_value: Optional[str] = None) -> Optional[str]:
+    """Profiling mode from ?profile=... (DEBUG_MODE only) or PEERFOLIO_PROFILE; None when profiling is off"""
+    # Any visitor can set a query parameter, so outside debug mode only the operator's environment counts
+    if not DEBUG_MODE:
+        query_value = None
+    value = (query_value or os.environ.get(PROFILE_ENV_VAR, '')).strip().lower()
+    if value in ('', '0', 'false', 'off', 'no'):
+        return None
+    return value if value in PROFILE_MODES else 'sample'
+
+
+def _acquire_tracemalloc():
+    """Start tracemalloc for the first concurrent profile, unless something else already traces"""
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc():
+    """Stop tracemalloc when the last concurrent profile that needed it finishes"""
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def _frame_key(frame) -> FrameKey:
+    code = frame.f_code
+    return code.co_name, code.co_filename, code.co_firstlineno
+
+
+def _stack(frame) -> List[FrameKey]:
+    """Root-first stack of frame keys"""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_key(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a background thread"""
+
+    def __init__(self, thread_id: int, interval_s: float, skip_depth: int = 0):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.skip_depth = skip_depth  # Outer frames (Streamlit runner etc.) trimmed from every sample
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="peerfolio-stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = _stack(frame)[self.skip_depth:]
+                if stack:
+                    self.samples[tuple(stack)] += 1
+
+
+def _label(key: FrameKey) -> str:
+    name, filename, line = key
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(samples: Counter) -> str:
+    """Brendan Gregg's folded format: 'root;child;leaf count' per line"""
+    return ''.join(
+        f"{';'.join(_label(key) for key in stack)} {count}\n"
+        for stack, count in samples.most_common()
+    )
+
+
+def speedscope_profile(samples: Counter, name: str, interval_ms: float) -> Dict:
+    """Sampled profile in the speedscope file format"""
+    frames: List[Dict] = []
+    index: Dict[FrameKey, int] = {}
+    stacks, weights = [], []
+    for stack, count in samples.items():
+        ids = []
+        for key in stack:
+            if key not in index:
+                index[key] = len(frames)
+                frames.append({'name': key[0], 'file': key[1], 'line': key[2]})
+            ids.append(index[key])
+        stacks.append(ids)
+        weights.append(count * interval_ms)
+
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'peerfolio',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': stacks,
+            'weights': weights
+        }]
+    }
+
+
+def top_sampled_functions(samples: Counter, interval_ms: float, top_n: int = PROFILE_TOP_N) -> List[Dict]:
+    """Functions ranked by self time (leaf samples), with inclusive time alongside"""
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    for stack, count in samples.items():
+        self_counts[stack[-1]] += count
+        for key in set(stack):
+            total_counts[key] += count
+    return [
+        {
+            'function': _label(key),
+            'self_ms': count * interval_ms,
+            'total_ms': total_counts[key] * interval_ms
+        }
+        for key, count in self_counts.most_common(top_n)
+    ]
+
+
+def top_cprofile_functions(profiler: cProfile.Profile, top_n: int = PROFILE_TOP_N) -> List[Dict]:
+    stats = pstats.Stats(profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:top_n]  # By internal time
+    return [
+        {
+            'function': f"{name} ({os.path.basename(filename)}:{line})",
+            'calls': calls,
+            'self_ms': tottime * 1000,
+            'total_ms': cumtime * 1000
+        }
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in rows
+    ]
+
+
+def top_allocations(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot,
+                    top_n: int = PROFILE_TOP_N) -> List[Dict]:
+    """Source lines that grew the most while the page rendered"""
+    # The sampler thread allocates while recording stacks; keep it out of the page's numbers
+    own = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+    before, after = before.filter_traces(own), after.filter_traces(own)
+    return [
+        {
+            'location': f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            'size_kb': stat.size_diff / 1024,
+            'count': stat.count_diff
+        }
+        for stat in after.compare_to(before, 'lineno')[:top_n]
+        if stat.size_diff > 0
+    ]
+
+
+class PageProfile:
+    """Profiles one page render and writes flamegraph-ready output under PROFILE_OUTPUT_DIR/<page>/"""
+
+    def __init__(self, page: str, mode: str = 'sample', output_dir: str = PROFILE_OUTPUT_DIR,
+                 interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS):
+        self.page = page
+        self.mode = mode
+        self.output_dir = os.path.join(output_dir, re.sub(r'[^A-Za-z0-9]+', '_', page).strip('_').lower())
+        self.interval_ms = interval_ms
+        self.report: Dict = {}
+
+    def start(self, caller_depth: int):
+        # Shared with concurrent profiles, so peaks and allocations can include other sessions' renders
+        _acquire_tracemalloc()
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+
+        self._sampler = StackSampler(threading.get_ident(), self.interval_ms / 1000, caller_depth)
+        self._profiler = cProfile.Profile() if self.mode == 'cprofile' else None
+        self._start = time.perf_counter()
+        self._sampler.start()
+        if self._profiler:
+            self._profiler.enable()
+
+    def stop(self):
+        if self._profiler:
+            self._profiler.disable()
+        self._sampler.stop()
+        wall_ms = (time.perf_counter() - self._start) * 1000
+
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        _release_tracemalloc()
+
+        samples = self._sampler.samples
+        self.report = {
+            'page': self.page,
+            'mode': self.mode,
+            'wall_ms': wall_ms,
+            'samples': sum(samples.values()),
+            'peak_kb': peak / 1024,
+            'top_functions': (top_cprofile_functions(self._profiler) if self._profiler
+                              else top_sampled_functions(samples, self.interval_ms)),
+            'top_allocations': top_allocations(self._before, after),
+            'files': self._write(samples)
+        }
+        self._before = None
+
+    def _write(self, samples: Counter) -> List[str]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+        files = [f"{base}.collapsed", f"{base}.speedscope.json"]
+
+        with open(files[0], 'w') as f:
+            f.write(collapsed_stacks(samples))
+        with open(files[1], 'w') as f:
+            json.dump(speedscope_profile(samples, self.page, self.interval_ms), f)
+        if self._profiler:
+            files.append(f"{base}.prof")
+            self._profiler.dump_stats(files[-1])
+        return files
+
+
+def render_profile_panel(sidebar, report: Dict):
+    """Render the top offenders of a profiled page render into a Streamlit sidebar"""
+    with sidebar.expander("🔬 Profile", expanded=True) as panel:
+        panel.caption(
+            f"{report['page']} ({report['mode']}): {report['wall_ms']:,.0f} ms, "
+            f"{report['samples']} samples, peak {report['peak_kb']:,.0f} KB traced"
+        )
+        if report['top_functions']:
+            panel.markdown("**Hottest functions**")
+            functions = pd.DataFrame(report['top_functions']).round({'self_ms': 1, 'total_ms': 1})
+            panel.dataframe(functions, use_container_width=True, hide_index=True)
+        if report['top_allocations']:
+            panel.markdown("**Largest allocations**")
+            allocations = pd.DataFrame(report['top_allocations']).round({'size_kb': 1})
+            panel.dataframe(allocations, use_container_width=True, hide_index=True)
+        for path in report['files']:
+            panel.caption(f"Wrote {path}")
+
+
+@contextmanager
+def page_profiler(page: str, mode: Optional[str]):
+    """Profile the enclosed page render when mode is set; yields the PageProfile or None"""
+    if mode is None:
+        yield None
+        return
+
+    profile = PageProfile(page, mode)
+    # Samples start at the frame that opened this block, dropping the runner frames above it
+    caller = sys._getframe(2)
+    profile.start(len(_stack(caller)) - 1)
+    try:
+        yield profile
+    finally:
+        profile.stop()
@@ -0,0 +1,225 @@
+import bisect
+import itertools
+import math
+import random
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from config.settings import QUANTILE_SKETCH_K
+
+
+class KLLSketch:
+    """Mergeable KLL quantile sketch; rank error is about 1.65/k of the stream length"""
+
+    def __init__(self, k: int = QUANTILE_SKETCH_K, seed: Optional[int] = None):
+        self.k = k
+        self.n = 0
+        self._levels: List[List[float]] = [[]]  # Items at level h stand for 2**h inputs each
+        self._retained = 0
+        self._limit = self._max_size()
+        self._rng = random.Random(seed)
+        self._index: Optional[Tuple[List[float], List[int]]] = None
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], k: int = QUANTILE_SKETCH_K,
+                    seed: Optional[int] = None) -> 'KLLSketch':
+        sketch = cls(k, seed)
+        for value in values:
+            sketch.update(value)
+        return sketch
+
+    def __len__(self) -> int:
+        return self.n
+
+    def copy(self) -> 'KLLSketch':
+        """Independent sketch in the same state; updating either leaves the other unchanged"""
+        sketch = KLLSketch.__new__(KLLSketch)
+        sketch.k, sketch.n, sketch._retained, sketch._limit = self.k, self.n, self._retained, self._limit
+        sketch._levels = [list(items) for items in self._levels]
+        sketch._rng = random.Random()
+        sketch._rng.setstate(self._rng.getstate())
+        sketch._index = self._index  # Replaced on change, never mutated, so it can be shared
+        return sketch
+
+    def _capacity(self, level: int) -> int:
+        # Lower levels shrink geometrically (c = 2/3); the top level keeps k items
+        depth = len(self._levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self._levels)))
+
+    def update(self, value: float):
+        self._levels[0].append(float(value))
+        self.n += 1
+        self._retained += 1
+        self._index = None
+        if self._retained >= self._limit:
+            self._compress()
+
+    def _compress(self):
+        while self._retained >= self._limit:
+            for level, items in enumerate(self._levels):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self._levels):
+                        self._levels.append([])
+                        self._limit = self._max_size()
+                    items.sort()
+                    # An odd leftover stays behind so the promoted pairs keep exact weight
+                    keep = items.pop() if len(items) % 2 else None
+                    offset = self._rng.randint(0, 1)
+                    promoted = items[offset::2]
+                    self._levels[level + 1].extend(promoted)
+                    self._levels[level] = [keep] if keep is not None else []
+                    self._retained -= len(items) - len(promoted)
+                    break
+
+    def merge(self, other: 'KLLSketch'):
+        """Fold another sketch into this one in place"""
+        while len(self._levels) < len(other._levels):
+            self._levels.append([])
+        self._limit = self._max_size()
+        for level, items in enumerate(other._levels):
+            self._levels[level].extend(items)
+        self.n += other.n
+        self._retained += other._retained
+        self._index = None
+        self._compress()
+
+    @classmethod
+    def merged(cls, sketches: Iterable['KLLSketch'], k: int = QUANTILE_SKETCH_K) -> 'KLLSketch':
+        """New sketch summarizing all inputs; the inputs are left unchanged"""
+        result = cls(k, seed=0)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    def _sorted(self) -> Tuple[List[float], List[int]]:
+        # Built once per change, then every rank/quantile query is a binary search
+        if self._index is None:
+            weighted = sorted(
+                (value, 1 << level) for level, items in enumerate(self._levels) for value in items
+            )
+            values = [value for value, _ in weighted]
+            cumulative = list(itertools.accumulate(weight for _, weight in weighted))
+            self._index = (values, cumulative)
+        return self._index
+
+    def rank(self, value: float) -> float:
+        """Estimated fraction of inputs less than or equal to value"""
+        if not self.n:
+            return float('nan')
+        values, cumulative = self._sorted()
+        position = bisect.bisect_right(values, value)
+        return cumulative[position - 1] / cumulative[-1] if position else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimated value at fraction q (0-1) of the inputs"""
+        if not self.n:
+            return float('nan')
+        values, cumulative = self._sorted()
+        target = q * cumulative[-1]
+        return values[min(bisect.bisect_left(cumulative, target), len(values) - 1)]
+
+
+class NetSketch:
+    """Inputs of one sketch minus those of another, e.g. peers added minus peers since removed"""
+
+    def __init__(self, added: KLLSketch, removed: KLLSketch):
+        self.added = added
+        self.removed = removed
+
+    def __len__(self) -> int:
+        return self.added.n - self.removed.n
+
+    def rank(self, value: float) -> float:
+        """Estimated fraction of the remaining inputs less than or equal to value"""
+        n = len(self)
+        if n <= 0:
+            return float('nan')
+        removed = self.removed.n * self.removed.rank(value) if self.removed.n else 0.0
+        return min(max((self.added.n * self.added.rank(value) - removed) / n, 0.0), 1.0)
+
+    def quantile(self, q: float) -> float:
+        """Estimated value at fraction q (0-1) of the remaining inputs"""
+        if len(self) <= 0:
+            return float('nan')
+        values, _ = self.added._sorted()
+        low, high = 0, len(values) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.rank(values[middle]) >= q:
+                high = middle
+            else:
+                low = middle + 1
+        return values[low]
+
+
+class CohortSketches:
+    """One sketch per finest cohort slice, merged on demand into coarser cohorts"""
+
+    def __init__(self, dimensions: List[str], k: int = QUANTILE_SKETCH_K):
+        self.dimensions = dimensions
+        self.k = k
+        self._slices: Dict[Tuple, KLLSketch] = {}
+        # KLL sketches cannot forget an input, so removals go to a second sketch per slice
+        self._removed: Dict[Tuple, KLLSketch] = {}
+        self._seeds: Dict[Tuple, int] = {}
+        self._owned: Optional[Set[Tuple[bool, Tuple]]] = None  # Sketches written since copy(); None = all
+
+    def copy(self) -> 'CohortSketches':
+        """Copy sharing every slice sketch until the copy first writes to it"""
+        sketches = CohortSketches(self.dimensions, self.k)
+        sketches._slices = dict(self._slices)
+        sketches._removed = dict(self._removed)
+        sketches._seeds = dict(self._seeds)
+        sketches._owned = set()
+        return sketches
+
+    def _writable(self, removed: bool, key: Tuple) -> KLLSketch:
+        slices = self._removed if removed else self._slices
+        sketch = slices.get(key)
+        if sketch is None:
+            # Seeded per slice so rebuilding the same peers gives the same sketches
+            sketch = slices[key] = KLLSketch(self.k, seed=self._seeds.setdefault(key, len(self._seeds)))
+        elif self._owned is not None and (removed, key) not in self._owned:
+            sketch = slices[key] = sketch.copy()
+        if self._owned is not None:
+            self._owned.add((removed, key))
+        return sketch
+
+    def add(self, key: Tuple, value: float):
+        self._writable(False, key).update(value)
+
+    def remove(self, key: Tuple, value: float):
+        """Take a previously added value out of the slice"""
+        self._writable(True, key).update(value)
+
+    def removed_fraction(self, key: Tuple) -> float:
+        """Removed inputs as a share of everything the slice sketch has seen"""
+        added, removed = self._slices.get(key), self._removed.get(key)
+        return removed.n / added.n if added is not None and removed is not None and added.n else 0.0
+
+    def rebuild(self, key: Tuple, values: Iterable[float]):
+        """Re-sketch a slice from its remaining values, dropping the error its removals added"""
+        self._slices[key] = KLLSketch.from_values(values, self.k, seed=self._seeds.setdefault(key, len(self._seeds)))
+        self._removed.pop(key, None)
+        if self._owned is not None:
+            self._owned.add((False, key))
+
+    def cohort(self, **filters) -> Union[KLLSketch, NetSketch]:
+        """Sketch for the slices matching every given dimension value (none given = all)"""
+        unknown = set(filters) - set(self.dimensions)
+        if unknown:
+            raise ValueError(f"Unknown cohort dimensions: {', '.join(sorted(unknown))}")
+        positions = [(self.dimensions.index(name), value) for name, value in filters.items()]
+        matching = [
+            key for key in self._slices
+            if all(key[position] == value for position, value in positions)
+        ]
+        removed = [self._removed[key] for key in matching if key in self._removed]
+        added = [self._slices[key] for key in matching]
+        if removed:
+            return NetSketch(KLLSketch.merged(added, self.k), KLLSketch.merged(removed, self.k))
+        if len(added) == 1:
+            return added[0]
+        return KLLSketch.merged(added, self.k)
@@ -0,0 +1,745 @@
+import time
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    SECTOR_CONCENTRATION_LIMIT, POSITION_CONCENTRATION_LIMIT, SECTOR_UNDERWEIGHT_RATIO,
+    MIN_DIVERSIFIED_POSITIONS, MIN_DIVERSIFICATION_SCORE, MIN_ESG_SCORE,
+    UNDERPERFORMER_RETURN, GROWTH_AGE_LIMIT, PRESERVATION_AGE_LIMIT,
+    NET_WORTH_RANGES, ALTERNATIVES_MIN_NET_WORTH, ADVANCED_TAX_MIN_NET_WORTH,
+    MAX_HARVEST_SUGGESTIONS, WASH_SALE_WINDOW_DAYS
+)
+from utils.stress_testing import STRESS_ENGINE
+
+# Target sector weights used to flag underweight sectors
+SECTOR_TARGETS = {
+    'Technology': 0.25,
+    'Healthcare': 0.20,
+    'Financial Services': 0.15,
+    'Consumer': 0.15,
+    'Real Estate': 0.10,
+    'Energy': 0.05,
+    'Other': 0.10
+}
+
+# Feature registry: name -> function(context, features)
+FEATURES: Dict[str, Callable] = {}
+
+
+def feature(name: str):
+    """Register a feature shared by all recommendation rules"""
+    def register(func):
+        FEATURES[name] = func
+        return func
+    return register
+
+
+def diversification_score_from_weights(weights: List[float]) -> float:
+    """Convert sector weights into a 0-10 score from the normalized Herfindahl index"""
+    if len(weights) == 0:
+        return 0.0
+    return diversification_score_from_herfindahl(float(np.sum(np.square(weights))), len(weights))
+
+
+def diversification_score_from_herfindahl(herfindahl: float, n_sectors: int) -> float:
+    """0-10 score for a Herfindahl index over n_sectors (live valuation keeps the index incrementally)"""
+    if n_sectors == 0:
+        return 0.0
+
+    max_herfindahl = 1.0  # Completely concentrated
+    min_herfindahl = 1.0 / n_sectors  # Perfectly diversified
+
+    if max_herfindahl == min_herfindahl:
+        return 10.0
+
+    normalized = (max_herfindahl - herfindahl) / (max_herfindahl - min_herfindahl)
+    return min(10.0, max(0.0, normalized * 10))
+
+
+def build_context(portfolio_df: Optional[pd.DataFrame], user_profile: Dict,
+                  analysis: Optional[Dict] = None, **extra) -> Dict:
+    """Bundle the inputs every feature may read from"""
+    context = {
+        'portfolio': portfolio_df,
+        'profile': user_profile or {},
+        'analysis': analysis or {}
+    }
+    context.update(extra)
+    return context
+
+
+class FeatureView:
+    """Lazily computes each feature at most once per evaluation"""
+
+    def __init__(self, context: Dict, seed: Optional[Dict] = None,
+                 profile: Optional[Callable] = None):
+        self.context = context
+        self._values = dict(seed or {})
+        self._profile = profile
+
+    def __getitem__(self, name: str):
+        if name not in self._values:
+            start = time.perf_counter()
+            self._values[name] = FEATURES[name](self.context, self)
+            if self._profile:
+                self._profile(f"feature:{name}", time.perf_counter() - start)
+        return self._values[name]
+
+
+class _TemplateScope(dict):
+    """Template namespace that falls back to features for unknown slots"""
+
+    def __init__(self, features: FeatureView, item: Optional[Dict] = None):
+        super().__init__(item or {})
+        self.features = features
+
+    def __missing__(self, key):
+        return self.features[key]
+
+
+class Rule:
+    """A declarative recommendation: a condition, a template and a priority"""
+
+    def __init__(self, name: str, condition: Callable, template: Union[str, Dict[str, str]],
+                 priority: int = 50, group: str = 'summary', foreach: Optional[str] = None,
+                 stop: bool = False, fallback: bool = False):
+        self.name = name
+        self.condition = condition
+        self.template = template
+        self.priority = priority
+        self.group = group
+        self.foreach = foreach  # Feature yielding one item per recommendation
+        self.stop = stop  # Suppress lower-priority rules in the group when fired
+        self.fallback = fallback  # Fire only when nothing else in the group fired
+
+    def render(self, features: FeatureView, item: Optional[Dict] = None):
+        scope = _TemplateScope(features, item)
+        if isinstance(self.template, dict):
+            return {key: text.format_map(scope) for key, text in self.template.items()}
+        return self.template.format_map(scope)
+
+    def fire(self, features: FeatureView) -> List:
+        """Evaluate the rule and return its rendered recommendations"""
+        if self.foreach is None:
+            return [self.render(features)] if self.condition(features) else []
+        return [
+            self.render(features, item)
+            for item in features[self.foreach]
+            if self.condition(features, item)
+        ]
+
+
+class RuleProfiler:
+    """Profile hook that accumulates evaluation time per rule and feature"""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = {}
+
+    def __call__(self, name: str, seconds: float):
+        self.timings.setdefault(name, []).append(seconds)
+
+    def report(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                'calls': len(samples),
+                'total_ms': sum(samples) * 1000,
+                'mean_ms': sum(samples) * 1000 / len(samples)
+            }
+            for name, samples in sorted(self.timings.items(), key=lambda x: -sum(x[1]))
+        }
+
+
+class RuleEngine:
+    """Compiles rules into a priority-ordered decision table per group"""
+
+    def __init__(self, rules: List[Rule], profile: Optional[Callable] = None):
+        self.profile = profile
+        self.table: Dict[str, List[Rule]] = {}
+
+        for rule in sorted(rules, key=lambda r: -r.priority):
+            if rule.foreach is not None and rule.foreach not in FEATURES:
+                raise ValueError(f"Rule '{rule.name}' iterates unknown feature '{rule.foreach}'")
+            self.table.setdefault(rule.group, []).append(rule)
+
+    def evaluate(self, context: Dict, groups: Optional[List[str]] = None,
+                 seed: Optional[Dict] = None, profile: Optional[Callable] = None) -> Dict[str, List]:
+        """Evaluate the requested groups, sharing one feature cache across all rules"""
+        profile = profile or self.profile
+        features = FeatureView(context, seed, profile)
+        results = {}
+
+        for group in groups or list(self.table):
+            fired = []
+            for rule in self.table.get(group, []):
+                if rule.fallback and fired:
+                    continue
+
+                start = time.perf_counter()
+                output = rule.fire(features)
+                if profile:
+                    profile(f"rule:{rule.name}", time.perf_counter() - start)
+
+                fired.extend(output)
+                if output and rule.stop:
+                    break
+            results[group] = fired
+
+        return results
+
+    def evaluate_group(self, group: str, context: Dict, seed: Optional[Dict] = None,
+                       profile: Optional[Callable] = None) -> List:
+        return self.evaluate(context, [group], seed, profile)[group]
+
+
+# ---------------------------------------------------------------------------
+# Features
+# ---------------------------------------------------------------------------
+
+@feature('holdings')
+def _holdings(ctx, f):
+    portfolio_df = ctx['portfolio']
+    return portfolio_df if portfolio_df is not None else pd.DataFrame(
+        columns=['Symbol', 'Shares', 'Purchase_Price', 'Current_Price']
+    )
+
+
+@feature('market_values')
+def _market_values(ctx, f):
+    holdings = f['holdings']
+    if 'Market_Value' in holdings.columns:
+        return holdings['Market_Value'].to_numpy(dtype=float)
+    return (holdings['Shares'] * holdings['Current_Price']).to_numpy(dtype=float)
+
+
+@feature('cost_basis')
+def _cost_basis(ctx, f):
+    holdings = f['holdings']
+    if 'Cost_Basis' in holdings.columns:
+        return holdings['Cost_Basis'].to_numpy(dtype=float)
+    return (holdings['Shares'] * holdings['Purchase_Price']).to_numpy(dtype=float)
+
+
+@feature('total_value')
+def _total_value(ctx, f):
+    return float(f['market_values'].sum())
+
+
+@feature('position_count')
+def _position_count(ctx, f):
+    return len(f['holdings'])
+
+
+@feature('returns_pct')
+def _returns_pct(ctx, f):
+    cost = f['cost_basis']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(cost > 0, (f['market_values'] - cost) / cost * 100, 0.0)
+
+
+@feature('largest_position')
+def _largest_position(ctx, f):
+    if f['total_value'] <= 0:
+        return {'symbol': None, 'weight': 0.0}
+    idx = int(np.argmax(f['market_values']))
+    return {
+        'symbol': f['holdings']['Symbol'].iloc[idx],
+        'weight': f['market_values'][idx] / f['total_value']
+    }
+
+
+@feature('largest_symbol')
+def _largest_symbol(ctx, f):
+    return f['largest_position']['symbol']
+
+
+@feature('largest_weight')
+def _largest_weight(ctx, f):
+    return f['largest_position']['weight']
+
+
+@feature('underperformers')
+def _underperformers(ctx, f):
+    mask = f['returns_pct'] < UNDERPERFORMER_RETURN
+    return f['holdings']['Symbol'][mask].tolist()
+
+
+@feature('underperformer_list')
+def _underperformer_list(ctx, f):
+    return ', '.join(f['underperformers'])
+
+
+@feature('sector_allocation')
+def _sector_allocation(ctx, f):
+    if ctx['analysis'].get('sector_allocation'):
+        return ctx['analysis']['sector_allocation']
+    sector_mapping = ctx.get('sector_mapping', {})
+    sectors = f['holdings']['Symbol'].map(lambda x: sector_mapping.get(x, 'Other'))
+    return pd.Series(f['market_values'], index=sectors.values).groupby(level=0).sum().to_dict()
+
+
+@feature('sector_weights')
+def _sector_weights(ctx, f):
+    allocation = f['sector_allocation']
+    total = sum(allocation.values())
+    if total <= 0:
+        return {}
+    return {sector: value / total for sector, value in allocation.items()}
+
+
+@feature('overweight_sectors')
+def _overweight_sectors(ctx, f):
+    overweight = []
+    for sector, weight in f['sector_weights'].items():
+        if weight > SECTOR_CONCENTRATION_LIMIT:
+            # Quantify the concentration: what this sector alone loses in its worst stress scenario
+            scenario, shock = STRESS_ENGINE.sector_worst(sector)
+            overweight.append({
+                'sector': sector, 'weight': weight,
+                'stress_scenario': scenario, 'stress_loss': max(-shock, 0.0) * weight
+            })
+    return overweight
+
+
+@feature('underweight_sectors')
+def _underweight_sectors(ctx, f):
+    weights = f['sector_weights']
+    if not weights:
+        return []
+    insights = ctx.get('sector_insights', {})
+    return [
+        {
+            'sector': sector,
+            'weight': weights.get(sector, 0.0),
+            'target': target,
+            'outlook': insights.get(sector, {}).get('outlook', 'Sector diversification benefits')
+        }
+        for sector, target in SECTOR_TARGETS.items()
+        if weights.get(sector, 0.0) < target * SECTOR_UNDERWEIGHT_RATIO
+    ]
+
+
+@feature('diversification_score')
+def _diversification_score(ctx, f):
+    if 'diversification_score' in ctx['analysis']:
+        return ctx['analysis']['diversification_score']
+    return diversification_score_from_weights(list(f['sector_weights'].values()))
+
+
+@feature('risk_level')
+def _risk_level(ctx, f):
+    if 'risk_level' in ctx['analysis']:
+        return ctx['analysis']['risk_level']
+    # Technology concentration is the risk proxy used across the app
+    tech_score = f['sector_weights'].get('Technology', 0.0) * 100
+    if tech_score < 30:
+        return "Low"
+    elif tech_score < 60:
+        return "Moderate"
+    return "High"
+
+
+@feature('esg_score')
+def _esg_score(ctx, f):
+    if 'esg_score' in ctx['analysis']:
+        return ctx['analysis']['esg_score']
+    if f['total_value'] <= 0:
+        return 5.0
+    esg_scores = ctx.get('esg_scores', {})
+    scores = f['holdings']['Symbol'].map(lambda x: esg_scores.get(x, 5.0)).to_numpy(dtype=float)
+    return float(np.dot(scores, f['market_values']) / f['total_value'])
+
+
+@feature('age')
+def _age(ctx, f):
+    return ctx['profile'].get('age', 35)
+
+
+@feature('age_band')
+def _age_band(ctx, f):
+    if f['age'] < GROWTH_AGE_LIMIT:
+        return 'growth'
+    elif f['age'] > PRESERVATION_AGE_LIMIT:
+        return 'preservation'
+    return 'accumulation'
+
+
+@feature('investment_style')
+def _investment_style(ctx, f):
+    return ctx['profile'].get('investment_style', 'Moderate')
+
+
+@feature('location')
+def _location(ctx, f):
+    return ctx['profile'].get('location', 'Singapore')
+
+
+@feature('net_worth_tier')
+def _net_worth_tier(ctx, f):
+    net_worth = ctx['profile'].get('net_worth', '$2.5M - $5M')
+    return NET_WORTH_RANGES.index(net_worth) if net_worth in NET_WORTH_RANGES else 0
+
+
+@feature('lot_summary')
+def _lot_summary(ctx, f):
+    # Present only when the analysis ran the lot-level cost basis engine
+    return ctx['analysis'].get('cost_basis')
+
+
+@feature('unrealized_losses')
+def _unrealized_losses(ctx, f):
+    return f['lot_summary']['unrealized_losses'] if f['lot_summary'] else 0.0
+
+
+@feature('short_term_losses')
+def _short_term_losses(ctx, f):
+    return f['lot_summary']['short_term_losses'] if f['lot_summary'] else 0.0
+
+
+@feature('undated_loss_note')
+def _undated_loss_note(ctx, f):
+    # Lots uploaded without a purchase date cannot be classed short or long term
+    undated = f['lot_summary'].get('undated_losses', 0.0) if f['lot_summary'] else 0.0
+    return f", ${undated:,.0f} with no purchase date and an unknown holding period" if undated > 0 else ''
+
+
+@feature('harvest_candidates')
+def _harvest_candidates(ctx, f):
+    candidates = ctx['analysis'].get('harvest_opportunities') or []
+    return [
+        {**item, 'replacements': item['replacements'] or 'a broad sector ETF'}
+        for item in candidates[:MAX_HARVEST_SUGGESTIONS]
+    ]
+
+
+@feature('repurchase_days')
+def _repurchase_days(ctx, f):
+    # A repurchase on the day after the wash sale window closes keeps the harvested loss
+    return WASH_SALE_WINDOW_DAYS + 1
+
+
+@feature('cost_basis_method')
+def _cost_basis_method(ctx, f):
+    return f['lot_summary']['method'].upper() if f['lot_summary'] else 'FIFO'
+
+
+_ALTERNATIVES_TIER = NET_WORTH_RANGES.index(ALTERNATIVES_MIN_NET_WORTH)
+_ADVANCED_TAX_TIER = NET_WORTH_RANGES.index(ADVANCED_TAX_MIN_NET_WORTH)
+
+
+# ---------------------------------------------------------------------------
+# Rule sets
+# ---------------------------------------------------------------------------
+
+# Summary recommendations rendered as markdown strings (analysis pages)
+SUMMARY_RULES = [
+    Rule(
+        'improve_diversification',
+        lambda f: (f['diversification_score'] < MIN_DIVERSIFICATION_SCORE
+                   or f['position_count'] < MIN_DIVERSIFIED_POSITIONS),
+        "🎯 **Improve Diversification**: Your portfolio is heavily concentrated. "
+        "Consider adding holdings from underrepresented sectors.",
+        priority=90
+    ),
+    Rule(
+        'reduce_sector_exposure',
+        lambda f, item: True,
+        "⚖️ **Reduce {sector} Exposure**: {weight:.1%} allocation is high; in a {stress_scenario} replay "
+        "this sector alone would cost {stress_loss:.1%} of the portfolio. "
+        "Consider rebalancing to reduce concentration risk.",
+        priority=80, foreach='overweight_sectors'
+    ),
+    Rule(
+        'position_sizing',
+        lambda f: f['largest_weight'] > POSITION_CONCENTRATION_LIMIT,
+        "⚠️ **Position Sizing**: {largest_symbol} represents {largest_weight:.1%} of your portfolio. "
+        "Consider reducing to under 20% to manage risk.",
+        priority=75
+    ),
+    Rule(
+        'risk_mismatch',
+        lambda f: f['risk_level'] == 'High' and f['investment_style'] == 'Conservative',
+        "🛡️ **Risk Mismatch**: Your portfolio has high risk but you prefer conservative investments. "
+        "Consider adding bonds or defensive stocks.",
+        priority=70
+    ),
+    Rule(
+        'esg_enhancement',
+        lambda f: f['investment_style'] == 'ESG-focused' and f['esg_score'] < MIN_ESG_SCORE,
+        "🌱 **ESG Enhancement**: Consider adding more sustainable investments "
+        "to align with your ESG preferences.",
+        priority=60
+    ),
+    Rule(
+        'review_underperformers',
+        lambda f: len(f['underperformers']) > 0,
+        "📉 **Review Underperformers**: {underperformer_list} are down significantly. "
+        "Consider if these align with your long-term thesis or if rebalancing is needed.",
+        priority=55
+    ),
+    Rule(
+        'growth_focus',
+        lambda f: f['age_band'] == 'growth',
+        "🚀 **Growth Focus**: At your age, consider increasing exposure to growth stocks "
+        "and emerging technologies for long-term wealth building.",
+        priority=50
+    ),
+    Rule(
+        'stability_focus',
+        lambda f: f['age_band'] == 'preservation',
+        "🏛️ **Stability Focus**: Consider increasing allocation to dividend-paying stocks "
+        "and bonds for income generation and capital preservation.",
+        priority=50
+    ),
+    Rule(
+        'alternative_investments',
+        lambda f: f['net_worth_tier'] >= _ALTERNATIVES_TIER,
+        "💎 **Alternative Investments**: With your net worth, consider adding alternative investments "
+        "like REITs, commodities, or private equity for further diversification.",
+        priority=40
+    ),
+    Rule(
+        'regional_exposure',
+        lambda f: f['location'] == 'Singapore',
+        "🌏 **Regional Exposure**: Consider adding Singapore REITs or Asian market ETFs "
+        "to capitalize on regional growth opportunities.",
+        priority=30
+    ),
+    Rule(
+        'well_balanced',
+        lambda f: True,
+        "✅ **Well-Balanced Portfolio**: Your portfolio shows good diversification "
+        "and aligns well with your investment profile.",
+        priority=0, fallback=True
+    )
+]
+
+# Structured recommendations grouped by category (AI advisor)
+ADVISOR_RULES = [
+    # Diversification
+    Rule(
+        'start_building',
+        lambda f: f['total_value'] == 0,
+        {
+            'title': 'Start Building Your Portfolio',
+            'description': 'Begin with a diversified foundation of 5-10 quality stocks across different sectors',
+            'rationale': 'Diversification reduces risk while maintaining growth potential',
+            'risk_level': 'Low'
+        },
+        priority=100, group='diversification', stop=True
+    ),
+    Rule(
+        'increase_position_count',
+        lambda f: f['position_count'] < MIN_DIVERSIFIED_POSITIONS,
+        {
+            'title': 'Increase Position Count',
+            'description': 'Add 3-5 more positions to improve diversification',
+            'rationale': 'Single-stock risk decreases significantly with more holdings',
+            'risk_level': 'Low'
+        },
+        priority=80, group='diversification'
+    ),
+    Rule(
+        'international_exposure',
+        lambda f: True,
+        {
+            'title': 'International Exposure',
+            'description': 'Consider adding 15-20% international equity exposure',
+            'rationale': 'Global diversification reduces correlation with domestic markets',
+            'risk_level': 'Medium'
+        },
+        priority=50, group='diversification'
+    ),
+    Rule(
+        'alternative_investments',
+        lambda f: f['net_worth_tier'] >= _ALTERNATIVES_TIER,
+        {
+            'title': 'Alternative Investments',
+            'description': 'Explore private equity, hedge funds, or real estate investments',
+            'rationale': 'High-net-worth individuals benefit from alternative asset diversification',
+            'risk_level': 'Medium-High'
+        },
+        priority=40, group='diversification'
+    ),
+
+    # Sector allocation
+    Rule(
+        'increase_sector_exposure',
+        lambda f, item: True,
+        {
+            'title': 'Increase {sector} Exposure',
+            'description': 'Current allocation: {weight:.1%}, Target: {target:.1%}',
+            'rationale': '{outlook}',
+            'risk_level': 'Medium'
+        },
+        priority=80, group='sector_allocation', foreach='underweight_sectors'
+    ),
+    Rule(
+        'reduce_sector_concentration',
+        lambda f, item: True,
+        {
+            'title': 'Reduce {sector} Concentration',
+            'description': 'Current allocation of {weight:.1%} is too high',
+            'rationale': 'High concentration increases portfolio risk; this sector alone would cost '
+                         '{stress_loss:.1%} of the portfolio in a {stress_scenario} replay',
+            'risk_level': 'High'
+        },
+        priority=70, group='sector_allocation', foreach='overweight_sectors'
+    ),
+
+    # Risk management
+    Rule(
+        'leverage_time_horizon',
+        lambda f: f['age_band'] == 'growth',
+        {
+            'title': 'Leverage Your Time Horizon',
+            'description': 'Consider 80-90% equity allocation for long-term growth',
+            'rationale': 'Young investors can weather market volatility for higher returns',
+            'risk_level': 'Medium-High'
+        },
+        priority=90, group='risk_management'
+    ),
+    Rule(
+        'increase_defensive_positions',
+        lambda f: f['age_band'] == 'preservation',
+        {
+            'title': 'Increase Defensive Positions',
+            'description': 'Consider 30-40% bonds and dividend stocks for income',
+            'rationale': 'Approaching retirement requires more capital preservation',
+            'risk_level': 'Low-Medium'
+        },
+        priority=90, group='risk_management'
+    ),
+    Rule(
+        'risk_profile_mismatch',
+        lambda f: f['risk_level'] == 'High' and f['investment_style'] == 'Conservative',
+        {
+            'title': 'Risk Profile Mismatch',
+            'description': 'Your portfolio risk exceeds your stated conservative preference',
+            'rationale': 'Alignment between risk tolerance and portfolio reduces stress and improves outcomes',
+            'risk_level': 'High'
+        },
+        priority=80, group='risk_management'
+    ),
+    Rule(
+        'dollar_cost_averaging',
+        lambda f: True,
+        {
+            'title': 'Implement Dollar-Cost Averaging',
+            'description': 'Make regular monthly investments to smooth market volatility',
+            'rationale': 'Systematic investing reduces timing risk and emotional decisions',
+            'risk_level': 'Low'
+        },
+        priority=10, group='risk_management'
+    ),
+
+    # ESG opportunities
+    Rule(
+        'clean_energy_etfs',
+        lambda f: f['investment_style'] == 'ESG-focused',
+        {
+            'title': 'Clean Energy ETFs',
+            'description': 'Add exposure to renewable energy and clean technology',
+            'rationale': 'ESG investing aligns with sustainability goals while capturing growth trends',
+            'risk_level': 'Medium'
+        },
+        priority=60, group='esg_opportunities'
+    ),
+    Rule(
+        'esg_screened_index_funds',
+        lambda f: f['investment_style'] == 'ESG-focused',
+        {
+            'title': 'ESG-Screened Index Funds',
+            'description': 'Replace traditional index funds with ESG-screened alternatives',
+            'rationale': 'Maintain diversification while excluding controversial industries',
+            'risk_level': 'Low'
+        },
+        priority=50, group='esg_opportunities'
+    ),
+    Rule(
+        'consider_esg_integration',
+        lambda f: f['investment_style'] != 'ESG-focused',
+        {
+            'title': 'Consider ESG Integration',
+            'description': 'ESG factors increasingly impact long-term returns',
+            'rationale': 'Companies with strong ESG practices often show better risk management',
+            'risk_level': 'Low'
+        },
+        priority=40, group='esg_opportunities'
+    ),
+
+    # Market timing
+    Rule(
+        'rebalance_quarterly',
+        lambda f: True,
+        {
+            'title': 'Rebalance Quarterly',
+            'description': 'Review and rebalance portfolio allocations every 3 months',
+            'rationale': 'Regular rebalancing maintains target allocations and captures market inefficiencies',
+            'risk_level': 'Low'
+        },
+        priority=90, group='market_timing'
+    ),
+    Rule(
+        'tax_loss_harvesting_lots',
+        lambda f: f['unrealized_losses'] > 0,
+        {
+            'title': 'Tax-Loss Harvesting',
+            'description': 'Harvest ${unrealized_losses:,.0f} of unrealized lot losses '
+                           '(${short_term_losses:,.0f} short term{undated_loss_note}) to offset gains',
+            'rationale': 'Lot-level {cost_basis_method} cost basis shows exactly which lots to sell',
+            'risk_level': 'Low'
+        },
+        priority=80, group='market_timing'
+    ),
+    Rule(
+        'harvest_position',
+        lambda f, item: True,
+        {
+            'title': 'Harvest {symbol} Losses',
+            'description': 'Sell {shares:,.0f} shares from {lots} tax lot(s) to realize ${loss:,.0f} of losses '
+                           '(~${tax_value:,.0f} tax value)',
+            'rationale': 'Saves {tax_value_per_dollar:.1%} of the amount traded; '
+                         'hold {replacements} for {repurchase_days} days to stay invested without a wash sale',
+            'risk_level': 'Low'
+        },
+        priority=75, group='market_timing', foreach='harvest_candidates'
+    ),
+    Rule(
+        'tax_loss_harvesting',
+        lambda f: f['lot_summary'] is None,
+        {
+            'title': 'Tax-Loss Harvesting',
+            'description': 'Realize losses to offset gains for tax efficiency',
+            'rationale': 'Tax-loss harvesting can add 0.5-1% annually to after-tax returns',
+            'risk_level': 'Low'
+        },
+        priority=80, group='market_timing'
+    ),
+    Rule(
+        'tax_advantaged_structures',
+        lambda f: f['net_worth_tier'] >= _ADVANCED_TAX_TIER,
+        {
+            'title': 'Tax-Advantaged Structures',
+            'description': 'Explore family offices, trusts, or offshore structures',
+            'rationale': 'High-net-worth individuals benefit from sophisticated tax planning',
+            'risk_level': 'Low'
+        },
+        priority=70, group='market_timing'
+    ),
+    Rule(
+        'direct_indexing',
+        lambda f: f['net_worth_tier'] >= _ADVANCED_TAX_TIER,
+        {
+            'title': 'Direct Indexing',
+            'description': 'Consider direct stock ownership for tax customization',
+            'rationale': 'Direct indexing allows tax-loss harvesting at the individual stock level',
+            'risk_level': 'Medium'
+        },
+        priority=60, group='market_timing'
+    )
+]
+
+SUMMARY_ENGINE = RuleEngine(SUMMARY_RULES)
+ADVISOR_ENGINE = RuleEngine(ADVISOR_RULES)
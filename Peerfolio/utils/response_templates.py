@@ -0,0 +1,89 @@
+import sys
+import threading
+from collections import OrderedDict
+from string import Formatter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Rendered responses kept per template (one entry per distinct slot-value tuple)
+RENDER_CACHE_SIZE = 256
+
+
+class ResponseTemplate:
+    """Advisor response parsed once into interned constant segments and named slots"""
+
+    def __init__(self, text: str, cache_size: int = RENDER_CACHE_SIZE):
+        # Segments are either constant text (str) or slots (field, format spec, conversion)
+        self.segments: List = []
+        slot_names = []
+
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if literal:
+                self.segments.append(sys.intern(literal))
+            if field is not None:
+                self.segments.append((field, spec or '', conversion))
+                if field not in slot_names:
+                    slot_names.append(field)
+
+        self.slots: Tuple[str, ...] = tuple(slot_names)
+        self.cache_size = cache_size
+        self._rendered: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _chunks(self, key: Tuple) -> Iterator[str]:
+        values = dict(zip(self.slots, key))
+        for segment in self.segments:
+            if isinstance(segment, str):
+                yield segment
+                continue
+
+            field, spec, conversion = segment
+            value = values[field]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 's':
+                value = str(value)
+            yield format(value, spec)
+
+    def _lookup(self, key: Tuple) -> Optional[str]:
+        with self._lock:
+            text = self._rendered.get(key)
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._rendered.move_to_end(key)
+            return text
+
+    def _store(self, key: Tuple, text: str):
+        with self._lock:
+            self._rendered[key] = text
+            if len(self._rendered) > self.cache_size:
+                self._rendered.popitem(last=False)
+
+    def _key(self, values: Dict) -> Tuple:
+        return tuple(values[name] for name in self.slots)
+
+    def render(self, **values) -> str:
+        """Render the full response, memoized per slot-value tuple"""
+        key = self._key(values)
+        text = self._lookup(key)
+        if text is None:
+            text = ''.join(self._chunks(key))
+            self._store(key, text)
+        return text
+
+    def stream(self, **values) -> Iterator[str]:
+        """Yield the response chunk by chunk so the UI can start painting early"""
+        key = self._key(values)
+        text = self._lookup(key)
+        if text is not None:
+            yield text
+            return
+
+        chunks = []
+        for chunk in self._chunks(key):
+            chunks.append(chunk)
+            yield chunk
+        self._store(key, ''.join(chunks))
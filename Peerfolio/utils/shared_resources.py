@@ -0,0 +1,76 @@
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from utils.portfolio_analyzer import PortfolioAnalyzer
+from utils.peer_matcher import PeerMatcher
+from utils.ai_advisor import AIAdvisor
+
+
+class ResourceRegistry:
+    """Process-wide registry of expensive singletons with construction statistics"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable] = {}
+        self._instances: Dict[str, object] = {}
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable):
+        """Register a zero-argument factory under a resource name"""
+        with self._lock:
+            self._factories[name] = factory
+            self._stats[name] = {
+                'resource': name,
+                'constructed': False,
+                'construction_ms': 0.0,
+                'constructed_at': None,
+                'reuse_count': 0
+            }
+
+    def get(self, name: str):
+        """Return the shared instance, constructing it on first use"""
+        return self._ensure(name, count_reuse=True)
+
+    def warm_up(self, names: Optional[List[str]] = None) -> Dict[str, object]:
+        """Construct resources ahead of the first user interaction"""
+        return {name: self._ensure(name, count_reuse=False) for name in names or list(self._factories)}
+
+    def reset(self, name: str):
+        """Drop a shared instance so the next access rebuilds it"""
+        with self._lock:
+            self._instances.pop(name, None)
+            self._stats[name].update({
+                'constructed': False,
+                'construction_ms': 0.0,
+                'constructed_at': None,
+                'reuse_count': 0
+            })
+
+    def _ensure(self, name: str, count_reuse: bool):
+        with self._lock:
+            if name in self._instances:
+                if count_reuse:
+                    self._stats[name]['reuse_count'] += 1
+                return self._instances[name]
+
+            start = time.perf_counter()
+            instance = self._factories[name]()
+            self._instances[name] = instance
+            self._stats[name].update({
+                'constructed': True,
+                'construction_ms': (time.perf_counter() - start) * 1000,
+                'constructed_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+            return instance
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [dict(stat) for stat in self._stats.values()]
+
+
+SHARED_RESOURCES = ResourceRegistry()
+SHARED_RESOURCES.register('portfolio_analyzer', PortfolioAnalyzer)
+SHARED_RESOURCES.register('peer_matcher', PeerMatcher)
+SHARED_RESOURCES.register('ai_advisor', AIAdvisor)
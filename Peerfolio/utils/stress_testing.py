@@ -0,0 +1,237 @@
+import argparse
+import hashlib
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import CACHE_ENABLED, STRESS_CHUNK_PORTFOLIOS, STRESS_SCENARIOS_PATH
+from utils.analysis_cache import ANALYSIS_CACHE
+
+MARKET = 'Market'
+STRESS_SECTORS = [
+    'Technology', 'Communication Services', 'Consumer Discretionary', 'Consumer', 'Consumer Staples',
+    'Financial Services', 'Healthcare', 'Energy', 'Real Estate', 'Utilities', 'Other'
+]
+# Market beta per sector; a scenario's market move reaches every sector it does not shock explicitly
+SECTOR_BETAS = {
+    'Technology': 1.2, 'Communication Services': 1.0, 'Consumer Discretionary': 1.15, 'Consumer': 1.0,
+    'Consumer Staples': 0.6, 'Financial Services': 1.1, 'Healthcare': 0.8, 'Energy': 1.0, 'Real Estate': 0.9,
+    'Utilities': 0.5, 'Other': 1.0
+}
+# Scenario -> (kind, moves in %): peak-to-trough sector moves for historical episodes, factor moves otherwise
+SCENARIO_LIBRARY = {
+    '2008 Financial Crisis': ('Historical', {
+        MARKET: -55, 'Financial Services': -80, 'Real Estate': -70, 'Consumer Discretionary': -58,
+        'Technology': -53, 'Energy': -52, 'Communication Services': -48, 'Utilities': -45, 'Healthcare': -38,
+        'Consumer Staples': -32
+    }),
+    '2020 COVID Crash': ('Historical', {
+        MARKET: -34, 'Energy': -58, 'Financial Services': -43, 'Real Estate': -40, 'Utilities': -36,
+        'Consumer Discretionary': -33, 'Technology': -30, 'Communication Services': -29, 'Healthcare': -28,
+        'Consumer Staples': -24
+    }),
+    '2000-02 Dot-com Bust': ('Historical', {
+        MARKET: -49, 'Technology': -82, 'Communication Services': -72, 'Consumer Discretionary': -40,
+        'Healthcare': -32, 'Energy': -30, 'Financial Services': -25, 'Utilities': -50, 'Consumer Staples': -5,
+        'Real Estate': 10
+    }),
+    '2022 Rate Shock': ('Historical', {
+        MARKET: -25, 'Communication Services': -44, 'Consumer Discretionary': -39, 'Technology': -34,
+        'Real Estate': -31, 'Financial Services': -22, 'Healthcare': -12, 'Consumer Staples': -8, 'Utilities': -6,
+        'Energy': 45
+    }),
+    '1987 Black Monday': ('Historical', {MARKET: -20}),
+    'Equity Market -20%': ('Hypothetical', {MARKET: -20}),
+    'Tech Selloff': ('Hypothetical', {
+        MARKET: -10, 'Technology': -35, 'Communication Services': -25, 'Consumer Discretionary': -18
+    }),
+    'Rates +200bp': ('Hypothetical', {
+        MARKET: -12, 'Real Estate': -25, 'Utilities': -20, 'Technology': -20, 'Financial Services': 2
+    }),
+    'Oil Price Shock': ('Hypothetical', {MARKET: -8, 'Energy': 30, 'Consumer Discretionary': -15}),
+    'Broad Rally +15%': ('Hypothetical', {MARKET: 15})
+}
+
+
+def read_scenarios(path: str = STRESS_SCENARIOS_PATH) -> Dict[str, Tuple[str, Dict[str, float]]]:
+    """Scenario library from a long-format scenario, kind, factor, shock (%) CSV; factor is a sector or Market"""
+    rows = pd.read_csv(path)
+    return {
+        str(name): (str(group['kind'].iloc[0]), dict(zip(group['factor'].astype(str), group['shock'].astype(float))))
+        for name, group in rows.groupby('scenario', sort=False)
+    }
+
+
+class StressEngine:
+    """Scenario shocks (scenarios x sectors) applied to sector exposures (portfolios x sectors) by one matmul"""
+
+    def __init__(self, names: List[str], kinds: List[str], shocks: np.ndarray, sectors: List[str] = STRESS_SECTORS):
+        self.names = list(names)
+        self.kinds = list(kinds)
+        self.sectors = list(sectors)
+        self.shocks = np.asarray(shocks, dtype=float)  # Fractional moves, e.g. -0.55
+        self.shocks.flags.writeable = False
+        self._index = pd.Index(self.sectors)
+        self._other = self._index.get_loc('Other')
+        # Deepest scenario per sector, looked up once per overweight sector by the recommendation rules
+        worst = self.shocks.argmin(axis=0)
+        self._sector_worst = {
+            sector: (self.names[row], float(self.shocks[row, column]))
+            for column, (sector, row) in enumerate(zip(self.sectors, worst))
+        }
+        # Cached results are keyed by the scenario set as well as the holdings
+        digest = hashlib.blake2b(self.shocks.tobytes(), digest_size=8)
+        digest.update('\0'.join(self.names).encode())
+        self._digest = digest.hexdigest()
+
+    @classmethod
+    def from_moves(cls, scenarios: Dict[str, Tuple[str, Dict[str, float]]],
+                   sectors: List[str] = STRESS_SECTORS) -> 'StressEngine':
+        """Expand (kind, {factor: move %}) scenarios; unlisted sectors move with the market via SECTOR_BETAS"""
+        index = pd.Index(sectors)
+        betas = np.array([SECTOR_BETAS.get(sector, 1.0) for sector in sectors])
+        shocks = np.empty((len(scenarios), len(sectors)))
+        for row, (name, (kind, moves)) in enumerate(scenarios.items()):
+            shocks[row] = moves.get(MARKET, 0.0) * betas
+            sector_moves = {sector: move for sector, move in moves.items() if sector != MARKET}
+            columns = index.get_indexer(list(sector_moves))
+            if (columns < 0).any():
+                unknown = [sector for sector, column in zip(sector_moves, columns) if column < 0]
+                raise ValueError(f"Scenario '{name}' shocks unknown sectors: {', '.join(unknown)}")
+            shocks[row, columns] = list(sector_moves.values())
+        kinds = [kind for kind, _ in scenarios.values()]
+        return cls(list(scenarios), kinds, shocks / 100, sectors)
+
+    @classmethod
+    def load(cls, path: str = STRESS_SCENARIOS_PATH) -> 'StressEngine':
+        return cls.from_moves(read_scenarios(path) if os.path.exists(path) else SCENARIO_LIBRARY)
+
+    def with_simulated(self, n_scenarios: int, seed: int = 0) -> 'StressEngine':
+        """The library plus n Monte Carlo factor scenarios: a market draw through SECTOR_BETAS and sector noise"""
+        rng = np.random.default_rng(seed)
+        betas = np.array([SECTOR_BETAS.get(sector, 1.0) for sector in self.sectors])
+        market = rng.normal(-0.05, 0.15, n_scenarios)
+        simulated = np.maximum(market[:, None] * betas + rng.normal(0.0, 0.08, (n_scenarios, len(betas))), -1.0)
+        names = [f"Simulated {i + 1:0{len(str(n_scenarios))}d}" for i in range(n_scenarios)]
+        return StressEngine(
+            self.names + names, self.kinds + ['Simulated'] * n_scenarios,
+            np.vstack([self.shocks, simulated]), self.sectors
+        )
+
+    def exposures(self, sectors, market_values: np.ndarray, portfolio_codes: np.ndarray = None,
+                  n_portfolios: int = None) -> np.ndarray:
+        """Portfolios x sectors exposure matrix from holding rows in one bincount; unknown sectors count as Other"""
+        columns = self._index.get_indexer(np.asarray(sectors, dtype=object))
+        columns[columns < 0] = self._other
+        if portfolio_codes is None:
+            portfolio_codes = np.zeros(len(columns), dtype=int)
+            n_portfolios = 1
+        elif n_portfolios is None:
+            n_portfolios = int(portfolio_codes.max()) + 1 if len(portfolio_codes) else 0
+        flat = np.asarray(portfolio_codes) * len(self.sectors) + columns
+        size = n_portfolios * len(self.sectors)
+        totals = np.bincount(flat, weights=np.asarray(market_values, dtype=float), minlength=size)
+        return totals.reshape(n_portfolios, len(self.sectors))
+
+    def book_exposures(self, holdings: pd.DataFrame, sector_mapping: Dict[str, str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(portfolio ids, exposure matrix) for long-format portfolio_id, Symbol, Shares, Current_Price rows"""
+        codes, ids = pd.factorize(holdings['portfolio_id'], sort=True)
+        # Map each distinct symbol once; books repeat the same few thousand tickers across millions of rows
+        symbol_codes, symbols = pd.factorize(holdings['Symbol'])
+        sectors = symbols.map(sector_mapping).fillna('Other').to_numpy(dtype=object)[symbol_codes]
+        market_values = holdings['Shares'].to_numpy(dtype=float) * holdings['Current_Price'].to_numpy(dtype=float)
+        return np.asarray(ids), self.exposures(sectors, market_values, codes, len(ids))
+
+    def _cached(self, name: str, positions: np.ndarray, compute):
+        """compute(), memoized until the positions (or the scenario set) change"""
+        if not CACHE_ENABLED:
+            return compute()
+        digest = hashlib.blake2b(np.ascontiguousarray(positions).tobytes(), digest_size=16)
+        digest.update(repr(positions.shape).encode())
+        key = f"stress:{name}:{self._digest}:{digest.hexdigest()}"
+        result = ANALYSIS_CACHE.get(key)
+        if result is None:
+            result = compute()
+            ANALYSIS_CACHE.put(key, result)
+        return result
+
+    def pnl(self, positions: np.ndarray) -> np.ndarray:
+        """P&L of every portfolio under every scenario (portfolios x scenarios), in exposure currency"""
+        positions = np.atleast_2d(np.asarray(positions, dtype=float))
+        return self._cached('pnl', positions, lambda: positions @ self.shocks.T)
+
+    def book_pnl(self, positions: np.ndarray) -> pd.Series:
+        """Aggregate P&L of the whole book per scenario; linear, so one product with the summed exposures"""
+        totals = np.atleast_2d(np.asarray(positions, dtype=float)).sum(axis=0)
+        return pd.Series(self.shocks @ totals, index=pd.Index(self.names, name='scenario'), name='pnl')
+
+    def worst_case(self, positions: np.ndarray, chunk_size: int = STRESS_CHUNK_PORTFOLIOS) -> pd.DataFrame:
+        """Worst scenario per portfolio; chunks bound the portfolios x scenarios P&L matrix for the full book"""
+        positions = np.atleast_2d(np.asarray(positions, dtype=float))
+
+        def compute() -> pd.DataFrame:
+            worst = np.empty(len(positions), dtype=int)
+            worst_pnl = np.empty(len(positions))
+            for start in range(0, len(positions), chunk_size):
+                pnl = positions[start:start + chunk_size] @ self.shocks.T
+                worst[start:start + chunk_size] = pnl.argmin(axis=1)
+                worst_pnl[start:start + chunk_size] = pnl[np.arange(len(pnl)), worst[start:start + chunk_size]]
+            value = positions.sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                worst_pct = np.where(value > 0, worst_pnl / value * 100, 0.0)
+            return pd.DataFrame({
+                'value': value,
+                'worst_scenario': np.asarray(self.names, dtype=object)[worst],
+                'worst_pnl': worst_pnl,
+                'worst_pnl_pct': worst_pct
+            })
+
+        return self._cached('worst_case', positions, compute)
+
+    def report(self, exposures: np.ndarray) -> Dict:
+        """Every scenario for one portfolio, worst first, with the sector split of the worst one"""
+        exposures = np.asarray(exposures, dtype=float).ravel()
+        pnl = self.pnl(exposures)[0]
+        value = exposures.sum()
+        order = np.argsort(pnl, kind='stable')
+        pct = pnl / value * 100 if value else np.zeros_like(pnl)
+        worst = order[0]
+        sector_pnl = exposures * self.shocks[worst]
+        return {
+            'scenarios': [
+                {'scenario': self.names[i], 'kind': self.kinds[i], 'pnl': float(pnl[i]), 'pnl_pct': float(pct[i])}
+                for i in order
+            ],
+            'worst_scenario': self.names[worst],
+            'worst_pnl': float(pnl[worst]),
+            'worst_pnl_pct': float(pct[worst]),
+            'worst_sector_pnl': {
+                sector: float(loss) for sector, loss, exposure in zip(self.sectors, sector_pnl, exposures) if exposure
+            }
+        }
+
+    def sector_worst(self, sector: str) -> Tuple[str, float]:
+        """Scenario with the deepest move for one sector, and that move (fraction); unknown sectors count as Other"""
+        return self._sector_worst.get(sector) or self._sector_worst['Other']
+
+
+STRESS_ENGINE = StressEngine.load()
+
+
+if __name__ == "__main__":
+    from utils.portfolio_analyzer import PortfolioAnalyzer
+
+    parser = argparse.ArgumentParser(description="Stress every portfolio in a load-test book")
+    parser.add_argument("--book", default=os.path.join("data", "load_test"), help="Directory with holdings.parquet")
+    parser.add_argument("--simulated", type=int, default=1000, help="Monte Carlo scenarios added to the library")
+    args = parser.parse_args()
+
+    engine = STRESS_ENGINE.with_simulated(args.simulated)
+    holdings = pd.read_parquet(os.path.join(args.book, "holdings.parquet"))
+    ids, positions = engine.book_exposures(holdings, PortfolioAnalyzer().sector_mapping)
+    worst = engine.worst_case(positions)
+    print(f"{len(ids):,} portfolios x {len(engine.names):,} scenarios")
+    print(worst['worst_pnl_pct'].describe(percentiles=[0.05, 0.5, 0.95]).round(2).to_string())
+    print(engine.book_pnl(positions).sort_values().head(10).round(0).to_string())
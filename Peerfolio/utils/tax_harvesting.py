@@ -0,0 +1,162 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import (
+    WASH_SALE_WINDOW_DAYS, SHORT_TERM_TAX_RATE, LONG_TERM_TAX_RATE,
+    MIN_HARVEST_LOSS, MAX_HARVEST_REPLACEMENTS
+)
+
+
+class WashSaleIndex:
+    """Purchase dates sorted by (symbol, date) so window lookups are two binary searches"""
+
+    def __init__(self, symbols: np.ndarray, dates: np.ndarray):
+        self.codes, self.universe = pd.factorize(pd.Series(symbols, dtype=object), sort=True)
+        days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+        valid = ~np.isnat(np.asarray(dates, dtype='datetime64[D]'))
+        # One sortable int64 key per purchase: symbol code in the high bits, day number in the low
+        self.keys = np.sort(self._key(self.codes[valid], days[valid]))
+
+    @staticmethod
+    def _key(codes: np.ndarray, days: np.ndarray) -> np.ndarray:
+        return (codes.astype(np.int64) << 32) + (days + (1 << 31))
+
+    def purchases_between(self, symbols: np.ndarray, start: np.datetime64, end: np.datetime64) -> np.ndarray:
+        """Number of purchases of each symbol with start <= date <= end"""
+        codes = self.universe.get_indexer(symbols)
+        known = codes >= 0
+        start_day = np.int64(np.datetime64(start, 'D').astype(np.int64))
+        end_day = np.int64(np.datetime64(end, 'D').astype(np.int64))
+        lower = np.searchsorted(self.keys, self._key(codes, np.full(len(codes), start_day)), side='left')
+        upper = np.searchsorted(self.keys, self._key(codes, np.full(len(codes), end_day)), side='right')
+        return np.where(known, upper - lower, 0)
+
+
+def replacement_candidates(symbols: List[str], covariance: Optional[pd.DataFrame] = None,
+                           sector_mapping: Optional[Dict] = None, exclude: Iterable[str] = (),
+                           max_candidates: int = MAX_HARVEST_REPLACEMENTS) -> Dict[str, List[str]]:
+    """Most correlated other securities per symbol, else same-sector names; excluded names are never proposed"""
+    exclude = set(exclude)
+    replacements = {}
+    if covariance is not None and not covariance.empty:
+        vol = np.sqrt(np.diag(covariance.to_numpy(dtype=float)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = covariance.to_numpy(dtype=float) / np.outer(vol, vol)
+        corr[np.isnan(corr)] = -np.inf
+        np.fill_diagonal(corr, -np.inf)  # Never propose the security being sold
+        names = covariance.index.to_numpy()
+        corr[:, np.isin(names, list(exclude))] = -np.inf
+        position = {name: i for i, name in enumerate(names)}
+        for symbol in symbols:
+            if symbol in position:
+                ranked = np.argsort(-corr[position[symbol]])[:max_candidates]
+                replacements[symbol] = [names[i] for i in ranked if np.isfinite(corr[position[symbol], i])]
+
+    # Symbols outside the covariance model fall back to names from their sector
+    sector_mapping = sector_mapping or {}
+    by_sector: Dict[str, List[str]] = {}
+    for name, sector in sector_mapping.items():
+        by_sector.setdefault(sector, []).append(name)
+    for symbol in symbols:
+        if symbol not in replacements:
+            peers = by_sector.get(sector_mapping.get(symbol), [])
+            replacements[symbol] = [name for name in peers if name != symbol and name not in exclude][:max_candidates]
+    return replacements
+
+
+def scan_harvest_opportunities(lots: pd.DataFrame, prices: Optional[Dict[str, float]] = None,
+                               covariance: Optional[pd.DataFrame] = None,
+                               sector_mapping: Optional[Dict] = None,
+                               purchases: Optional[pd.DataFrame] = None,
+                               as_of: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """Rank loss lots by tax value per dollar traded, excluding lots a wash sale would disallow"""
+    columns = ['Symbol', 'Shares', 'Purchase_Date', 'Long_Term', 'Market_Value', 'Loss',
+               'Tax_Value', 'Tax_Value_Per_Dollar', 'Clear_To_Repurchase', 'Replacements']
+    if lots is None or lots.empty:
+        return pd.DataFrame(columns=columns)
+
+    symbols = lots['Symbol'].to_numpy(dtype=object)
+    current = lots['Current_Price'].to_numpy(dtype=float)
+    if prices:
+        # Live quotes, in the lots' (reporting) currency, override the prices the lots were valued at
+        current = pd.Series(symbols).map(prices).fillna(pd.Series(current)).to_numpy(dtype=float)
+
+    shares = lots['Shares'].to_numpy(dtype=float)
+    loss = shares * (lots['Purchase_Price'].to_numpy(dtype=float) - current)
+    candidate = loss >= MIN_HARVEST_LOSS
+    if not candidate.any():
+        return pd.DataFrame(columns=columns)
+
+    as_of = np.datetime64(pd.Timestamp(as_of or pd.Timestamp.today()).date(), 'D')
+    window_start = as_of - np.timedelta64(WASH_SALE_WINDOW_DAYS, 'D')
+    lot_dates = lots['Purchase_Date'].to_numpy(dtype='datetime64[D]')
+
+    # Purchases of the same symbol inside the look-back window (other than the lot itself) wash the loss
+    all_symbols, all_dates = symbols, lot_dates
+    if purchases is not None and not purchases.empty:
+        all_symbols = np.concatenate([symbols, purchases['Symbol'].to_numpy(dtype=object)])
+        all_dates = np.concatenate([lot_dates, purchases['Date'].to_numpy(dtype='datetime64[D]')])
+    index = WashSaleIndex(all_symbols, all_dates)
+
+    sym, dates = symbols[candidate], lot_dates[candidate]
+    self_in_window = (dates >= window_start) & (dates <= as_of)
+    washed = index.purchases_between(sym, window_start, as_of) - self_in_window > 0
+
+    long_term = lots['Long_Term'].to_numpy(dtype=bool)[candidate]
+    tax_value = loss[candidate] * np.where(long_term, LONG_TERM_TAX_RATE, SHORT_TERM_TAX_RATE)
+    market_value = shares[candidate] * current[candidate]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_dollar = np.where(market_value > 0, tax_value / market_value, np.inf)
+
+    result = pd.DataFrame({
+        'Symbol': sym,
+        'Shares': shares[candidate],
+        'Purchase_Date': dates,
+        'Long_Term': long_term,
+        'Market_Value': market_value,
+        'Loss': loss[candidate],
+        'Tax_Value': tax_value,
+        'Tax_Value_Per_Dollar': per_dollar,
+        # Buying the security back before this date would wash the harvested loss
+        'Clear_To_Repurchase': as_of + np.timedelta64(WASH_SALE_WINDOW_DAYS + 1, 'D')
+    })[~washed]
+    result = result.sort_values('Tax_Value_Per_Dollar', ascending=False, kind='stable', ignore_index=True)
+
+    # Buying a name already held would only add to an existing position, so held symbols are never proposed
+    replacements = replacement_candidates(
+        result['Symbol'].unique().tolist(), covariance, sector_mapping, exclude=np.unique(symbols)
+    )
+    result['Replacements'] = result['Symbol'].map(lambda s: ', '.join(replacements.get(s, [])))
+    return result
+
+
+def summarize_by_symbol(opportunities: pd.DataFrame) -> List[Dict]:
+    """Collapse ranked lots into one harvest per symbol, best tax value per dollar first"""
+    if opportunities.empty:
+        return []
+    codes, symbols = pd.factorize(opportunities['Symbol'])
+    totals = {
+        column: np.bincount(codes, opportunities[column].to_numpy(dtype=float), minlength=len(symbols))
+        for column in ['Shares', 'Market_Value', 'Loss', 'Tax_Value']
+    }
+    lots = np.bincount(codes, minlength=len(symbols))
+    first_row = np.unique(codes, return_index=True)[1]
+    replacements = opportunities['Replacements'].to_numpy()[first_row]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_dollar = totals['Tax_Value'] / totals['Market_Value']
+
+    return [
+        {
+            'symbol': symbols[i],
+            'shares': float(totals['Shares'][i]),
+            'lots': int(lots[i]),
+            'market_value': float(totals['Market_Value'][i]),
+            'loss': float(totals['Loss'][i]),
+            'tax_value': float(totals['Tax_Value'][i]),
+            'replacements': replacements[i],
+            'tax_value_per_dollar': float(per_dollar[i])
+        }
+        for i in np.argsort(-per_dollar, kind='stable')
+    ]
@@ -0,0 +1,171 @@
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from config.settings import TRACING_ENABLED, TRACE_SAMPLE_SIZE, METRICS_EXPORT_PATH, LOG_LEVEL
+
+logger = logging.getLogger("peerfolio.tracing")
+logger.setLevel(LOG_LEVEL)
+
+
+class SpanStats:
+    """Call count, total wall time and rows for one span name, plus recent durations for quantiles"""
+
+    def __init__(self, sample_size: int):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=sample_size)
+
+    def record(self, seconds: float, rows: Optional[int]):
+        self.count += 1
+        self.total_seconds += seconds
+        if rows is not None:
+            self.rows += rows
+        self.samples.append(seconds)
+
+
+class Tracer:
+    """In-process span collector; disabled spans cost one context variable lookup"""
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, sample_size: int = TRACE_SAMPLE_SIZE):
+        self.default_enabled = enabled
+        # Per-context override (e.g. one Streamlit session's script run), so a toggle never reaches other users
+        self._override = contextvars.ContextVar('tracer_enabled', default=None)
+        self.sample_size = sample_size
+        self._spans: Dict[str, SpanStats] = {}
+        self._listeners: List[Callable] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        override = self._override.get()
+        return self.default_enabled if override is None else override
+
+    def enable_in_context(self, enabled: Optional[bool]):
+        """Record spans (or not) for the rest of the current context; None restores the process default"""
+        self._override.set(enabled)
+
+    def add_listener(self, listener: Callable):
+        """Forward every finished span as listener(name, start_time, seconds, attributes)"""
+        self._listeners.append(listener)
+
+    def record(self, name: str, start: float, seconds: float, rows: Optional[int] = None,
+               attributes: Optional[Dict] = None):
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = SpanStats(self.sample_size)
+            stats.record(seconds, rows)
+
+        logger.debug("span %s took %.2f ms (rows=%s)", name, seconds * 1000, rows)
+        if self._listeners:
+            attributes = dict(attributes or {}, rows=rows)
+            for listener in self._listeners:
+                listener(name, start, seconds, attributes)
+
+    @contextmanager
+    def span(self, name: str, rows: Optional[int] = None, **attributes):
+        """Time a block; the yielded dict may be updated with 'rows' once they are known"""
+        if not self.enabled:
+            yield {}
+            return
+
+        info = {'rows': rows}
+        start_time = time.time()
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.record(name, start_time, time.perf_counter() - start, info.get('rows'), attributes)
+
+    def traced(self, name: str, rows: Optional[Callable] = None):
+        """Decorator form of span(); rows(*args, **kwargs) counts the input rows"""
+        def decorate(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+
+                start_time = time.time()
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(
+                        name, start_time, time.perf_counter() - start,
+                        rows(*args, **kwargs) if rows else None
+                    )
+            return wrapper
+        return decorate
+
+    def summary(self) -> List[Dict]:
+        """Per-span count, rows and p50/p95/mean latency in milliseconds"""
+        with self._lock:
+            snapshot = {name: (stats.count, stats.total_seconds, stats.rows, np.array(stats.samples))
+                        for name, stats in self._spans.items()}
+
+        rows = []
+        for name, (count, total, row_count, samples) in sorted(snapshot.items()):
+            p50, p95 = np.percentile(samples, [50, 95]) if len(samples) else (0.0, 0.0)
+            rows.append({
+                'span': name,
+                'count': count,
+                'rows': row_count,
+                'p50_ms': float(p50) * 1000,
+                'p95_ms': float(p95) * 1000,
+                'mean_ms': total / count * 1000 if count else 0.0,
+                'total_ms': total * 1000
+            })
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+
+    def to_prometheus(self) -> str:
+        """Render spans in the Prometheus text exposition format (summary + rows counter)"""
+        lines = [
+            "# HELP peerfolio_span_seconds Wall time of instrumented Peerfolio operations",
+            "# TYPE peerfolio_span_seconds summary"
+        ]
+        summary = self.summary()
+        for span in summary:
+            label = span['span'].replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'peerfolio_span_seconds{{span="{label}",quantile="0.5"}} {span["p50_ms"] / 1000:.6f}')
+            lines.append(f'peerfolio_span_seconds{{span="{label}",quantile="0.95"}} {span["p95_ms"] / 1000:.6f}')
+            lines.append(f'peerfolio_span_seconds_sum{{span="{label}"}} {span["total_ms"] / 1000:.6f}')
+            lines.append(f'peerfolio_span_seconds_count{{span="{label}"}} {span["count"]}')
+
+        lines += [
+            "# HELP peerfolio_span_rows_total Rows processed by instrumented Peerfolio operations",
+            "# TYPE peerfolio_span_rows_total counter"
+        ]
+        for span in summary:
+            label = span['span'].replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'peerfolio_span_rows_total{{span="{label}"}} {span["rows"]}')
+        return '\n'.join(lines) + '\n'
+
+    def export_prometheus(self, path: str = METRICS_EXPORT_PATH) -> str:
+        """Write the text format atomically so a node_exporter textfile collector never reads a partial file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, path)
+        return path
+
+
+TRACER = Tracer()
+span = TRACER.span
+traced = TRACER.traced